@@ -0,0 +1,47 @@
+"""Tests for the manifest handling of :mod:`total.batch_process`."""
+
+import json
+
+import pytest
+
+from total import batch_process
+
+
+def _write_csv(path, header, row):
+    path.write_text(",".join(header) + "\n" + ",".join(row) + "\n", encoding="utf-8")
+    return path
+
+
+def test_manifest_columns_get_the_option_types(tmp_path):
+    manifest = _write_csv(
+        tmp_path / "manifest.csv",
+        ["estimate", "claim-number", "memory_ceiling", "low_memory", "ocr_workers", "total_loss", "no_reuse", "extraction"],
+        ["a.pdf", "00123", "1", "false", "4", "yes", "1", "layout"],
+    )
+    (overrides,) = batch_process.iter_manifest(manifest)
+    assert overrides["estimate"] == str((tmp_path / "a.pdf").resolve())
+    assert overrides["claim_number"] == "00123"
+    assert overrides["memory_ceiling"] == 1.0
+    assert overrides["low_memory"] is False
+    assert overrides["ocr_workers"] == 4
+    assert overrides["total_loss"] is True
+    assert overrides["no_reuse"] is True
+    assert overrides["extraction"] == "layout"
+
+
+def test_jsonl_values_are_converted_too(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(json.dumps({"estimate": "a.pdf", "claim_number": 123, "ocr": True}) + "\n", encoding="utf-8")
+    (overrides,) = batch_process.iter_manifest(manifest)
+    assert overrides["claim_number"] == "123"
+    assert overrides["ocr"] is True
+
+
+@pytest.mark.parametrize(
+    "column, value",
+    [("customer_nmae", "Jane"), ("low_memory", "maybe"), ("memory_ceiling", "lots"), ("extraction", "ocr")],
+)
+def test_bad_manifest_columns_are_rejected(tmp_path, column, value):
+    manifest = _write_csv(tmp_path / "manifest.csv", ["estimate", column], ["a.pdf", value])
+    with pytest.raises(ValueError, match="row 1"):
+        list(batch_process.iter_manifest(manifest))
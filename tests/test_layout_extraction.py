@@ -0,0 +1,53 @@
+"""Tests for :mod:`total.layout_extraction`."""
+
+import pytest
+
+from total import layout_extraction
+
+pytest.importorskip("pdfplumber")
+fpdf = pytest.importorskip("fpdf")
+
+
+def _write_pdf(path, pages):
+    pdf = fpdf.FPDF()
+    pdf.set_font("Helvetica", size=10)
+    for lines in pages:
+        pdf.add_page()
+        for line in lines:
+            pdf.cell(0, 6, line, new_x="LMARGIN", new_y="NEXT")
+    pdf.output(str(path))
+    return path
+
+
+def test_prose_is_not_read_as_labels(tmp_path):
+    estimate = _write_pdf(tmp_path / "estimate.pdf", [
+        [
+            "Make sure to call the owner before teardown.",
+            "Miles 12 from shop, tow included.",
+            "VIN: 1HGCM82633A004352",
+            "Year: 2015",
+        ],
+        [
+            "Make: Honda   Model: Accord EX-L",
+            "Mileage: 45,120",
+            "Damage Description: Front end impact",
+        ],
+    ])
+    info, pages_read = layout_extraction.scan_estimate_layout(estimate)
+    assert info == {
+        "vin": "1HGCM82633A004352",
+        "year": "2015",
+        "make": "Honda",
+        "model": "Accord EX-L",
+        "mileage": "45120",
+        "damages": "Front end impact",
+    }
+    assert pages_read == 2
+
+
+def test_label_words_need_a_colon_or_capitals():
+    assert layout_extraction._label_of("Make") is None
+    assert layout_extraction._label_of("Make:") == ("make", "")
+    assert layout_extraction._label_of("Make", ":") == ("make", "")
+    assert layout_extraction._label_of("VIN") == ("vin", "")
+    assert layout_extraction._label_of("Damage", "Description:") == ("damages", "")
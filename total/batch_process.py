@@ -0,0 +1,661 @@
+"""
+batch_process.py
+================
+
+Runs the :mod:`process_claim` pipeline over many estimates at once.
+``process_claim.py`` handles a single ``--estimate`` per process which
+means the interpreter start‑up, the ``pdfplumber``/``pdfrw`` imports
+and the template parsing are paid for every claim.  This module keeps
+a pool of worker processes alive for the whole batch and hands each of
+them one claim at a time.
+
+Input can be given in two ways:
+
+* A **directory** – every ``*.pdf`` file in it is processed with the
+  default settings plus any options given on the command line.
+* A **manifest** – a ``.csv`` or ``.jsonl`` file with one claim per
+  row.  The ``estimate`` column/key holds the PDF path (relative paths
+  are resolved against the manifest's folder); every other column is
+  treated as a per‑claim override using the same names as the
+  ``process_claim.py`` options, e.g. ``claim_number`` or
+  ``customer-name``.  Values are converted as on the command line
+  (``memory_ceiling`` to a number, ``low_memory`` from ``true``/``false``
+  and so on) and a column that is not an option is an error.
+
+Each claim is written to its own sub‑directory of ``--output-dir``
+(named after the claim number when one is known, otherwise the PDF
+file name) and a consolidated ``results.jsonl`` is appended to as
+claims finish.  A failure in one claim is recorded in that file and
+does not stop the rest of the batch.
+
+With ``--remote-vin-decode`` the VINs of the whole batch are looked up
+before the claims run, in shared, rate‑limited vPIC batch requests
+(see :mod:`vin_enrichment`), instead of one request per claim.
+
+Every processed claim is recorded in the claim index (see
+:mod:`claim_index`).  An estimate whose PDF was processed before – in an
+earlier batch or earlier in this one – is not processed again; its
+record has the status ``duplicate`` and names the earlier output
+folder.  A rerun into the folder the estimate was processed in is not a
+duplicate: it runs, and the stages whose inputs did not change are
+reused (see :mod:`stage_store`).  Once an estimate has been parsed it
+is checked for being a supplement of an earlier claim (same claim
+number, or nearly the same text, both read from the page text the
+parse cache stores); a supplement is linked to the original under
+``supplement_of`` and reuses its stage results where the inputs are
+unchanged.  A claim enters the index when it finishes, so an original
+in the same batch is only found if it finished before its supplement
+was parsed; supplements of claims in this batch belong in the next
+one.  ``--no-claim-index`` turns this off.
+
+``--bcif-packet`` also fills the BCIFs of all successful claims into one
+printable PDF, in job order, with the template's fonts and images
+stored once (see :meth:`bcif_utils.BcifTemplate.fill_packet`).
+
+Typical usage::
+
+    python -m total.batch_process input/estimates --bcif "input/CCC BCIF.pdf" \\
+        --adjuster-name "Jane Smith" --workers 8
+    python -m total.batch_process queue/manifest.csv --output-dir output/batch
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import bcif_utils
+from . import claim_export
+from . import claim_index
+from . import memory_limits
+from . import ocr_utils
+from . import parse_cache
+from . import process_claim
+from . import stage_timing
+from . import summary_utils
+from . import vin_enrichment
+from . import vin_utils
+
+# Manifest values of on/off options such as ``total_loss``
+_TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+_FALSE_VALUES = {"0", "false", "no", "n", "off"}
+
+# Options of the batch CLI that are not passed on to each claim.
+_BATCH_ONLY_OPTIONS = (
+    "source", "workers", "results", "output_dir", "estimate", "combined_summary",
+    "vpic_rate", "vpic_connections", "claim_index", "no_claim_index", "bcif_packet",
+)
+
+
+def _normalise_key(key: str) -> str:
+    """Maps a manifest column name onto the matching ``argparse`` dest."""
+    return key.strip().lstrip("-").replace("-", "_").lower()
+
+
+def _to_bool(value: Any) -> bool:
+    """An on/off manifest value as a boolean."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError(f"expected true or false, got {value!r}")
+
+
+def _option_converters() -> Dict[str, Callable[[Any], Any]]:
+    """``argparse`` dest → function converting a manifest value to its type.
+
+    Built from :func:`process_claim.build_parser`, so a manifest value
+    is read exactly as the same command line option would be.
+    """
+    converters: Dict[str, Callable[[Any], Any]] = {}
+    for action in process_claim.build_parser()._actions:
+        if action.dest == "help":
+            continue
+        if action.nargs == 0:
+            # store_true options
+            convert: Callable[[Any], Any] = _to_bool
+        else:
+            convert = action.type or str
+        if action.choices:
+            convert = _one_of(convert, action.choices)
+        converters[action.dest] = convert
+    return converters
+
+
+def _one_of(convert: Callable[[Any], Any], choices: Iterable[Any]) -> Callable[[Any], Any]:
+    """Wraps ``convert`` to also check the value against ``choices``."""
+    allowed = list(choices)
+
+    def checked(value: Any) -> Any:
+        value = convert(value)
+        if value not in allowed:
+            raise ValueError(f"expected one of {', '.join(map(str, allowed))}, got {value!r}")
+        return value
+
+    return checked
+
+
+def iter_manifest(manifest_path: Path) -> Iterator[Dict[str, Any]]:
+    """Yields one override dictionary per claim listed in a manifest.
+
+    Args:
+        manifest_path: Path to a ``.csv`` (with a header row) or
+            ``.jsonl`` manifest.
+
+    Yields:
+        Dictionaries whose keys are ``argparse`` dest names.  The
+        ``estimate`` entry is always an absolute path.
+
+    Raises:
+        ValueError: If the manifest type is unknown, a row has no
+            ``estimate`` value, a column is not a ``process_claim``
+            option or a value does not fit its option.
+    """
+    suffix = manifest_path.suffix.lower()
+    if suffix == ".csv":
+        with manifest_path.open(newline="", encoding="utf-8") as f:
+            rows: Iterator[Dict[str, Any]] = iter(list(csv.DictReader(f)))
+    elif suffix in (".jsonl", ".ndjson"):
+        with manifest_path.open(encoding="utf-8") as f:
+            rows = iter([json.loads(line) for line in f if line.strip()])
+    else:
+        raise ValueError(f"Unsupported manifest type: {manifest_path}")
+    converters = _option_converters()
+    for line_no, row in enumerate(rows, start=1):
+        overrides = {}
+        for key, value in row.items():
+            if key is None or value in (None, ""):
+                continue
+            name = _normalise_key(key)
+            if name not in converters:
+                raise ValueError(f"{manifest_path}: row {line_no}: unknown option {key!r}")
+            try:
+                overrides[name] = converters[name](value)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"{manifest_path}: row {line_no}: bad value for {key!r}: {exc}") from exc
+        estimate = overrides.get("estimate")
+        if not estimate:
+            raise ValueError(f"{manifest_path}: row {line_no} has no 'estimate'")
+        estimate_path = Path(estimate)
+        if not estimate_path.is_absolute():
+            estimate_path = manifest_path.parent / estimate_path
+        overrides["estimate"] = str(estimate_path.resolve())
+        yield overrides
+
+
+def iter_directory(directory: Path) -> Iterator[Dict[str, Any]]:
+    """Yields an override dictionary for every PDF in ``directory``."""
+    for pdf_path in sorted(directory.iterdir()):
+        if pdf_path.is_file() and pdf_path.suffix.lower() == ".pdf":
+            yield {"estimate": str(pdf_path.resolve())}
+
+
+def _claim_dir_name(overrides: Dict[str, Any], used: Dict[str, int]) -> str:
+    """Chooses a unique, filesystem‑safe output folder name for a claim."""
+    base = str(overrides.get("claim_number") or Path(overrides["estimate"]).stem)
+    base = re.sub(r"[^A-Za-z0-9._-]+", "_", base).strip("._") or "claim"
+    count = used.get(base, 0)
+    used[base] = count + 1
+    return base if count == 0 else f"{base}_{count + 1}"
+
+
+def build_jobs(
+    source: Path,
+    output_dir: Path,
+    defaults: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """Expands a directory or manifest into a list of claim jobs.
+
+    Args:
+        source: Directory of PDFs or a ``.csv``/``.jsonl`` manifest.
+        output_dir: Root folder; each job gets its own sub‑directory.
+        defaults: Option values applied to every claim before the
+            manifest overrides (typically the batch CLI options).
+
+    Returns:
+        A list of dictionaries, each a complete set of
+        ``process_claim`` options.
+    """
+    rows = iter_directory(source) if source.is_dir() else iter_manifest(source)
+    used: Dict[str, int] = {}
+    jobs = []
+    for overrides in rows:
+        options = dict(defaults)
+        options.update(overrides)
+        options["output_dir"] = str(output_dir / _claim_dir_name(overrides, used))
+        jobs.append(options)
+    return jobs
+
+
+def _init_worker(templates: List[str]) -> None:
+    """Pool initialiser: imports the heavy PDF libraries once per worker,
+    parses the BCIF template(s) and sets up the summary renderer so the
+    first claim does not pay for it.
+    """
+    import pdfplumber  # type: ignore  # noqa: F401
+
+    for template in templates:
+        try:
+            bcif_utils.get_template(Path(template))
+        except Exception:  # noqa: BLE001 - reported per claim instead
+            pass
+    try:
+        summary_utils.get_renderer()
+    except ImportError:
+        pass  # summaries fall back to .txt
+
+
+def _quiet(*_args: Any, **_kwargs: Any) -> None:
+    """Log function used inside workers so output does not interleave."""
+
+
+def _job_vin(options: Dict[str, Any]) -> Optional[str]:
+    """The VIN a job will decode: the override, else the parsed one.
+
+    Parsing goes through the parse cache with the job's extraction and
+    memory options, so the claim itself does not parse the PDF again.
+    Without the cache only VIN overrides are returned.
+    """
+    if options.get("vin"):
+        return options["vin"]
+    if options.get("no_parse_cache"):
+        return None
+    cache = parse_cache.ParseCache(options.get("parse_cache"))
+    try:
+        info, _pages_read, _hit = parse_cache.cached_scan_estimate(
+            Path(options["estimate"]), cache,
+            extraction=options.get("extraction") or "text",
+            low_memory=bool(options.get("low_memory")),
+            monitor=memory_limits.MemoryMonitor(options.get("memory_ceiling")),
+        )
+    except Exception:  # noqa: BLE001 - the claim itself will report the problem
+        return None
+    finally:
+        cache.close()
+    return info.get("vin")
+
+
+def prefetch_vins(
+    pool: ProcessPoolExecutor,
+    jobs: List[Dict[str, Any]],
+    vpic_options: Dict[str, Any],
+) -> Dict[int, Dict[str, Dict[str, str]]]:
+    """Looks up the VINs of all remote‑decode jobs with one async client.
+
+    The estimates are parsed on ``pool`` and each VIN is handed to
+    :class:`vin_enrichment.VpicClient` as soon as its parse finishes,
+    so lookups overlap with parsing and are sent in shared batches.
+
+    Returns:
+        Job index → ``{vin: decoded}`` for the VINs vPIC resolved; pass
+        it to :func:`run_job` as ``vpic_results``.
+    """
+    futures = {idx: pool.submit(_job_vin, job) for idx, job in enumerate(jobs) if job.get("remote_vin_decode")}
+    if not futures:
+        return {}
+
+    async def lookup() -> Dict[str, Dict[str, str]]:
+        async def parsed_vins() -> Any:
+            for done in asyncio.as_completed([asyncio.wrap_future(f) for f in futures.values()]):
+                vin = await done
+                if vin:
+                    yield vin
+
+        async with vin_enrichment.VpicClient(**dict(vpic_options, log=print)) as client:
+            results = await client.decode_all(parsed_vins())
+            print(f"Decoded {len(results)} VIN(s) with {client.requests_sent} vPIC request(s)")
+            return results
+
+    decoded = asyncio.run(lookup())
+    prefetched: Dict[int, Dict[str, Dict[str, str]]] = {}
+    for idx, future in futures.items():
+        vin = vin_utils.normalise_vin(future.result() or "")
+        if decoded.get(vin, {}).get("Source") == "vpic":
+            prefetched[idx] = {vin: decoded[vin]}
+    return prefetched
+
+
+def _cached_page_texts(options: Dict[str, Any], pdf_hash: str) -> List[str]:
+    """The page texts the parse cache stored for the job's estimate."""
+    if options.get("no_parse_cache"):
+        return []
+    cache = parse_cache.ParseCache(options.get("parse_cache"))
+    try:
+        hit = cache.get(pdf_hash, parser_version=parse_cache.parser_version(options.get("extraction") or "text"))
+    finally:
+        cache.close()
+    return hit[2] if hit is not None else []
+
+
+def _link_supplement(
+    options: Dict[str, Any],
+    index_path: str,
+    pdf_hash: str,
+    parsed: Dict[str, Optional[str]],
+) -> Dict[str, Any]:
+    """Looks a parsed claim up in the claim index.
+
+    The signature and the claim number come from the page text the
+    parse cache stored, so the PDF is not read again; a claim number
+    override wins.
+
+    Returns:
+        Entries for the result record: the estimate's MinHash
+        ``signature`` and ``claim_number`` where known and, for a
+        supplement, ``supplement_of``.
+    """
+    page_texts = _cached_page_texts(options, pdf_hash)
+    signature = claim_index.page_signature(page_texts)
+    claim_number = options.get("claim_number") or claim_index.claim_number_in(page_texts)
+    entries: Dict[str, Any] = {
+        "signature": signature.tolist() if signature is not None else None,
+        "claim_number": claim_number,
+    }
+    index = claim_index.ClaimIndex(Path(index_path), read_only=True)
+    try:
+        found = index.find_original(claim_number, options.get("vin") or parsed.get("vin"), signature)
+    finally:
+        index.close()
+    if found is not None and (
+        found[0]["pdf_hash"] == pdf_hash or _same_folder(found[0]["output_dir"], options["output_dir"])
+    ):
+        found = None  # the claim itself, processed before
+    if found is not None:
+        original, reason, score = found
+        entries["supplement_of"] = {
+            "id": original["id"],
+            "estimate": original["estimate"],
+            "output_dir": original["output_dir"],
+            "reason": reason,
+            "similarity": score,
+        }
+    return entries
+
+
+def _same_folder(first: Optional[str], second: Optional[str]) -> bool:
+    """Whether two output folders are the same directory."""
+    if not first or not second:
+        return False
+    return Path(first).resolve() == Path(second).resolve()
+
+
+def run_job(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Processes one claim and returns a result record.
+
+    Any exception raised by the pipeline is caught and returned as part
+    of the record so that the batch can carry on.  A ``vpic_results``
+    entry (see :func:`prefetch_vins`) seeds the worker's vPIC cache so
+    the claim's VIN decode does not go to the network.  With a
+    ``claim_index`` path the claim is checked for being a supplement
+    once it has been parsed (see :func:`_link_supplement`), and the
+    remaining stages reuse the original claim's results.
+    """
+    options = dict(options)
+    vin_utils.remote_cache_update(options.pop("vpic_results", None) or {})
+    index_path = options.pop("claim_index", None)
+    record: Dict[str, Any] = {
+        "estimate": options["estimate"],
+        "output_dir": options["output_dir"],
+    }
+    start = time.perf_counter()
+
+    def link(pdf_hash: str, parsed: Dict[str, Optional[str]]) -> Optional[str]:
+        record.update(_link_supplement(options, index_path, pdf_hash, parsed))
+        return (record.get("supplement_of") or {}).get("output_dir")
+
+    try:
+        args = argparse.Namespace(**options)
+        result = process_claim.process_claim(args, log=_quiet, on_parsed=link if index_path else None)
+        record["status"] = "ok"
+        record.update(result)
+    except Exception as exc:  # noqa: BLE001 - one bad claim must not stop the batch
+        record["status"] = "error"
+        record["error"] = f"{type(exc).__name__}: {exc}"
+        record["traceback"] = traceback.format_exc()
+    record["elapsed_s"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def run_batch(
+    jobs: List[Dict[str, Any]],
+    results_path: Path,
+    workers: Optional[int] = None,
+    combined_summary: Optional[Path] = None,
+    exporter: Optional[claim_export.ClaimExporter] = None,
+    vpic_options: Optional[Dict[str, Any]] = None,
+    index: Optional[claim_index.ClaimIndex] = None,
+    bcif_packet: Optional[Path] = None,
+    packet_template: Optional[Path] = None,
+) -> Dict[str, int]:
+    """Runs ``jobs`` on a process pool and writes ``results.jsonl``.
+
+    Args:
+        jobs: Job dictionaries as returned by :func:`build_jobs`.
+        results_path: Where to write one JSON record per claim.  Records
+            are written in completion order and flushed immediately so
+            a partially finished batch still leaves usable results.
+            Per-stage p50/p95/p99 timings of the successful claims, and
+            the p50/p95/max of their peak memory use, are written next
+            to it as ``stage_stats.json``.
+        workers: Number of worker processes.  Defaults to the CPU count.
+        combined_summary: If given, the summaries of all successful
+            claims are also rendered into this single PDF, in job order.
+        exporter: If given, every successful claim is appended to it.
+            Rows are written from this process only, so the whole batch
+            goes into a few large row groups.
+        vpic_options: If given, the VINs of jobs with
+            ``remote_vin_decode`` are looked up together before the
+            claims run (see :func:`prefetch_vins`); the dictionary is
+            passed to :class:`vin_enrichment.VpicClient`.
+        index: If given, estimates already in it (or earlier in
+            ``jobs``) are skipped as duplicates, supplements are linked
+            to their original claim, and every successful claim is
+            added to it when it completes – a supplement is only linked
+            to an original of this batch that completed first.  Only
+            this process writes to the index.
+        bcif_packet: If given, the BCIFs of all successful claims are
+            also filled into this single PDF, in job order.  Each claim's
+            data is read back from its ``assembled_data.json`` while the
+            packet is written.
+        packet_template: BCIF template of the packet.  Defaults to the
+            template of the first job.
+
+    Returns:
+        Counts of ``ok``, ``error`` and ``duplicate`` claims.
+    """
+    counts = {"ok": 0, "error": 0, "duplicate": 0}
+    summaries: Dict[int, Tuple[str, List[Dict[str, int]]]] = {}
+    packed: Dict[int, str] = {}
+    timings: List[Dict[str, Any]] = []
+    peaks: List[int] = []
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    templates = sorted({str(job["bcif"]) for job in jobs if job.get("bcif")})
+
+    def write(record: Dict[str, Any]) -> None:
+        out.write(json.dumps(record, default=str) + "\n")
+        out.flush()
+        print(f"[{record['status']}] {record['estimate']}")
+
+    with results_path.open("w", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(templates,)
+    ) as pool:
+        pending = list(range(len(jobs)))
+        if index is not None:
+            pending = []
+            seen: Dict[str, int] = {}
+            for idx, job in enumerate(jobs):
+                try:
+                    pdf_hash = parse_cache.hash_pdf(Path(job["estimate"]))
+                except OSError:
+                    pending.append(idx)  # the claim itself will report it
+                    continue
+                earlier = index.find_exact(pdf_hash)
+                if earlier is not None and _same_folder(earlier["output_dir"], job["output_dir"]):
+                    # A rerun into the claim's own folder; the stage store
+                    # reuses what did not change
+                    earlier = None
+                if earlier is None and pdf_hash in seen:
+                    earlier = {"output_dir": jobs[seen[pdf_hash]]["output_dir"]}
+                if earlier is None:
+                    seen[pdf_hash] = idx
+                    pending.append(idx)
+                    continue
+                counts["duplicate"] += 1
+                write({
+                    "estimate": job["estimate"], "output_dir": job["output_dir"], "status": "duplicate",
+                    "pdf_hash": pdf_hash, "duplicate_of": earlier["output_dir"],
+                })
+        queued = [jobs[idx] for idx in pending]
+        vpic_found = prefetch_vins(pool, queued, vpic_options) if vpic_options is not None else {}
+        vpic = {pending[pos]: found for pos, found in vpic_found.items()}
+        futures = {}
+        for idx in pending:
+            job = dict(jobs[idx])
+            if idx in vpic:
+                job["vpic_results"] = vpic[idx]
+            if index is not None:
+                job["claim_index"] = str(index.path)
+            futures[pool.submit(run_job, job)] = idx
+        for future in as_completed(futures):
+            idx = futures[future]
+            job = jobs[idx]
+            try:
+                record = future.result()
+            except Exception as exc:  # noqa: BLE001 - e.g. a worker process died
+                record = {
+                    "estimate": job["estimate"],
+                    "output_dir": job["output_dir"],
+                    "status": "error",
+                    "error": f"{type(exc).__name__}: {exc}",
+                }
+            counts[record["status"]] += 1
+            signature = record.pop("signature", None)
+            if record["status"] == "ok":
+                summaries[idx] = (record["summary_text"], record["salvage_bids"])
+                packed[idx] = record["output_dir"]
+                timings.extend(record["timings"])
+                if record.get("peak_rss_kb"):
+                    peaks.append(record["peak_rss_kb"])
+                if exporter is not None:
+                    exporter.append(claim_export.claim_row(record))
+                if index is not None:
+                    record["claim_id"] = index.add(
+                        record["pdf_hash"], record["estimate"],
+                        vin=record["assembled"].get("vin"),
+                        claim_number=record["assembled"].get("claim_number") or record.get("claim_number"),
+                        output_dir=record["output_dir"],
+                        signature=signature,
+                        original_id=(record.get("supplement_of") or {}).get("id"),
+                    )
+            write(record)
+    if timings:
+        stats: Dict[str, Any] = stage_timing.aggregate(timings)
+        if peaks:
+            # Size worker pools by the p95 peak of one estimate
+            peaks.sort()
+            stats["peak_rss_kb"] = {
+                "count": len(peaks),
+                "p50": stage_timing.percentile(peaks, 50),
+                "p95": stage_timing.percentile(peaks, 95),
+                "max": peaks[-1],
+            }
+        stats_path = results_path.with_name("stage_stats.json")
+        with stats_path.open("w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        print(stage_timing.format_stats({k: v for k, v in stats.items() if k != "peak_rss_kb"}))
+        if peaks:
+            memory = stats["peak_rss_kb"]
+            print(
+                f"Peak memory per estimate: p50 {memory['p50'] // 1024} MB, "
+                f"p95 {memory['p95'] // 1024} MB, max {memory['max'] // 1024} MB"
+            )
+        print("Stage statistics written to", stats_path)
+    if combined_summary is not None and summaries:
+        renderer = summary_utils.get_renderer()
+        path = renderer.render_combined((summaries[idx] for idx in sorted(summaries)), combined_summary)
+        print("Combined summary saved to", path)
+    if bcif_packet is not None and packed:
+        template = bcif_utils.get_template(Path(packet_template or jobs[0]["bcif"]))
+        claims = bcif_utils.iter_claim_data(Path(packed[idx]) for idx in sorted(packed))
+        count = template.fill_packet(claims, bcif_packet)
+        print(f"BCIF packet with {count} claim(s) saved to", bcif_packet)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Process a directory or manifest of CCC estimates in parallel",
+        parents=[process_claim.build_parser()],
+        conflict_handler="resolve",
+    )
+    parser.add_argument("source", help="Directory of estimate PDFs or a .csv/.jsonl manifest")
+    parser.add_argument("--estimate", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", default="output/batch", help="Root folder for per-claim output directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--results", help="Path of the consolidated results file (default: <output-dir>/results.jsonl)")
+    parser.add_argument("--combined-summary", help="Also write all claim summaries into this single PDF")
+    parser.add_argument("--bcif-packet", help="Also fill the BCIFs of all claims into this single PDF")
+    parser.add_argument("--vpic-rate", type=float, default=vin_enrichment.DEFAULT_RATE, help="vPIC requests per second with --remote-vin-decode")
+    parser.add_argument("--vpic-connections", type=int, default=4, help="Concurrent vPIC connections with --remote-vin-decode")
+    parser.add_argument("--claim-index", help="Claim index database (default: claim_index.sqlite next to the parse cache)")
+    parser.add_argument("--no-claim-index", action="store_true", help="Process every estimate, without skipping duplicates or linking supplements")
+    args = parser.parse_args()
+
+    if args.purge_parse_cache and not args.no_parse_cache:
+        # Purge once here rather than in every worker
+        removed = parse_cache.ParseCache(args.parse_cache).purge()
+        print("Purged", removed, "parse cache entries")
+        args.purge_parse_cache = False
+    if args.purge_ocr_cache:
+        print("Purged", ocr_utils.OcrCache().purge(), "OCR cache entries")
+        args.purge_ocr_cache = False
+
+    output_dir = Path(args.output_dir)
+    defaults = {k: v for k, v in vars(args).items() if k not in _BATCH_ONLY_OPTIONS}
+    # Claims are exported here rather than by each worker
+    defaults["export_dir"] = None
+    jobs = build_jobs(Path(args.source), output_dir, defaults)
+    if not jobs:
+        print("No estimates found in", args.source)
+        return
+    results_path = Path(args.results) if args.results else output_dir / "results.jsonl"
+    combined = Path(args.combined_summary) if args.combined_summary else None
+    exporter = claim_export.ClaimExporter(Path(args.export_dir), args.export_format) if args.export_dir else None
+    index = None if args.no_claim_index else claim_index.ClaimIndex(args.claim_index)
+    try:
+        vpic_options = (
+            {"rate": args.vpic_rate, "max_connections": args.vpic_connections}
+            if args.remote_vin_decode else None
+        )
+        counts = run_batch(
+            jobs, results_path, workers=args.workers, combined_summary=combined,
+            exporter=exporter, vpic_options=vpic_options, index=index,
+            bcif_packet=Path(args.bcif_packet) if args.bcif_packet else None, packet_template=Path(args.bcif),
+        )
+    finally:
+        if index is not None:
+            index.close()
+        if exporter is not None:
+            exporter.close()
+            print(f"Exported {exporter.rows_written} claim(s) to", args.export_dir)
+    print(
+        f"Processed {len(jobs)} claims: {counts['ok']} ok, {counts['error']} failed, "
+        f"{counts['duplicate']} duplicate(s) skipped"
+    )
+    print("Results written to", results_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+bcif_utils.py
+=============
+
+Filling of the CCC BCIF form with ``pdfrw``.
+
+:func:`process_claim.fill_bcif` used to re‑read the template with
+``PdfReader`` for every claim and then walk every page's ``Annots``,
+stripping the parentheses off each field name.  In batch use that
+parse dominated the fill step.  :class:`BcifTemplate` parses the form
+once, builds a field name → annotation index and then fills any number
+of claims from it:
+
+* Only the annotations whose values change are touched.  Their
+  original ``V``/``AP`` entries are restored after each write, so the
+  parsed template can be reused indefinitely.
+* Output can go to a path or to any binary file object; with no
+  destination the filled PDF is returned as ``bytes``.
+* :attr:`BcifTemplate.fields` lists the form's field names so callers
+  can report which of their keys the form does not have.
+
+:meth:`BcifTemplate.fill_packet` writes many claims into one printable
+PDF instead, e.g. the BCIFs of a day's inspections.  Filling each claim
+and merging the files afterwards would store the template's content
+streams, fonts and images once per claim.  The packet writer streams
+the PDF to disk itself:
+
+* The template's pages, widgets and form are copied for every claim.
+  Everything they point to (content streams, resources, fonts, XObjects,
+  appearance streams of untouched fields) is shared and stored once,
+  the first time a claim needs it.
+* Each claim's fields get a parent field named ``claim1``, ``claim2``,
+  … so their full names (``claim2.vin``) are unique in the packet and
+  filling one claim's field does not change the others.
+* A claim's objects are written as soon as its pages are built and are
+  then dropped.  Only the object offsets and the page and field
+  numbers are kept until the cross‑reference table is written at the
+  end, so memory hardly grows with the number of claims.
+
+Example::
+
+    template = BcifTemplate(Path("input/CCC BCIF.pdf"))
+    for claim in claims:
+        template.fill(claim, Path("output") / f"{claim['claim_number']}.pdf")
+    pdf_bytes = template.fill(claim)  # in memory
+    template.fill_packet(claims, Path("output/packet.pdf"))
+
+or, for claims that have already been processed::
+
+    python -m total.bcif_utils --bcif "input/CCC BCIF.pdf" --output packet.pdf output/batch/*/
+
+A :class:`BcifTemplate` is not thread‑safe; use one per thread or
+process (:func:`get_template` keeps one per template file).
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
+
+Destination = Union[str, Path, BinaryIO]
+
+# Field attributes a widget may inherit from its parent fields
+_INHERITED_FIELD_KEYS = ("FT", "Ff", "DA", "Q", "DV", "MaxLen", "Opt")
+
+# Page attributes a page may inherit from the page tree
+_INHERITED_PAGE_KEYS = ("Resources", "MediaBox", "CropBox", "Rotate")
+
+
+class BcifTemplate:
+    """A BCIF form parsed once and filled many times.
+
+    Args:
+        template_path: Path to the blank BCIF PDF.
+    """
+
+    def __init__(self, template_path: Path):
+        from pdfrw import PdfReader  # type: ignore
+
+        self.path = Path(template_path)
+        self._pdf = PdfReader(str(self.path))
+        self._index: Dict[str, List[Any]] = {}
+        for page in self._pdf.pages:
+            annots = page.Annots
+            if not annots:
+                continue
+            for annot in annots:
+                if annot.Subtype == '/Widget' and annot.T:
+                    key = annot.T.decode()  # Remove parentheses/escapes around field name
+                    self._index.setdefault(key, []).append(annot)
+
+    @property
+    def fields(self) -> List[str]:
+        """Names of the form's fillable fields, in document order."""
+        return list(self._index)
+
+    def unmapped(self, data: Mapping[str, Any]) -> List[str]:
+        """Keys of ``data`` with a value that the form has no field for."""
+        return [key for key, value in data.items() if value is not None and key not in self._index]
+
+    def fill(self, data: Mapping[str, Any], output: Optional[Destination] = None) -> Optional[bytes]:
+        """Writes a filled copy of the form.
+
+        Args:
+            data: Field name → value.  ``None`` values and keys the form
+                does not have are ignored.
+            output: A path, a binary file object or ``None``.
+
+        Returns:
+            The PDF as ``bytes`` when ``output`` is ``None``, otherwise
+            ``None``.
+        """
+        from pdfrw import PdfDict, PdfString, PdfWriter  # type: ignore
+
+        saved: List[Tuple[Any, Any, Any]] = []
+        for key, value in data.items():
+            if value is None:
+                continue
+            for annot in self._index.get(key, ()):
+                saved.append((annot, annot.V, annot.AP))
+                annot.V = PdfString.encode(str(value))
+                # Set appearance dictionary to avoid showing stale values
+                annot.AP = PdfDict()
+        buffer = io.BytesIO() if output is None else None
+        try:
+            target = buffer if buffer is not None else output
+            if isinstance(target, Path):
+                target = str(target)
+            PdfWriter().write(target, self._pdf)
+        finally:
+            for annot, value, appearance in reversed(saved):
+                annot.V = value
+                annot.AP = appearance
+        return buffer.getvalue() if buffer is not None else None
+
+    def fill_packet(
+        self, claims: Iterable[Mapping[str, Any]], output: Destination, prefix: str = "claim"
+    ) -> int:
+        """Writes one PDF with a filled copy of the form per claim.
+
+        The template's shared resources are stored once; see the module
+        docstring.  ``claims`` is consumed lazily, so it can be a
+        generator reading the claims one at a time.
+
+        Args:
+            claims: Field name → value per claim, as for :meth:`fill`.
+            output: A path or a binary file object.  The file object
+                does not need to be seekable.
+            prefix: Parent field names are ``prefix`` plus the claim's
+                position, starting at 1.
+
+        Returns:
+            The number of claims written.
+        """
+        if isinstance(output, (str, Path)):
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            with open(output, "wb") as f:
+                return _PacketWriter(self._pdf, f).write(claims, prefix)
+        return _PacketWriter(self._pdf, output).write(claims, prefix)
+
+
+class _PacketWriter:
+    """Streams copies of a parsed form into one PDF file.
+
+    Template objects keep their object numbers for the whole file; the
+    copies made for a claim are numbered, written and forgotten claim by
+    claim.
+    """
+
+    # Reserved object numbers, written at the end
+    _CATALOG, _PAGES, _ACROFORM = 1, 2, 3
+
+    def __init__(self, pdf: Any, f: BinaryIO):
+        from pdfrw import PdfObject  # type: ignore
+
+        self._pdf = pdf
+        self._f = f
+        self._position = 0
+        self._offsets: List[Optional[int]] = [0, None, None, None]
+        self._shared: Dict[int, int] = {}  # id of a template object -> number
+        self._local: Dict[int, int] = {}  # id of a copy -> number, for one claim
+        self._local_ids: Set[int] = set()
+        self._pending: List[Tuple[int, Any]] = []
+        self._pages_ref = PdfObject(f"{self._PAGES} 0 R")
+        # Template objects the copies replace; a reference to one of them
+        # from a shared object is written as null instead of pulling the
+        # template's own pages and fields into the packet
+        self._replaced: Set[int] = {id(pdf.Root), id(pdf.Root.Pages)}
+        for page in pdf.pages:
+            self._replaced.add(id(page))
+            for annot in page.Annots or ():
+                self._replaced.add(id(annot))
+                parent = annot.Parent
+                while parent is not None:
+                    self._replaced.add(id(parent))
+                    parent = parent.Parent
+        if pdf.Root.AcroForm is not None and pdf.Root.AcroForm.Fields is not None:
+            self._replaced.add(id(pdf.Root.AcroForm.Fields))
+
+    def _emit(self, text: str) -> None:
+        data = text.encode("latin-1")
+        self._f.write(data)
+        self._position += len(data)
+
+    def _allocate(self) -> int:
+        self._offsets.append(None)
+        return len(self._offsets) - 1
+
+    def _local_copy(self, obj: Any) -> Any:
+        obj.indirect = True
+        self._local_ids.add(id(obj))
+        return obj
+
+    def _number(self, obj: Any) -> int:
+        """Object number of ``obj``; queues it for writing when new."""
+        key = id(obj)
+        numbers = self._local if key in self._local_ids else self._shared
+        number = numbers.get(key)
+        if number is None:
+            number = numbers[key] = self._allocate()
+            self._pending.append((number, obj))
+        return number
+
+    def _value(self, obj: Any) -> str:
+        from pdfrw import PdfDict  # type: ignore
+
+        if id(obj) in self._replaced:
+            return "null"
+        if isinstance(obj, PdfDict):
+            indirect = obj.indirect or obj.stream is not None
+        else:
+            indirect = getattr(obj, "indirect", False)
+        return f"{self._number(obj)} 0 R" if indirect else self._body(obj)
+
+    def _body(self, obj: Any) -> str:
+        from pdfrw import PdfArray, PdfDict, PdfString  # type: ignore
+
+        if isinstance(obj, dict):
+            obj = obj if isinstance(obj, PdfDict) else PdfDict(obj)
+            items = []
+            for key, value in obj.iteritems():
+                items.append(getattr(key, "encoded", None) or key)
+                items.append(self._value(value))
+            text = f"<<{_join(items)}>>"
+            if obj.stream is not None:
+                text = f"{text}\nstream\n{obj.stream}\nendstream"
+            return text
+        if isinstance(obj, (list, tuple)):
+            return f"[{_join([self._value(item) for item in PdfArray(obj)])}]"
+        if hasattr(obj, "indirect"):
+            return str(getattr(obj, "encoded", None) or obj)
+        if isinstance(obj, (str, bytes)):
+            return PdfString.encode(obj)
+        if isinstance(obj, float):
+            return ("%.9f" % obj).rstrip("0").rstrip(".")
+        return str(obj)
+
+    def _flush(self) -> None:
+        while self._pending:
+            number, obj = self._pending.pop()
+            self._offsets[number] = self._position
+            self._emit(f"{number} 0 obj\n{self._body(obj)}\nendobj\n")
+
+    def _write_reserved(self, number: int, body: str) -> None:
+        self._offsets[number] = self._position
+        self._emit(f"{number} 0 obj\n{body}\nendobj\n")
+
+    def _copy_widget(self, annot: Any) -> Any:
+        from pdfrw import PdfDict  # type: ignore
+
+        widget = self._local_copy(PdfDict(annot))
+        parent = annot.Parent
+        while parent is not None:
+            for key in _INHERITED_FIELD_KEYS:
+                if getattr(widget, key) is None and getattr(parent, key) is not None:
+                    setattr(widget, key, getattr(parent, key))
+            parent = parent.Parent
+        widget.Parent = None
+        return widget
+
+    def _add_claim(self, data: Mapping[str, Any], name: str) -> Tuple[List[int], int]:
+        """Writes one claim's pages; returns their numbers and its field's."""
+        from pdfrw import PdfArray, PdfDict, PdfString  # type: ignore
+
+        field = self._local_copy(PdfDict(T=PdfString.encode(name), Kids=PdfArray()))
+        page_numbers = []
+        for page in self._pdf.pages:
+            copy = self._local_copy(PdfDict(page))
+            for key in _INHERITED_PAGE_KEYS:
+                if getattr(copy, key) is None and getattr(page.inheritable, key) is not None:
+                    setattr(copy, key, getattr(page.inheritable, key))
+            copy.Parent = self._pages_ref
+            if page.Annots:
+                annots = PdfArray()
+                for annot in page.Annots:
+                    if annot.Subtype == "/Widget":
+                        annot_copy = self._copy_widget(annot)
+                        if annot.T:
+                            annot_copy.Parent = field
+                            field.Kids.append(annot_copy)
+                            value = data.get(annot.T.decode())
+                            if value is not None:
+                                annot_copy.V = PdfString.encode(str(value))
+                                # Set appearance dictionary to avoid showing stale values
+                                annot_copy.AP = PdfDict()
+                    else:
+                        annot_copy = self._local_copy(PdfDict(annot))
+                    annot_copy.P = copy
+                    annots.append(annot_copy)
+                copy.Annots = annots
+            page_numbers.append(self._number(copy))
+        field_number = self._number(field)
+        self._flush()
+        self._local.clear()
+        self._local_ids.clear()
+        return page_numbers, field_number
+
+    def write(self, claims: Iterable[Mapping[str, Any]], prefix: str) -> int:
+        from pdfrw import PdfDict, PdfObject  # type: ignore
+
+        self._emit("%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        pages: List[int] = []
+        fields: List[int] = []
+        count = 0
+        for count, data in enumerate(claims, 1):
+            page_numbers, field_number = self._add_claim(data, f"{prefix}{count}")
+            pages.extend(page_numbers)
+            fields.append(field_number)
+        kids = _join([f"{number} 0 R" for number in pages])
+        self._write_reserved(self._PAGES, f"<</Type /Pages /Count {len(pages)} /Kids [{kids}]>>")
+        acroform = PdfDict(self._pdf.Root.AcroForm or {})
+        acroform.indirect = False
+        acroform.Fields = PdfObject(f"[{_join([f'{number} 0 R' for number in fields])}]")
+        self._write_reserved(self._ACROFORM, self._body(acroform))
+        self._flush()  # resources only the form uses, e.g. its default font
+        self._write_reserved(
+            self._CATALOG, f"<</Type /Catalog /Pages {self._PAGES} 0 R /AcroForm {self._ACROFORM} 0 R>>"
+        )
+        xref = self._position
+        rows = ["xref", f"0 {len(self._offsets)}", "0000000000 65535 f "]
+        rows.extend(f"{offset:010d} 00000 n " for offset in self._offsets[1:])
+        self._emit("\n".join(rows) + "\n")
+        self._emit(
+            f"trailer\n<</Size {len(self._offsets)} /Root {self._CATALOG} 0 R>>\nstartxref\n{xref}\n%%EOF\n"
+        )
+        return count
+
+
+def _join(items: List[str], width: int = 70) -> str:
+    """Joins formatted objects with spaces, breaking long lines."""
+    lines: List[str] = []
+    line: List[str] = []
+    length = 0
+    for item in items:
+        if line and length + len(item) > width:
+            lines.append(" ".join(line))
+            line, length = [], 0
+        line.append(item)
+        length += len(item) + 1
+    if line:
+        lines.append(" ".join(line))
+    return "\n".join(lines)
+
+
+def iter_claim_data(paths: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    """Reads the ``assembled_data.json`` of processed claims one at a time.
+
+    Args:
+        paths: Claim output folders or the JSON files themselves.
+    """
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            path = path / "assembled_data.json"
+        with path.open(encoding="utf-8") as f:
+            yield json.load(f)
+
+
+_templates: Dict[Tuple[str, float], BcifTemplate] = {}
+
+
+def get_template(template_path: Path) -> BcifTemplate:
+    """Returns a cached :class:`BcifTemplate` for ``template_path``.
+
+    The cache is keyed by the resolved path and modification time, so
+    editing the template file on disk picks up the new version.
+    """
+    path = Path(template_path).resolve()
+    key = (str(path), path.stat().st_mtime)
+    template = _templates.get(key)
+    if template is None:
+        for stale in [k for k in _templates if k[0] == key[0]]:
+            del _templates[stale]
+        template = _templates[key] = BcifTemplate(path)
+    return template
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill the BCIF of many processed claims into one printable PDF")
+    parser.add_argument("claims", nargs="+", help="Claim output folders or their assembled_data.json files")
+    parser.add_argument("--bcif", default="input/CCC BCIF.pdf", help="Path to the blank BCIF PDF template")
+    parser.add_argument("--output", default="output/bcif_packet.pdf", help="Where to write the packet")
+    args = parser.parse_args()
+
+    count = BcifTemplate(Path(args.bcif)).fill_packet(iter_claim_data(Path(p) for p in args.claims), Path(args.output))
+    print(f"Filled {count} BCIF(s) into", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+benchmark.py
+============
+
+Benchmarks for the claim pipeline using synthetic documents, so that
+performance regressions in :mod:`parse_estimate`, BCIF filling or the
+summary path can be measured without real customer estimates.
+
+The harness generates, in a temporary folder,
+
+* CCC‑style estimate PDFs of 1–100 pages (configurable) with the
+  vehicle block placed on the first page, in the middle or on the last
+  page, surrounded by line‑item noise text, and
+* a synthetic BCIF form with one text field per ``assemble_data`` key.
+
+It then times :func:`parse_estimate.read_pdf_text`,
+:func:`parse_estimate.extract_vehicle_info`,
+:func:`process_claim.fill_bcif`, :func:`summary_utils.build_summary_text`
+and the full :func:`process_claim.process_claim` pipeline at each
+scale.  For every case it reports the median and minimum wall time,
+the throughput (calls or claims per second) and the peak Python
+allocation measured with ``tracemalloc`` on a separate run.
+
+Start‑up cost is measured separately by running ``process_claim.py``
+as a new process: ``--help`` alone, a claim processed cold in the new
+process (``--no-daemon``) and the same claim handed to a running
+:mod:`claim_daemon` (warm).  The peak allocation of these cases is that
+of the benchmark process, not of the child.
+
+Results are saved as JSON (``bench_results/<timestamp>-<commit>.json``
+by default) and a previous file can be passed with ``--compare`` to
+print the relative change per case::
+
+    python -m total.benchmark --pages 1,10,50,100 --repeat 5
+    python -m total.benchmark --compare bench_results/20250101-abc1234.json
+
+Requires ``fpdf2`` to generate the estimates.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import parse_estimate
+from . import process_claim
+from . import summary_utils
+
+BCIF_FIELDS = (
+    "customer_name", "adjuster_name", "claim_number", "date_of_loss",
+    "inspection_location", "vin", "year", "make", "model", "mileage",
+    "damages", "days_to_repair",
+)
+
+_NOISE_WORDS = (
+    "R&R", "Repl", "O/H", "Refinish", "Blend", "bumper", "cover", "fender",
+    "hood", "door", "shell", "quarter", "panel", "lamp", "assy", "bracket",
+    "LT", "RT", "Front", "Rear", "OEM", "A/M", "labor", "paint", "hrs", "qty",
+)
+
+_VEHICLE_BLOCK = (
+    "VEHICLE\n"
+    "VIN: 1HGCM82633A004352\n"
+    "Year: 2015   Make: Honda   Model: Accord EX-L\n"
+    "Mileage: 45,120\n"
+    "Damages: Front end impact, bumper cover, hood and RT headlamp assembly."
+)
+
+
+def _noise_line(rng: random.Random) -> str:
+    words = " ".join(rng.choice(_NOISE_WORDS) for _ in range(rng.randint(4, 9)))
+    return f"{rng.randint(1, 99):>3} {words:<60} {rng.uniform(0.2, 4.0):5.1f} {rng.uniform(5, 900):9.2f}"
+
+
+def make_estimate_pdf(
+    path: Path,
+    pages: int,
+    placement: str = "first",
+    noise_lines: int = 45,
+    seed: int = 0,
+) -> Path:
+    """Writes a synthetic CCC‑style estimate.
+
+    Args:
+        path: Destination PDF.
+        pages: Number of pages.
+        placement: Where the vehicle block goes: ``"first"``,
+            ``"middle"`` or ``"last"`` page.
+        noise_lines: Line‑item rows per page.
+        seed: Seed for the noise text so runs are comparable.
+    """
+    from fpdf import FPDF  # type: ignore
+
+    rng = random.Random(seed)
+    target = {"first": 0, "middle": pages // 2, "last": pages - 1}[placement]
+    pdf = FPDF(format="letter")
+    pdf.set_auto_page_break(False)
+    for page in range(pages):
+        pdf.add_page()
+        pdf.set_font("Courier", size=8)
+        pdf.multi_cell(0, 4, f"Workfile ID: {seed:08d}    Page {page + 1} of {pages}", new_x="LMARGIN", new_y="NEXT")
+        if page == target:
+            pdf.multi_cell(0, 4, _VEHICLE_BLOCK, new_x="LMARGIN", new_y="NEXT")
+        lines = noise_lines - (6 if page == target else 0)
+        pdf.multi_cell(0, 4, "\n".join(_noise_line(rng) for _ in range(lines)), new_x="LMARGIN", new_y="NEXT")
+    pdf.output(str(path))
+    return path
+
+
+def make_bcif_template(path: Path, fields: tuple = BCIF_FIELDS) -> Path:
+    """Writes a one‑page form with a text field per name in ``fields``."""
+    from pdfrw import PdfArray, PdfDict, PdfName, PdfString, PdfWriter  # type: ignore
+
+    annots = PdfArray()
+    for i, name in enumerate(fields):
+        y = 740 - i * 40
+        annots.append(PdfDict(
+            Type=PdfName.Annot, Subtype=PdfName.Widget, FT=PdfName.Tx,
+            T=PdfString.encode(name), Rect=PdfArray([72, y, 540, y + 20]),
+        ))
+    page = PdfDict(
+        Type=PdfName.Page, MediaBox=PdfArray([0, 0, 612, 792]),
+        Annots=annots, Resources=PdfDict(), Contents=PdfDict(stream=""),
+    )
+    writer = PdfWriter()
+    writer.addpage(page)
+    writer.trailer.Root.AcroForm = PdfDict(Fields=annots)
+    writer.write(str(path))
+    return path
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Times ``fn`` ``repeat`` times, then once more under tracemalloc."""
+    fn()  # warm up imports and caches
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    median = statistics.median(samples)
+    return {
+        "median_s": round(median, 6),
+        "min_s": round(min(samples), 6),
+        "per_sec": round(1 / median, 2) if median else 0.0,
+        "peak_kb": peak // 1024,
+        "repeat": repeat,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _cli(*args: str) -> List[str]:
+    return [sys.executable, "-m", "total.process_claim", *args]
+
+
+def run_startup_benchmarks(
+    estimate: Path,
+    bcif: Path,
+    repeat: int,
+    workdir: Path,
+    record: Callable[[str, Callable[[], Any]], None],
+) -> None:
+    """Times ``process_claim.py`` start‑up cold and through a warm daemon."""
+    env = dict(os.environ, CLAIM_CIPHER_DAEMON_SOCKET=str(workdir / "daemon.sock"))
+    root = Path(__file__).resolve().parent.parent
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(root), env.get("PYTHONPATH")]))
+    claim = [
+        "--estimate", str(estimate), "--bcif", str(bcif), "--output-dir", str(workdir / "out" / "startup"),
+        "--no-parse-cache", "--no-reuse",
+    ]
+
+    def run(argv: List[str]) -> None:
+        subprocess.run(argv, env=env, cwd=root, check=True, stdout=subprocess.DEVNULL)
+
+    record("startup[help]", lambda: run(_cli("--help")))
+    record("startup[cold]", lambda: run(_cli(*claim, "--no-daemon")))
+    daemon = subprocess.Popen(
+        [sys.executable, "-m", "total.claim_daemon", "--workers", "1", "--bcif", str(bcif)],
+        env=env, cwd=root, stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while not (workdir / "daemon.sock").exists():
+            if daemon.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("Claim daemon did not start")
+            time.sleep(0.05)
+        record("startup[warm]", lambda: run(_cli(*claim)))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+
+def run_benchmarks(
+    page_counts: List[int],
+    placements: List[str],
+    repeat: int,
+    workdir: Path,
+) -> Dict[str, Dict[str, float]]:
+    """Generates the synthetic inputs in ``workdir`` and runs every case.
+
+    Returns:
+        Case name → timing dictionary (see :func:`_measure`).
+    """
+    bcif = make_bcif_template(workdir / "bcif.pdf")
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(name: str, fn: Callable[[], Any]) -> None:
+        results[name] = _measure(fn, repeat)
+        row = results[name]
+        print(f"{name:<55} {row['median_s'] * 1000:>9.2f} ms {row['per_sec']:>9.2f}/s {row['peak_kb']:>8} KB")
+
+    parser = process_claim.build_parser()
+    assembled: Dict[str, Optional[str]] = {}
+    for pages in page_counts:
+        for placement in placements:
+            estimate = make_estimate_pdf(workdir / f"estimate_{pages}_{placement}.pdf", pages, placement)
+            tag = f"pages={pages},placement={placement}"
+            text = parse_estimate.read_pdf_text(estimate)
+            record(f"read_pdf_text[{tag}]", lambda: parse_estimate.read_pdf_text(estimate))
+            record(f"extract_vehicle_info[{tag}]", lambda: parse_estimate.extract_vehicle_info(text))
+            record(f"parse_estimate[{tag}]", lambda: parse_estimate.parse_estimate(estimate))
+            args = parser.parse_args([
+                "--estimate", str(estimate), "--bcif", str(bcif),
+                "--output-dir", str(workdir / "out" / tag.replace(",", "_").replace("=", "")),
+                "--no-parse-cache", "--no-reuse", "--customer-name", "Bench Customer", "--claim-number", "B-1",
+            ])
+            record(f"pipeline[{tag}]", lambda: process_claim.process_claim(args, log=lambda *a, **k: None))
+            assembled = process_claim.process_claim(args, log=lambda *a, **k: None)["assembled"]
+
+    first = workdir / f"estimate_{page_counts[0]}_{placements[0]}.pdf"
+    run_startup_benchmarks(first, bcif, repeat, workdir, record)
+
+    out_pdf = workdir / "filled.pdf"
+    record("fill_bcif", lambda: process_claim.fill_bcif(bcif, assembled, out_pdf))
+    bids = [{"vendor": "SellMax", "bid": 4100}, {"vendor": "Peddle", "bid": 3900}]
+    record(
+        "build_summary_text",
+        lambda: summary_utils.build_summary_text(
+            {"claim_number": "B-1"}, {k: assembled.get(k) for k in ("year", "make", "model", "vin")},
+            12000, bids, True,
+        ),
+    )
+    return results
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> str:
+    """Formats the per‑case change in median time against ``baseline``."""
+    lines = [f"{'case':<55} {'base ms':>9} {'now ms':>9} {'change':>8}"]
+    for name, row in current.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        change = (row["median_s"] - old["median_s"]) / old["median_s"] * 100 if old["median_s"] else 0.0
+        lines.append(
+            f"{name:<55} {old['median_s'] * 1000:>9.2f} {row['median_s'] * 1000:>9.2f} {change:>+7.1f}%"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the claim pipeline on synthetic estimates")
+    parser.add_argument("--pages", default="1,10,50,100", help="Comma-separated estimate page counts")
+    parser.add_argument("--placements", default="first,last", help="Where the vehicle block goes: first, middle, last")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case")
+    parser.add_argument("--output", default="bench_results", help="Folder for the results JSON")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    page_counts = [int(p) for p in args.pages.split(",") if p]
+    placements = [p for p in args.placements.split(",") if p]
+    with tempfile.TemporaryDirectory(prefix="claim_bench_") as tmp:
+        results = run_benchmarks(page_counts, placements, args.repeat, Path(tmp))
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_path = output_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    with out_path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Results saved to", out_path)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(compare(results, baseline))
+
+
+if __name__ == "__main__":
+    main()
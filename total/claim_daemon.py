@@ -0,0 +1,195 @@
+"""
+claim_daemon.py
+===============
+
+A local worker daemon that ``process_claim.py`` hands its job to.
+
+Every ``python -m total.process_claim`` run starts a new interpreter,
+imports ``pdfplumber``/``pdfminer``/Pillow and ``pdfrw`` and parses the
+BCIF template before it can look at the estimate.  The daemon keeps a
+few warm worker processes around instead (see
+:func:`claim_service.warm_worker`) and listens on a Unix socket:
+
+* When ``process_claim.py`` starts it checks for the socket.  If a
+  daemon is listening, the command line and working directory are sent
+  to it, the claim runs in a warm worker, and the client prints the
+  progress messages it gets back and exits – the client itself never
+  imports the PDF libraries.
+* If no daemon is running (or ``--no-daemon`` is given) the claim runs
+  in the client process as before.
+
+The socket defaults to ``daemon.sock`` next to the parse cache
+(``~/.cache/claim_cipher``) and can be set with the
+``CLAIM_CIPHER_DAEMON_SOCKET`` environment variable.  It is created
+readable and writable by its owner only.  Claims run with the daemon's
+environment, so start it with the same ``CLAIM_CIPHER_*`` settings the
+clients would use.
+
+The protocol is one JSON object per line: the request is
+``{"argv": [...], "cwd": "..."}`` and the reply
+``{"log": [...], "error": null}``, with ``error`` set to a message if
+the claim failed.
+
+Usage::
+
+    python -m total.claim_daemon --workers 2 --bcif "input/CCC BCIF.pdf" &
+    python -m total.process_claim --estimate estimate.pdf   # served by the daemon
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import parse_cache
+
+_CONNECT_TIMEOUT = 0.5
+
+
+def default_socket_path() -> Path:
+    """Socket of the daemon: ``CLAIM_CIPHER_DAEMON_SOCKET`` or next to the parse cache."""
+    configured = os.getenv("CLAIM_CIPHER_DAEMON_SOCKET")
+    return Path(configured) if configured else parse_cache.default_cache_path().with_name("daemon.sock")
+
+
+def run_argv(argv: List[str], cwd: str) -> Dict[str, Any]:
+    """Worker entry point: runs ``process_claim.py`` with ``argv`` in ``cwd``.
+
+    Returns:
+        ``{"log": [...], "error": None}`` or, if the claim failed, the
+        error message in ``error``.
+    """
+    from . import process_claim
+
+    lines: List[str] = []
+
+    def log(*values: Any, **_kwargs: Any) -> None:
+        lines.append(" ".join(str(value) for value in values))
+
+    os.chdir(cwd)
+    try:
+        args = process_claim.build_parser().parse_args(argv)
+        process_claim.process_claim(args, log=log)
+    except SystemExit as exc:
+        return {"log": lines, "error": f"invalid arguments (exit status {exc.code})"}
+    except Exception as exc:  # noqa: BLE001 - reported to the client
+        return {"log": lines, "error": f"{type(exc).__name__}: {exc}"}
+    return {"log": lines, "error": None}
+
+
+def submit(argv: List[str], cwd: Optional[str] = None, socket_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """Runs a claim on the daemon, if one is listening.
+
+    Args:
+        argv: ``process_claim.py`` arguments.
+        cwd: Directory relative paths in ``argv`` are resolved against.
+            Defaults to the current directory.
+        socket_path: Defaults to :func:`default_socket_path`.
+
+    Returns:
+        The daemon's reply, or ``None`` if no daemon is running.
+    """
+    path = Path(socket_path) if socket_path else default_socket_path()
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(_CONNECT_TIMEOUT)
+        try:
+            client.connect(str(path))
+        except (ConnectionRefusedError, FileNotFoundError, socket.timeout):
+            # A socket file left behind by a daemon that is gone
+            return None
+        client.settimeout(None)
+        request = {"argv": list(argv), "cwd": cwd or os.getcwd()}
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as reply:
+            line = reply.readline()
+    finally:
+        client.close()
+    if not line:
+        raise ConnectionError(f"Claim daemon at {path} closed the connection")
+    return json.loads(line)
+
+
+class _ClaimHandler(socketserver.StreamRequestHandler):
+    pool: Any  # set on the subclass built by serve()
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            reply = self.pool.submit(run_argv, list(request["argv"]), str(request["cwd"])).result()
+        except (ValueError, KeyError, TypeError) as exc:
+            reply = {"log": [], "error": f"bad request: {exc}"}
+        except Exception as exc:  # noqa: BLE001 - e.g. a worker process died
+            reply = {"log": [], "error": f"{type(exc).__name__}: {exc}"}
+        self.wfile.write(json.dumps(reply, default=str).encode("utf-8") + b"\n")
+
+
+def serve(socket_path: Path, workers: int, bcif_path: Optional[str] = None) -> None:
+    """Listens on ``socket_path`` until interrupted.
+
+    Raises:
+        RuntimeError: If another daemon is already listening there.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from . import claim_service
+
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()  # stale
+        else:
+            raise RuntimeError(f"A claim daemon is already listening on {socket_path}")
+        finally:
+            probe.close()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=claim_service.warm_worker, initargs=(bcif_path,))
+    # Start every worker now rather than on the first claims
+    for future in [pool.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+    handler = type("BoundClaimHandler", (_ClaimHandler,), {"pool": pool})
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(socket_path), handler)
+    finally:
+        os.umask(old_umask)
+    # Shut down cleanly on SIGTERM too, so the workers do not outlive us
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Claim daemon listening on {socket_path} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+        pool.shutdown(wait=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run claims for process_claim.py on warm worker processes")
+    parser.add_argument("--socket", help="Unix socket to listen on (default: CLAIM_CIPHER_DAEMON_SOCKET or ~/.cache/claim_cipher/daemon.sock)")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes (claims run concurrently)")
+    parser.add_argument("--bcif", help="BCIF template to load into every worker up front")
+    args = parser.parse_args()
+    serve(Path(args.socket) if args.socket else default_socket_path(), args.workers, args.bcif)
+
+
+if __name__ == "__main__":
+    main()
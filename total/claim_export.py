@@ -0,0 +1,300 @@
+"""
+claim_export.py
+===============
+
+Columnar export of processed claims for analytics.
+
+Every run of the pipeline leaves an ``assembled_data.json`` and a
+summary in its own output folder, and analytics jobs had to crawl
+thousands of those small files.  With ``--export-dir`` each processed
+claim is also appended as one row to a dataset in Apache Parquet (or
+Arrow IPC) format, partitioned by processing date::
+
+    exports/
+        date=2026-10-16/part-20261016T091500-4711-1a2b3c4d.parquet
+        date=2026-10-17/...
+
+Each row holds the :func:`process_claim.assemble_data` fields, the NADA
+value, the salvage bids, the total‑loss flag, the stage timings, the
+SHA‑256 of the source PDF and the time it was processed (UTC).
+
+Rows are buffered by :class:`ClaimExporter` and written as one row
+group per ``row_group_size`` claims, so a batch run produces a few
+well‑sized files instead of one per claim; files are never appended
+to after they are closed, so concurrent writers cannot corrupt each
+other.  :func:`compact` merges a day's files into one.
+
+:func:`load_claims` reads a date range back as a ``pyarrow.Table``;
+only the partitions in the range are opened and only the requested
+columns are read::
+
+    table = load_claims("exports", "2026-10-01", "2026-10-31", columns=["vin", "nada_value"])
+    df = table.to_pandas()
+
+Requires ``pyarrow``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Keys of process_claim.assemble_data(), in output order
+ASSEMBLED_FIELDS = (
+    "customer_name", "adjuster_name", "claim_number", "date_of_loss",
+    "inspection_location", "vin", "year", "make", "model", "mileage",
+    "damages", "days_to_repair",
+)
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+DEFAULT_ROW_GROUP_SIZE = 1024
+
+
+def claim_schema() -> Any:
+    """The ``pyarrow`` schema of an exported claim row."""
+    import pyarrow as pa  # type: ignore
+
+    return pa.schema(
+        [
+            ("processed_at", pa.timestamp("ms", tz="UTC")),
+            ("estimate", pa.string()),
+            ("pdf_hash", pa.string()),
+            *[(name, pa.string()) for name in ASSEMBLED_FIELDS],
+            ("nada_value", pa.int64()),
+            ("salvage_bids", pa.list_(pa.struct([("vendor", pa.string()), ("bid", pa.int64())]))),
+            ("is_total_loss", pa.bool_()),
+            ("pages_read", pa.int32()),
+            ("ocr_fields", pa.list_(pa.string())),
+            (
+                "timings",
+                pa.list_(pa.struct([
+                    ("stage", pa.string()), ("wall_s", pa.float64()),
+                    ("cpu_s", pa.float64()), ("max_rss_kb", pa.int64()),
+                ])),
+            ),
+        ]
+    )
+
+
+def claim_row(result: Dict[str, Any], processed_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Flattens a :func:`process_claim.process_claim` result into a row."""
+    assembled = result.get("assembled") or {}
+    row: Dict[str, Any] = {
+        "processed_at": processed_at or datetime.now(timezone.utc),
+        "estimate": result.get("estimate"),
+        "pdf_hash": result.get("pdf_hash"),
+    }
+    for name in ASSEMBLED_FIELDS:
+        value = assembled.get(name)
+        row[name] = None if value is None else str(value)
+    row.update(
+        nada_value=result.get("nada_value"),
+        salvage_bids=[{"vendor": b["vendor"], "bid": int(b["bid"])} for b in result.get("salvage_bids") or []],
+        is_total_loss=bool(result.get("is_total_loss")),
+        pages_read=result.get("pages_read"),
+        ocr_fields=list(result.get("ocr_fields") or []),
+        timings=[
+            {k: t.get(k) for k in ("stage", "wall_s", "cpu_s", "max_rss_kb")}
+            for t in result.get("timings") or []
+        ],
+    )
+    return row
+
+
+class ClaimExporter:
+    """Buffers claim rows and writes them to a date‑partitioned dataset.
+
+    Use as a context manager, or call :meth:`close` to write the rows
+    still buffered.
+
+    Args:
+        root: Dataset folder.
+        fmt: ``"parquet"`` or ``"arrow"`` (Arrow IPC file format).
+        row_group_size: Rows buffered per partition before a row group
+            is written.
+    """
+
+    def __init__(self, root: Path, fmt: str = "parquet", row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.root = Path(root)
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.schema = claim_schema()
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._writers: Dict[str, Any] = {}
+        self.rows_written = 0
+
+    def __enter__(self) -> "ClaimExporter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """Adds one row (see :func:`claim_row`)."""
+        date = row["processed_at"].astimezone(timezone.utc).date().isoformat()
+        buffer = self._buffers.setdefault(date, [])
+        buffer.append(row)
+        if len(buffer) >= self.row_group_size:
+            self._write_group(date)
+
+    def _open_writer(self, date: str) -> Any:
+        import pyarrow as pa  # type: ignore
+
+        folder = self.root / f"date={date}"
+        folder.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = folder / f"part-{stamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}{FORMATS[self.fmt]}"
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq  # type: ignore
+
+            return pq.ParquetWriter(str(path), self.schema, compression="zstd")
+        return pa.ipc.new_file(str(path), self.schema)
+
+    def _write_group(self, date: str) -> None:
+        import pyarrow as pa  # type: ignore
+
+        rows = self._buffers.pop(date, [])
+        if not rows:
+            return
+        writer = self._writers.get(date)
+        if writer is None:
+            writer = self._writers[date] = self._open_writer(date)
+        writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+        self.rows_written += len(rows)
+
+    def flush(self) -> None:
+        """Writes every buffered row as a row group."""
+        for date in list(self._buffers):
+            self._write_group(date)
+
+    def close(self) -> None:
+        """Flushes and closes every open file."""
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+def export_claims(
+    results: Iterable[Dict[str, Any]],
+    root: Path,
+    fmt: str = "parquet",
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> int:
+    """Exports pipeline results and returns the number of rows written."""
+    with ClaimExporter(root, fmt, row_group_size) as exporter:
+        for result in results:
+            exporter.append(claim_row(result))
+    return exporter.rows_written
+
+
+def _dataset(root: Path, fmt: str) -> Any:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.dataset as ds  # type: ignore
+
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    return ds.dataset(
+        str(root), schema=claim_schema().append(pa.field("date", pa.string())),
+        format="parquet" if fmt == "parquet" else "ipc", partitioning=partitioning,
+    )
+
+
+def load_claims(
+    root: Path,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    fmt: str = "parquet",
+) -> Any:
+    """Loads the claims processed between two dates (inclusive).
+
+    Args:
+        root: Dataset folder.
+        start: First date as ``YYYY-MM-DD``, or ``None`` for no limit.
+        end: Last date as ``YYYY-MM-DD``, or ``None`` for no limit.
+        columns: Columns to read (``date`` is the partition column).
+            Defaults to all.
+        fmt: Format the dataset was written in.
+
+    Returns:
+        A ``pyarrow.Table``.  Partitions outside the range are not
+        opened.
+    """
+    import pyarrow.dataset as ds  # type: ignore
+
+    dataset = _dataset(Path(root), fmt)
+    condition = None
+    if start:
+        condition = ds.field("date") >= start
+    if end:
+        upper = ds.field("date") <= end
+        condition = upper if condition is None else condition & upper
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def compact(root: Path, date: str, fmt: str = "parquet", row_group_size: int = 64 * 1024) -> Optional[Path]:
+    """Rewrites one day's partition as a single file.
+
+    Returns:
+        The new file, or ``None`` if the partition does not exist.
+    """
+    folder = Path(root) / f"date={date}"
+    old = sorted(folder.glob(f"*{FORMATS[fmt]}")) if folder.is_dir() else []
+    if not old:
+        return None
+    table = load_claims(root, date, date, columns=list(claim_schema().names), fmt=fmt)
+    exporter = ClaimExporter(root, fmt, row_group_size)
+    writer = exporter._open_writer(date)
+    try:
+        if fmt == "parquet":
+            writer.write_table(table, row_group_size=row_group_size)
+        else:
+            writer.write_table(table, max_chunksize=row_group_size)
+    finally:
+        writer.close()
+    for path in old:
+        path.unlink()
+    return next(folder.glob(f"*{FORMATS[fmt]}"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query or compact the exported claims dataset")
+    parser.add_argument("root", help="Dataset folder (the --export-dir of the pipeline)")
+    parser.add_argument("--start", help="First processing date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last processing date (YYYY-MM-DD)")
+    parser.add_argument("--columns", help="Comma-separated columns to read")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet", help="Dataset format")
+    parser.add_argument("--output", help="Write the selected rows to this .csv or .parquet file")
+    parser.add_argument("--compact", metavar="DATE", help="Merge the files of one date partition into one")
+    args = parser.parse_args()
+
+    if args.compact:
+        print("Compacted into", compact(Path(args.root), args.compact, args.format))
+        return
+    columns = [c for c in args.columns.split(",") if c] if args.columns else None
+    table = load_claims(Path(args.root), args.start, args.end, columns=columns, fmt=args.format)
+    print(f"{table.num_rows} claim(s)")
+    if args.output:
+        if args.output.endswith(".csv"):
+            import pyarrow as pa  # type: ignore
+            import pyarrow.csv as pcsv  # type: ignore
+
+            # CSV has no nested types; leave out bids, timings and OCR flags
+            flat = table.select([f.name for f in table.schema if not pa.types.is_list(f.type)])
+            pcsv.write_csv(flat, args.output)
+        else:
+            import pyarrow.parquet as pq  # type: ignore
+
+            pq.write_table(table, args.output)
+        print("Written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
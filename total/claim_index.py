@@ -0,0 +1,395 @@
+"""
+claim_index.py
+==============
+
+A persistent index of processed claims for spotting duplicates and
+supplements.
+
+The same estimate is often sent twice, and supplements – revised
+estimates for a claim that was already handled – arrive as new PDFs.
+Both used to be processed as brand new claims.  :class:`ClaimIndex`
+records every claim :mod:`batch_process` finishes in a SQLite database
+and answers three questions before the next one runs:
+
+* **Exact duplicate** – a claim with the same SHA‑256 of the PDF bytes
+  was processed before.  The batch skips it and points at the earlier
+  output folder.
+* **Supplement** – a claim with the same claim number, or an estimate
+  whose text is nearly the same (and whose VIN, where both are known,
+  matches), was processed before.  The new claim is linked to the
+  original one.
+* **What can be reused** – a supplement takes over the original
+  claim's saved stage results (see :meth:`stage_store.StageStore.adopt`),
+  so only the stages whose inputs changed run again.
+
+The lookup runs after the estimate has been parsed: the signature is
+built from the page text the parse cache stores (:func:`page_signature`)
+and the claim number is read from it (:func:`claim_number_in`), so the
+PDF is not opened again.
+
+Within one batch a claim is only added to the index when it finishes,
+so a supplement is linked to an original in the same batch only if the
+original finished before the supplement was parsed.  With several
+workers that depends on the order the claims complete in; put
+supplements in a later batch when the link matters.
+
+Near duplicates are found with MinHash: the page text the parse cache
+stored – the pages read until every field was found, at most
+:data:`SIGNATURE_PAGES` of them – is cut into overlapping five‑word
+shingles and summarised as :data:`NUM_PERM` minimum hash values
+(:func:`minhash`).  The fraction of equal values estimates the Jaccard
+similarity of the two shingle sets.  The signature is split into
+:data:`BANDS` bands and each band is hashed to one integer key
+(:func:`lsh_keys`); two estimates become candidates when any key is
+equal, which one indexed ``IN`` query finds without scanning.  Every
+lookup is a B‑tree search, so it stays well under a millisecond with
+millions of claims.
+
+The database defaults to ``claim_index.sqlite`` next to the parse cache
+(see :mod:`parse_cache`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from . import parse_cache
+from .field_extraction import CLAIM_RULES, FieldScanner, match_values
+
+if TYPE_CHECKING:
+    import numpy as np
+
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_WORDS = 5
+SIGNATURE_PAGES = 5
+
+# Estimated Jaccard similarity above which two estimates are the same
+# document in different versions
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE = (1 << 31) - 1
+_CHUNK = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    id INTEGER PRIMARY KEY,
+    pdf_hash TEXT NOT NULL UNIQUE,
+    vin TEXT,
+    claim_number TEXT,
+    estimate TEXT NOT NULL,
+    output_dir TEXT,
+    original_id INTEGER REFERENCES claims (id),
+    signature BLOB,
+    processed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS claims_vin ON claims (vin);
+CREATE INDEX IF NOT EXISTS claims_claim_number ON claims (claim_number);
+CREATE TABLE IF NOT EXISTS lsh (
+    key INTEGER NOT NULL,
+    claim_id INTEGER NOT NULL,
+    PRIMARY KEY (key, claim_id)
+) WITHOUT ROWID;
+"""
+
+
+def default_index_path() -> Path:
+    """``claim_index.sqlite`` next to the parse cache."""
+    return parse_cache.default_cache_path().with_name("claim_index.sqlite")
+
+
+def _permutations() -> Tuple["np.ndarray", "np.ndarray"]:
+    import numpy as np
+
+    # Fixed seed: signatures must be comparable across runs
+    rng = np.random.default_rng(0x5EED)
+    a = rng.integers(1, _MERSENNE, size=NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE, size=NUM_PERM, dtype=np.uint64)
+    return a, b
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[int]:
+    """32‑bit hashes of the overlapping ``size``‑word windows of ``text``.
+
+    Words are lower‑cased, so reflowed or re‑printed text gives the
+    same shingles.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return [zlib.crc32(" ".join(words).encode("utf-8"))] if words else []
+    return [zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)]
+
+
+def minhash(page_texts: Iterable[str]) -> "np.ndarray":
+    """MinHash signature of the shingles of ``page_texts``.
+
+    Returns:
+        ``NUM_PERM`` unsigned 32‑bit values; all ``2**31 - 1`` for a
+        document without text.
+    """
+    import numpy as np
+
+    hashes = np.unique(np.fromiter(
+        (h for text in page_texts for h in shingles(text)), dtype=np.uint64
+    ))
+    a, b = _permutations()
+    signature = np.full(NUM_PERM, _MERSENNE, dtype=np.uint64)
+    # (a * x + b) mod p stays below 2**63 because a, b < 2**31 and x < 2**32
+    for start in range(0, hashes.shape[0], _CHUNK):
+        chunk = hashes[start:start + _CHUNK]
+        values = (np.outer(a, chunk) + b[:, None]) % _MERSENNE
+        signature = np.minimum(signature, values.min(axis=1))
+    return signature.astype(np.uint32)
+
+
+def similarity(first: "np.ndarray", second: "np.ndarray") -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float((first == second).mean())
+
+
+def lsh_keys(signature: Any) -> List[int]:
+    """One signed 64‑bit key per band of ``signature``."""
+    rows = NUM_PERM // BANDS
+    data = _signature_blob(signature)
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(data[band * rows * 4:(band + 1) * rows * 4], digest_size=8, person=bytes([band]))
+        keys.append(int.from_bytes(digest.digest(), "little", signed=True))
+    return keys
+
+
+def page_signature(page_texts: List[str]) -> Optional["np.ndarray"]:
+    """MinHash signature of the page texts the parse cache stored.
+
+    The parser stops at the page where it has found every field and
+    the cache keeps only the pages it read, so ``page_texts`` may hold
+    fewer than :data:`SIGNATURE_PAGES` pages; at most that many are
+    used.  Two versions of one estimate usually stop on the same page,
+    but a supplement whose fields moved to a later page is compared on
+    more pages than its original and scores lower.
+
+    Returns:
+        ``None`` when there is no text, e.g. for a parse made with
+        ``--extraction layout`` (which stores no page text).
+    """
+    texts = [text for text in page_texts[:SIGNATURE_PAGES] if text.strip()]
+    return minhash(texts) if texts else None
+
+
+_CLAIM_NUMBER_SCANNER = FieldScanner([rule for rule in CLAIM_RULES if rule.name == "claim_number"])
+
+
+def claim_number_in(page_texts: Iterable[str]) -> Optional[str]:
+    """The claim number printed in an estimate's page texts, if any."""
+    matches, _pages_read = _CLAIM_NUMBER_SCANNER.scan_pages(page_texts)
+    return match_values(matches, ["claim_number"])["claim_number"]
+
+
+def _signature_blob(signature: Any) -> Optional[bytes]:
+    """Signature (an array or a list of ints) as little‑endian bytes."""
+    import numpy as np
+
+    return None if signature is None else np.asarray(signature, dtype="<u4").tobytes()
+
+
+def _signature_array(blob: Optional[bytes]) -> Optional["np.ndarray"]:
+    import numpy as np
+
+    return None if blob is None else np.frombuffer(blob, dtype="<u4")
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().upper()
+    return value or None
+
+
+class ClaimIndex:
+    """SQLite index of processed claims.
+
+    Several processes may read the index at once; writes should come
+    from one process (in a batch, the parent).
+
+    Args:
+        path: Database file.  Defaults to :func:`default_index_path`.
+        read_only: Open without creating or changing anything.  A
+            missing database then behaves as an empty index.
+    """
+
+    _COLUMNS = "id, pdf_hash, vin, claim_number, estimate, output_dir, original_id, processed"
+
+    def __init__(self, path: Optional[Path] = None, read_only: bool = False):
+        self.path = Path(path) if path else default_index_path()
+        self.read_only = read_only
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            if self.read_only:
+                if not self.path.exists():
+                    return None
+                self._conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                self._conn = conn
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _one(self, where: str, params: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        if conn is None:
+            return None
+        row = conn.execute(f"SELECT {self._COLUMNS} FROM claims WHERE {where}", params).fetchone()
+        return dict(row) if row is not None else None
+
+    def find_exact(self, pdf_hash: str) -> Optional[Dict[str, Any]]:
+        """The claim processed from a PDF with this hash, if any."""
+        return self._one("pdf_hash = ?", (pdf_hash,))
+
+    def find_claim(self, claim_number: str) -> Optional[Dict[str, Any]]:
+        """The first claim recorded under ``claim_number``."""
+        claim_number = _clean(claim_number)
+        if claim_number is None:
+            return None
+        return self._one("claim_number = ? ORDER BY id LIMIT 1", (claim_number,))
+
+    def find_similar(
+        self,
+        signature: "np.ndarray",
+        vin: Optional[str] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Claims whose estimate text is nearly the same.
+
+        Args:
+            signature: :func:`minhash` of the new estimate.
+            vin: If given, claims recorded with a different VIN are
+                left out.
+            threshold: Minimum estimated similarity.
+
+        Returns:
+            ``(claim, similarity)`` pairs, most similar first.
+        """
+        conn = self._connect()
+        if conn is None:
+            return []
+        keys = lsh_keys(signature)
+        rows = conn.execute(
+            f"SELECT {self._COLUMNS}, signature FROM claims WHERE id IN "
+            f"(SELECT claim_id FROM lsh WHERE key IN ({', '.join('?' * len(keys))}))",
+            keys,
+        ).fetchall()
+        vin = _clean(vin)
+        matches = []
+        for row in rows:
+            if vin and row["vin"] and row["vin"] != vin:
+                continue
+            score = similarity(signature, _signature_array(row["signature"]))
+            if score >= threshold:
+                claim = dict(row)
+                del claim["signature"]
+                matches.append((claim, score))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def find_original(
+        self,
+        claim_number: Optional[str] = None,
+        vin: Optional[str] = None,
+        signature: Optional["np.ndarray"] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+    ) -> Optional[Tuple[Dict[str, Any], str, Optional[float]]]:
+        """The original claim a new estimate is a supplement of, if any.
+
+        A claim with the same claim number wins; otherwise the most
+        similar estimate with a compatible VIN.  When the match is
+        itself a supplement its original is returned.
+
+        Returns:
+            ``(claim, reason, similarity)`` with ``reason`` either
+            ``"claim_number"`` or ``"similar_text"``, or ``None``.
+        """
+        found: Optional[Tuple[Dict[str, Any], str, Optional[float]]] = None
+        claim = self.find_claim(claim_number) if claim_number else None
+        if claim is not None:
+            found = (claim, "claim_number", None)
+        elif signature is not None:
+            similar = self.find_similar(signature, vin=vin, threshold=threshold)
+            if similar:
+                found = (similar[0][0], "similar_text", similar[0][1])
+        if found is not None and found[0]["original_id"] is not None:
+            root = self._one("id = ?", (found[0]["original_id"],))
+            if root is not None:
+                found = (root,) + found[1:]
+        return found
+
+    def add(
+        self,
+        pdf_hash: str,
+        estimate: str,
+        vin: Optional[str] = None,
+        claim_number: Optional[str] = None,
+        output_dir: Optional[str] = None,
+        signature: Any = None,
+        original_id: Optional[int] = None,
+    ) -> int:
+        """Records a processed claim and returns its id.
+
+        Adding a PDF hash that is already indexed returns the existing
+        id and changes nothing.
+        """
+        conn = self._connect()
+        if conn is None or self.read_only:
+            raise RuntimeError("Claim index was opened read-only")
+        existing = self.find_exact(pdf_hash)
+        if existing is not None:
+            return existing["id"]
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO claims (pdf_hash, vin, claim_number, estimate, output_dir, original_id, signature, processed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    pdf_hash, _clean(vin), _clean(claim_number), estimate, output_dir,
+                    original_id, _signature_blob(signature), time.time(),
+                ),
+            )
+            claim_id = cursor.lastrowid
+            if signature is not None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO lsh (key, claim_id) VALUES (?, ?)",
+                    [(key, claim_id) for key in lsh_keys(signature)],
+                )
+        return claim_id
+
+    def supplements(self, claim_id: int) -> List[Dict[str, Any]]:
+        """Claims linked to ``claim_id`` as supplements, oldest first."""
+        conn = self._connect()
+        if conn is None:
+            return []
+        rows = conn.execute(
+            f"SELECT {self._COLUMNS} FROM claims WHERE original_id = ? ORDER BY id", (claim_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Number of claims and of supplements in the index."""
+        conn = self._connect()
+        if conn is None:
+            return {"claims": 0, "supplements": 0}
+        claims, supplements = conn.execute(
+            "SELECT COUNT(*), COUNT(original_id) FROM claims"
+        ).fetchone()
+        return {"claims": claims, "supplements": supplements}
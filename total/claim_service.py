@@ -0,0 +1,732 @@
+"""
+claim_service.py
+================
+
+A small local HTTP service that runs the :mod:`process_claim` pipeline
+on a pool of warm worker processes.
+
+Shelling out to ``python process_claim.py`` for every claim pays the
+interpreter start‑up and the ``pdfplumber``/``pdfrw`` imports each
+time.  This service starts a fixed number of workers once; each one
+imports the PDF libraries, parses the BCIF template, loads the VIN
+table and sets up the summary renderer before the first request
+arrives.  A missing template does not stop the service: the parse,
+decode, value and summary endpoints keep working and each ``POST
+/claims`` answers with the error.
+
+Endpoints:
+
+``POST /claims``
+    Either the raw estimate PDF as the body (``Content-Type:
+    application/pdf``) with the claim fields as a JSON object in the
+    ``X-Claim-Fields`` header, or a JSON body of the form
+    ``{"estimate_b64": "...", "fields": {...}}``.  Field names are the
+    ``process_claim.py`` options, e.g. ``customer_name``,
+    ``claim_number`` or ``total_loss``.  Like ``POST /parse`` the body
+    may be sent chunked and is streamed to a temporary file, and it is
+    refused past :data:`MAX_UPLOAD_BYTES` (the base64 text of a JSON
+    body counts against the limit).
+
+    The response is a ZIP archive streamed back in chunks containing
+    ``filled_bcif.pdf``, the claim summary and ``assembled_data.json``.
+    Add ``?format=json`` to get a JSON document with the assembled
+    data, valuation and the files base64‑encoded instead.
+
+``POST /parse``
+    The estimate PDF as the raw body, sent with a ``Content-Length`` or
+    as ``Transfer-Encoding: chunked``.  The body is streamed to a
+    temporary file in 64 KiB chunks and hashed on the way, so a large
+    estimate is never held in memory.  The fields are read with the
+    extraction rules and parse cache ``process_claim.py`` uses, so the
+    result is the one the command line gets, and a PDF either of them
+    has parsed before is answered from the cache without a worker.
+    ``?extraction=layout`` selects the layout extraction.  Returns
+    ``{"pdf_hash", "extraction", "fields", "pages_read", "cache_hit"}``.
+
+``GET /parse/<sha256>``
+    The cached parse of the PDF with that hash, or ``404`` if it has
+    not been parsed yet.  A client that hashes the file itself can
+    skip the upload this way.
+
+``GET /decode?vin=...``
+    The decoded VIN (``decoded``) and its basic attributes
+    (``vehicle``).  ``&remote=1`` falls back to vPIC when the bundled
+    table cannot resolve the VIN; that lookup takes a worker, so it
+    counts against the queue limit below.
+
+``GET /value?year=...&mileage=...&make=...``
+    ``{"nada_value", "salvage_bids"}`` for a vehicle.
+
+``POST /summary``
+    A JSON body ``{"fields": {...}, "nada_value": ..., "salvage_bids":
+    [...]}`` with claim fields as for ``POST /claims``; the value and
+    bids are computed from the fields when left out.  Returns
+    ``{"summary", "nada_value", "salvage_bids"}``, or the summary PDF
+    with ``?format=pdf``.
+
+``GET /health``
+    Worker count, requests in flight and the queue limit.
+
+The parse, decode, value and summary endpoints are what the web page
+(``total-loss.js``) calls instead of parsing the estimate in the
+browser.  Start the service with ``--allow-origin`` set to the page's
+origin (or ``*``) so the browser lets the page read the responses.
+
+At most ``--workers`` claims are processed at once; up to
+``--max-queue`` further requests wait for a worker.  Beyond that the
+service answers ``503`` with a ``Retry-After`` header so the web tier
+can back off.
+
+Usage::
+
+    python -m total.claim_service --port 8765 --workers 4 --bcif "input/CCC BCIF.pdf" \\
+        --allow-origin http://localhost:8000
+    curl -s -X POST -T estimate.pdf -H "Transfer-Encoding: chunked" http://127.0.0.1:8765/parse
+    curl -s --data-binary @estimate.pdf -H "Content-Type: application/pdf" \\
+        -H 'X-Claim-Fields: {"claim_number": "12345"}' \\
+        http://127.0.0.1:8765/claims -o claim.zip
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from . import bcif_utils
+from . import memory_limits
+from . import ocr_utils
+from . import parse_cache
+from . import process_claim
+from . import salvage_utils
+from . import summary_utils
+from . import vin_utils
+
+# Claim fields a client may set.  Paths and cache options stay under the
+# control of whoever started the service.
+CLAIM_FIELDS = (
+    "customer_name", "adjuster_name", "claim_number", "date_of_loss",
+    "location", "vin", "year", "make", "model", "mileage", "damages",
+    "days_to_repair", "total_loss",
+)
+
+EXTRACTIONS = ("text", "layout")
+
+# Largest estimate accepted by POST /parse and POST /claims
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+
+_STREAM_CHUNK = 64 * 1024
+
+_PDF_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+class ServiceBusy(Exception):
+    """Raised when the request queue is full."""
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload is larger than :data:`MAX_UPLOAD_BYTES`."""
+
+
+def warm_worker(bcif_path: Optional[str]) -> None:
+    """Pool initialiser: loads everything a claim needs up front."""
+    import pdfplumber  # type: ignore  # noqa: F401
+
+    vin_utils.warm()
+    if bcif_path:
+        try:
+            bcif_utils.get_template(Path(bcif_path))
+        except Exception:  # noqa: BLE001 - reported per claim instead
+            pass
+    try:
+        summary_utils.get_renderer()
+    except ImportError:
+        pass  # summaries fall back to .txt
+
+
+def claim_options(fields: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Merges client ``fields`` into the service's default options.
+
+    Raises:
+        ValueError: If ``fields`` contains a key that is not a claim
+            field.
+    """
+    options = dict(defaults)
+    for key, value in fields.items():
+        name = key.strip().lstrip("-").replace("-", "_").lower()
+        if name not in CLAIM_FIELDS:
+            raise ValueError(f"Unknown claim field: {key}")
+        if name == "total_loss":
+            value = value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+        options[name] = value
+    return options
+
+
+def run_claim(pdf_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker entry point: processes one uploaded estimate.
+
+    The outputs are written to a temporary folder that is removed
+    before returning; the output files are returned as bytes.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="claim_"))
+    try:
+        options = dict(options, estimate=pdf_path, output_dir=str(workdir / "out"))
+        result = process_claim.process_claim(argparse.Namespace(**options), log=lambda *a, **k: None)
+        files = {Path(path).name: Path(path).read_bytes() for path in result["outputs"].values()}
+        result.pop("outputs")
+        result["files"] = files
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_parse(pdf_path: str, pdf_hash: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker entry point: reads the fields of an uploaded estimate.
+
+    Uses the extraction, parse cache and memory settings in ``options``
+    the same way the parse stage of :func:`process_claim.process_claim`
+    does.
+    """
+    cache = None if options.get("no_parse_cache") else parse_cache.ParseCache(options.get("parse_cache"))
+    monitor = memory_limits.MemoryMonitor(options.get("memory_ceiling"))
+    try:
+        fields, pages_read, cache_hit = parse_cache.cached_scan_estimate(
+            Path(pdf_path), cache, pdf_hash=pdf_hash, extraction=options["extraction"],
+            low_memory=options.get("low_memory", False), monitor=monitor,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+    return {
+        "pdf_hash": pdf_hash,
+        "extraction": options["extraction"],
+        "fields": fields,
+        "pages_read": pages_read,
+        "cache_hit": cache_hit,
+    }
+
+
+def run_decode(vin: str, remote: bool) -> Dict[str, Any]:
+    """Worker entry point for a VIN decode that may go to vPIC.
+
+    A failed vPIC lookup is reported under ``remote_error`` and the
+    local decode is returned.
+    """
+    errors: List[str] = []
+    decoded = vin_utils.decode_vin(vin, remote=remote, log=errors.append)
+    result: Dict[str, Any] = {
+        "vin": vin_utils.normalise_vin(vin),
+        "decoded": decoded,
+        "vehicle": vin_utils.extract_basic_attributes(decoded),
+    }
+    if errors:
+        result["remote_error"] = errors[-1]
+    return result
+
+
+def run_summary(
+    options: Dict[str, Any],
+    nada_value: Optional[int],
+    salvage_bids: Optional[List[Dict[str, int]]],
+    render_pdf: bool,
+) -> Dict[str, Any]:
+    """Worker entry point: builds the summary of a claim from its fields.
+
+    The value and bids are computed as :func:`process_claim.process_claim`
+    computes them unless they are given.  With ``render_pdf`` the
+    summary file is returned as ``file`` (a ``.txt`` file if ``fpdf2``
+    is not installed).
+    """
+    args = argparse.Namespace(**options)
+    assembled = process_claim.assemble_data(args, {}, {})
+    if nada_value is None:
+        nada_value = process_claim.compute_nada_value(
+            assembled.get('year'), assembled.get('mileage'), assembled.get('make')
+        )
+    if salvage_bids is None:
+        salvage_bids = salvage_utils.generate_example_bids(nada_value) if nada_value else []
+    summary = summary_utils.build_summary_text(
+        **process_claim.build_summary_inputs(assembled, nada_value, salvage_bids, args.total_loss)
+    )
+    result: Dict[str, Any] = {"summary": summary, "nada_value": nada_value, "salvage_bids": salvage_bids}
+    if render_pdf:
+        workdir = Path(tempfile.mkdtemp(prefix="summary_"))
+        try:
+            path = summary_utils.generate_summary_pdf(summary, workdir / "claim_summary", salvage_bids=salvage_bids)
+            result["file"] = (path.name, path.read_bytes())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+class ClaimService:
+    """Owns the worker pool and the admission limit.
+
+    Args:
+        workers: Worker processes, i.e. claims processed concurrently.
+        max_queue: Requests allowed to wait for a worker.
+        defaults: ``process_claim`` options used for every claim.
+    """
+
+    def __init__(self, workers: int, max_queue: int, defaults: Dict[str, Any]):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.defaults = defaults
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=warm_worker, initargs=(defaults.get("bcif"),)
+        )
+        # Start every worker now rather than on the first requests
+        for future in [self.pool.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+
+    def submit(self, pdf_path: Path, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Processes a claim, blocking until a worker has finished it.
+
+        Raises:
+            ServiceBusy: If ``workers + max_queue`` requests are already
+                admitted.
+            ValueError: For unknown claim fields.
+            FileNotFoundError: If the BCIF template is missing.
+        """
+        options = claim_options(fields, self.defaults)
+        if not Path(options["bcif"]).is_file():
+            raise FileNotFoundError(f"BCIF template not found: {options['bcif']}")
+        return self._run(run_claim, str(pdf_path), options)
+
+    def _run(self, fn: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+        """Runs ``fn`` on a worker within the admission limit.
+
+        Raises:
+            ServiceBusy: If the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusy()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self.pool.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def _parse_options(self, extraction: Optional[str]) -> Dict[str, Any]:
+        extraction = extraction or self.defaults.get("extraction") or "text"
+        if extraction not in EXTRACTIONS:
+            raise ValueError(f"Unknown extraction: {extraction}")
+        return dict(self.defaults, extraction=extraction)
+
+    def cached_parse(self, pdf_hash: str, extraction: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The cached parse of the PDF with ``pdf_hash``, if there is one.
+
+        Raises:
+            ValueError: For an unknown ``extraction``.
+        """
+        options = self._parse_options(extraction)
+        if options.get("no_parse_cache"):
+            return None
+        cache = parse_cache.ParseCache(options.get("parse_cache"))
+        try:
+            cached = cache.get(pdf_hash, parser_version=parse_cache.parser_version(options["extraction"]))
+        finally:
+            cache.close()
+        if cached is None:
+            return None
+        fields, pages_read, _page_texts = cached
+        return {
+            "pdf_hash": pdf_hash,
+            "extraction": options["extraction"],
+            "fields": fields,
+            "pages_read": pages_read,
+            "cache_hit": True,
+        }
+
+    def parse(self, pdf_path: Path, pdf_hash: str, extraction: Optional[str] = None) -> Dict[str, Any]:
+        """Reads the fields of an estimate; only a cache miss takes a worker.
+
+        Raises:
+            ServiceBusy: If the queue is full.
+            ValueError: For an unknown ``extraction``.
+        """
+        cached = self.cached_parse(pdf_hash, extraction)
+        if cached is not None:
+            return cached
+        return self._run(run_parse, str(pdf_path), pdf_hash, self._parse_options(extraction))
+
+    def decode(self, vin: str, remote: Optional[bool] = None) -> Dict[str, Any]:
+        """Decodes a VIN; ``remote`` defaults to ``--remote-vin-decode``.
+
+        Only a VIN the bundled table cannot resolve goes to vPIC, and
+        that lookup runs on a worker within the admission limit.
+
+        Raises:
+            ServiceBusy: If a vPIC lookup is needed and the queue is full.
+        """
+        if remote is None:
+            remote = bool(self.defaults.get("remote_vin_decode"))
+        local = vin_utils.decode_vin_local(vin)
+        if remote and local and not vin_utils.is_resolved(local):
+            return self._run(run_decode, vin, True)
+        return run_decode(vin, False)
+
+    def value(self, year: Optional[str], mileage: Optional[str] = None, make: Optional[str] = None) -> Dict[str, Any]:
+        """The NADA value and example salvage bids of a vehicle."""
+        nada_value = process_claim.compute_nada_value(year, mileage, make)
+        return {"nada_value": nada_value, "salvage_bids": salvage_utils.generate_example_bids(nada_value)}
+
+    def summary(self, payload: Dict[str, Any], render_pdf: bool = False) -> Dict[str, Any]:
+        """Builds a claim summary; see ``POST /summary``.
+
+        Raises:
+            ServiceBusy: If the queue is full.
+            ValueError: For unknown claim fields or malformed values.
+        """
+        options = claim_options(payload.get("fields") or {}, self.defaults)
+        nada_value = payload.get("nada_value")
+        bids = payload.get("salvage_bids")
+        try:
+            nada_value = None if nada_value is None else int(nada_value)
+            bids = None if bids is None else [{"vendor": str(b["vendor"]), "bid": int(b["bid"])} for b in bids]
+        except (KeyError, TypeError) as exc:
+            raise ValueError(f"malformed value or bids: {exc}") from exc
+        return self._run(run_summary, options, nada_value, bids, render_pdf)
+
+    def health(self) -> Dict[str, int]:
+        return {"workers": self.workers, "in_flight": self.in_flight, "max_queue": self.max_queue}
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+def _zip_outputs(result: Dict[str, Any]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in result["files"].items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _json_outputs(result: Dict[str, Any]) -> bytes:
+    payload = {k: v for k, v in result.items() if k != "files"}
+    payload["files"] = {name: base64.b64encode(data).decode("ascii") for name, data in result["files"].items()}
+    return json.dumps(payload, default=str).encode("utf-8")
+
+
+def _flag(value: Optional[str]) -> Optional[bool]:
+    """A boolean query parameter; ``None`` if it is not given."""
+    if value is None:
+        return None
+    return value.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+class ClaimRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end for :class:`ClaimService`."""
+
+    service: ClaimService  # set on the subclass built by make_server()
+    allow_origin: Optional[str] = None  # CORS origin allowed to call the service
+    protocol_version = "HTTP/1.1"
+
+    def end_headers(self) -> None:
+        if self.allow_origin:
+            self.send_header("Access-Control-Allow-Origin", self.allow_origin)
+            self.send_header("Access-Control-Expose-Headers", "Content-Disposition")
+            if self.allow_origin != "*":
+                self.send_header("Vary", "Origin")
+        super().end_headers()
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        view = memoryview(body)
+        for start in range(0, len(view), _STREAM_CHUNK):
+            self.wfile.write(view[start:start + _STREAM_CHUNK])
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(payload, default=str).encode("utf-8"), "application/json", headers)
+
+    def _respond(self, call: Callable[[], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Runs ``call`` and answers errors; returns its result on success."""
+        try:
+            return call()
+        except ServiceBusy:
+            self._send_json(503, {"error": "too many requests queued"}, {"Retry-After": "5"})
+        except ValueError as exc:
+            self._send_json(400, {"error": str(exc)})
+        except Exception as exc:  # noqa: BLE001 - report pipeline failures to the caller
+            self._send_json(500, {"error": f"{type(exc).__name__}: {exc}"})
+        return None
+
+    def do_OPTIONS(self) -> None:  # noqa: N802 - http.server naming
+        # CORS preflight for the JSON and PDF uploads of the web page
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, X-Claim-Fields")
+        self.send_header("Access-Control-Max-Age", "600")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            self._send_json(200, self.service.health())
+        elif url.path.startswith("/parse/"):
+            pdf_hash = url.path[len("/parse/"):].lower()
+            if not _PDF_HASH.fullmatch(pdf_hash):
+                self._send_json(400, {"error": "expected the SHA-256 of the PDF"})
+                return
+            result = self._respond(lambda: self.service.cached_parse(pdf_hash, query.get("extraction")) or {})
+            if result:
+                self._send_json(200, result)
+            elif result is not None:
+                self._send_json(404, {"error": "not parsed yet"})
+        elif url.path == "/decode":
+            vin = query.get("vin", "").strip()
+            if not vin:
+                self._send_json(400, {"error": "no VIN given"})
+                return
+            result = self._respond(lambda: self.service.decode(vin, _flag(query.get("remote"))))
+            if result is not None:
+                self._send_json(200, result)
+        elif url.path == "/value":
+            result = self._respond(
+                lambda: self.service.value(query.get("year"), query.get("mileage"), query.get("make"))
+            )
+            if result is not None:
+                self._send_json(200, result)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _body_chunks(self) -> Iterator[bytes]:
+        """The request body in chunks of at most 64 KiB.
+
+        Handles both a ``Content-Length`` and ``Transfer-Encoding:
+        chunked``.
+
+        Raises:
+            ValueError: If the body is malformed or ends early.
+        """
+        if "chunked" in (self.headers.get("Transfer-Encoding") or "").lower():
+            while True:
+                size = int(self.rfile.readline(1024).split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Skip any trailers
+                    while self.rfile.readline(1024).strip():
+                        pass
+                    return
+                yield from self._read_exactly(size)
+                self.rfile.readline(1024)  # CRLF after the chunk
+        else:
+            yield from self._read_exactly(int(self.headers.get("Content-Length") or 0))
+
+    def _read_exactly(self, remaining: int) -> Iterator[bytes]:
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, _STREAM_CHUNK))
+            if not data:
+                raise ValueError("request body ended early")
+            remaining -= len(data)
+            yield data
+
+    def _spool_upload(self) -> Tuple[Path, str, int]:
+        """Streams the body to a temporary file, hashing it on the way.
+
+        Returns:
+            ``(path, sha256, size)``.  The caller deletes the file.
+
+        Raises:
+            UploadTooLarge: Past :data:`MAX_UPLOAD_BYTES`.
+            ValueError: If the body is malformed.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, name = tempfile.mkstemp(prefix="estimate_", suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in self._body_chunks():
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise UploadTooLarge(f"estimate larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(name)
+            raise
+        return Path(name), digest.hexdigest(), size
+
+    def _read_claim_upload(self, path: Path) -> Dict[str, Any]:
+        """The claim fields of a spooled ``POST /claims`` body.
+
+        A JSON body is replaced by the estimate it carries.
+
+        Raises:
+            ValueError, KeyError, TypeError: If the body or the
+                ``X-Claim-Fields`` header is malformed.
+        """
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        if content_type == "application/json":
+            with path.open("rb") as f:
+                payload = json.loads(f.read() or b"{}")
+            path.write_bytes(base64.b64decode(payload["estimate_b64"]))
+            fields = payload.get("fields") or {}
+        else:
+            fields = json.loads(self.headers.get("X-Claim-Fields") or "{}")
+        if not isinstance(fields, dict):
+            raise ValueError("claim fields must be a JSON object")
+        return fields
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/parse":
+            self._post_parse(query)
+        elif url.path == "/summary":
+            self._post_summary(query)
+        elif url.path == "/claims":
+            self._post_claim(query)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _post_parse(self, query: Dict[str, str]) -> None:
+        try:
+            path, pdf_hash, size = self._spool_upload()
+        except ValueError as exc:
+            # The rest of the body is still on the connection
+            self.close_connection = True
+            self._send_json(413 if isinstance(exc, UploadTooLarge) else 400, {"error": str(exc)})
+            return
+        try:
+            if not size:
+                self._send_json(400, {"error": "no estimate uploaded"})
+                return
+            result = self._respond(lambda: self.service.parse(path, pdf_hash, query.get("extraction")))
+            if result is not None:
+                self._send_json(200, result)
+        finally:
+            path.unlink(missing_ok=True)
+
+    def _post_summary(self, query: Dict[str, str]) -> None:
+        try:
+            payload = json.loads(b"".join(self._body_chunks()) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as exc:
+            self._send_json(400, {"error": f"bad request: {exc}"})
+            return
+        render_pdf = query.get("format") == "pdf"
+        result = self._respond(lambda: self.service.summary(payload, render_pdf))
+        if result is None:
+            return
+        if render_pdf:
+            name, data = result["file"]
+            content_type = "application/pdf" if name.endswith(".pdf") else "text/plain; charset=utf-8"
+            self._send(200, data, content_type, {"Content-Disposition": f'attachment; filename="{name}"'})
+        else:
+            self._send_json(200, result)
+
+    def _post_claim(self, query: Dict[str, str]) -> None:
+        try:
+            path, _pdf_hash, _size = self._spool_upload()
+        except ValueError as exc:
+            # The rest of the body is still on the connection
+            self.close_connection = True
+            self._send_json(413 if isinstance(exc, UploadTooLarge) else 400, {"error": str(exc)})
+            return
+        try:
+            try:
+                fields = self._read_claim_upload(path)
+            except (ValueError, KeyError, TypeError) as exc:
+                self._send_json(400, {"error": f"bad request: {exc}"})
+                return
+            if not path.stat().st_size:
+                self._send_json(400, {"error": "no estimate uploaded"})
+                return
+            result = self._respond(lambda: self.service.submit(path, fields))
+        finally:
+            path.unlink(missing_ok=True)
+        if result is None:
+            return
+        if query.get("format") == "json":
+            self._send(200, _json_outputs(result), "application/json")
+        else:
+            self._send(
+                200, _zip_outputs(result), "application/zip",
+                {"Content-Disposition": 'attachment; filename="claim.zip"'},
+            )
+
+
+def make_server(
+    host: str, port: int, service: ClaimService, allow_origin: Optional[str] = None
+) -> ThreadingHTTPServer:
+    """Builds a threaded HTTP server bound to ``service``.
+
+    Args:
+        allow_origin: Origin browsers may call the service from (sent
+            as ``Access-Control-Allow-Origin``), or ``None`` for none.
+    """
+    handler = type(
+        "BoundClaimRequestHandler", (ClaimRequestHandler,), {"service": service, "allow_origin": allow_origin}
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve the claim pipeline over HTTP with warm worker processes",
+        parents=[process_claim.build_parser()],
+        conflict_handler="resolve",
+    )
+    parser.add_argument("--estimate", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (concurrent claims)")
+    parser.add_argument("--max-queue", type=int, default=32, help="Requests allowed to wait for a worker")
+    parser.add_argument("--allow-origin", help="Origin of the web page allowed to call the service, or '*' for any")
+    args = parser.parse_args()
+
+    # Purge once here rather than for every claim
+    if args.purge_parse_cache and not args.no_parse_cache:
+        print("Purged", parse_cache.ParseCache(args.parse_cache).purge(), "parse cache entries")
+        args.purge_parse_cache = False
+    if args.purge_ocr_cache:
+        print("Purged", ocr_utils.OcrCache().purge(), "OCR cache entries")
+        args.purge_ocr_cache = False
+
+    defaults = {
+        k: v for k, v in vars(args).items()
+        if k not in ("host", "port", "workers", "max_queue", "allow_origin", "estimate", "output_dir")
+    }
+    service = ClaimService(args.workers, args.max_queue, defaults)
+    server = make_server(args.host, args.port, service, args.allow_origin)
+    print(f"Claim service listening on http://{args.host}:{server.server_port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
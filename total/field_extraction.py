@@ -0,0 +1,322 @@
+"""
+field_extraction.py
+===================
+
+A small single‑pass engine for pulling labelled fields out of estimate
+text.  Each field is described once as a :class:`FieldRule`; a
+:class:`FieldScanner` compiles the rules of all fields into one combined
+*anchor* pattern and walks the text a single time.  Only where an
+anchor hits (for example the word ``Mileage``) is the field's full
+value pattern tried, so expensive patterns such as the 200‑character
+damages window are never run across the whole document.
+
+For every field the scanner records the first match, exactly as a
+separate ``re.search`` per field would, together with its character
+offset and the (zero‑based) page it was found on.
+
+Adding a field does not add another pass over the text – declare a new
+rule and include it in the scanner::
+
+    rules = VEHICLE_RULES + (
+        FieldRule("policy_number", r"Policy\\s*(?:#|No\\.?)",
+                  r"Policy\\s*(?:#|No\\.?)\\s*[:\\-]?\\s*([A-Z0-9\\-]+)", re.IGNORECASE,
+                  starts="P"),
+    )
+    scanner = FieldScanner(rules)
+    matches = scanner.scan(text)
+
+:mod:`parse_estimate` uses :data:`VEHICLE_SCANNER` for
+:func:`parse_estimate.extract_vehicle_info` and
+:data:`ESTIMATE_SCANNER` (vehicle plus claim fields) for
+:func:`parse_estimate.extract_fields`.
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Match, NamedTuple, Optional, Sequence, Tuple
+
+
+def _group1(match: Match[str]) -> str:
+    return match.group(1)
+
+
+def _group1_stripped(match: Match[str]) -> str:
+    return match.group(1).strip()
+
+
+def _group1_number(match: Match[str]) -> str:
+    return match.group(1).replace(",", "")
+
+
+class FieldRule(NamedTuple):
+    """Declarative description of one field.
+
+    Attributes:
+        name: Key used in the result dictionary.  Must be a valid
+            Python identifier (it becomes a named group).
+        anchor: Cheap pattern marking where a value *may* start, usually
+            the field label.  It must not contain capturing groups.
+        value: Pattern matched at each anchor hit to extract the value.
+            Defaults to ``anchor`` for fields that have no label, such
+            as the VIN.
+        flags: ``re`` flags applied to both patterns.
+        convert: Turns the value match into the stored string.  Defaults
+            to the first group.
+        starts: Optional body of a character class listing every
+            character an anchor hit can begin with, e.g. ``"M"`` or
+            ``"A-HJ-NPR-Z0-9"`` (literal characters and ranges only).
+            When every rule of a scanner provides it, the combined
+            pattern is guarded by a single look‑ahead so positions that
+            cannot start any field are skipped cheaply.
+    """
+
+    name: str
+    anchor: str
+    value: Optional[str] = None
+    flags: int = 0
+    convert: Callable[[Match[str]], str] = _group1
+    starts: Optional[str] = None
+
+
+class FieldMatch(NamedTuple):
+    """A resolved field: its value, character offset and page index."""
+
+    value: str
+    offset: int
+    page: int
+
+
+# How much text a rule may need to see beyond the start of its match.
+# The damages window alone is 200 characters, and a label such as
+# ``Make:`` at the bottom of a page can have its value at the top of the
+# next.  When text is scanned page by page a match is only settled once
+# this much text follows it, and this much already scanned text is
+# re‑searched when a new page arrives.
+PAGE_OVERLAP = 256
+
+
+# 17‑character VIN (letters/digits except I,O,Q)
+# Year (1900–2099)
+# Make – 'Make' followed by a colon/dash and a word
+# Model – 'Model' followed by word(s) until newline or comma
+# Mileage – 'Miles' or 'Mileage' followed by digits/commas
+# Damages – up to 200 characters after the heading
+VEHICLE_RULES: Tuple[FieldRule, ...] = (
+    FieldRule("vin", r"\b[A-HJ-NPR-Z0-9]{17}\b", r"\b([A-HJ-NPR-Z0-9]{17})\b", starts="A-HJ-NPR-Z0-9"),
+    FieldRule("year", r"\b(?:19|20)\d{2}\b", convert=lambda m: m.group(0), starts="12"),
+    FieldRule("make", r"Make", r"Make\s*[:\-]?\s*([A-Za-z]+)", re.IGNORECASE, starts="M"),
+    FieldRule(
+        "model", r"Model", r"Model\s*[:\-]?\s*([A-Za-z0-9\- ]+)", re.IGNORECASE, _group1_stripped, "M"
+    ),
+    FieldRule(
+        "mileage",
+        r"Mileage|Miles",
+        r"(?:Miles|Mileage)\s*[:\-]?\s*([\d,]+)",
+        re.IGNORECASE,
+        _group1_number,
+        "M",
+    ),
+    FieldRule(
+        "damages",
+        r"Damage",
+        r"(?:Damages?|Damage Description)\s*[:\-]?\s*([\s\S]{0,200})",
+        re.IGNORECASE,
+        _group1_stripped,
+        "D",
+    ),
+)
+
+# Claim‑level fields printed in the CCC ONE header and totals block.
+CLAIM_RULES: Tuple[FieldRule, ...] = (
+    FieldRule(
+        "claim_number",
+        r"Claim\s*(?:#|No\b|Number)",
+        r"Claim\s*(?:#|No\.?|Number)\s*[:\-]?\s*([A-Za-z0-9][A-Za-z0-9\-]*)",
+        re.IGNORECASE,
+        starts="C",
+    ),
+    FieldRule(
+        "insurer",
+        r"Insurance\s+Company|Insurer",
+        r"(?:Insurance\s+Company|Insurer)[ \t]*[:\-]?[ \t]*([^\n]+)",
+        re.IGNORECASE,
+        _group1_stripped,
+        "I",
+    ),
+    FieldRule(
+        "acv",
+        r"Actual\s+Cash\s+Value|\bACV\b",
+        r"(?:Actual\s+Cash\s+Value|ACV)\s*[:\-]?\s*\$?\s*(\d[\d,]*(?:\.\d{2})?)",
+        re.IGNORECASE,
+        _group1_number,
+        "A",
+    ),
+    FieldRule(
+        "total_estimate",
+        r"Gross\s+Total|Total\s+Cost\s+of\s+Repairs|Net\s+Cost\s+of\s+Repairs|Total\s+Estimate",
+        r"(?:Gross\s+Total|Total\s+Cost\s+of\s+Repairs|Net\s+Cost\s+of\s+Repairs|Total\s+Estimate)"
+        r"\s*[:\-]?\s*\$?\s*(\d[\d,]*\.\d{2})",
+        re.IGNORECASE,
+        _group1_number,
+        "GTN",
+    ),
+)
+
+
+class FieldScanner:
+    """Compiled, single‑pass extractor for a set of :class:`FieldRule`.
+
+    The anchors of all rules are merged into one alternation of named
+    groups.  :meth:`scan` iterates over its hits once and, for each
+    field that is still unresolved, tries the field's value pattern at
+    the hit position.  The first successful value match of each field
+    wins, mirroring one ``re.search`` per field.
+    """
+
+    def __init__(self, rules: Sequence[FieldRule]):
+        self.rules: Dict[str, FieldRule] = {rule.name: rule for rule in rules}
+        if len(self.rules) != len(rules):
+            raise ValueError("Field rule names must be unique")
+        alternatives = []
+        for rule in rules:
+            anchor = f"(?i:{rule.anchor})" if rule.flags & re.IGNORECASE else rule.anchor
+            alternatives.append(f"(?P<{rule.name}>{anchor})")
+        combined = "|".join(alternatives)
+        if all(rule.starts for rule in rules):
+            first = "".join(
+                rule.starts + rule.starts.swapcase() if rule.flags & re.IGNORECASE else rule.starts
+                for rule in rules
+            )
+            combined = f"(?=[{first}])(?:{combined})"
+        self._anchors = re.compile(combined)
+        self._values = {
+            rule.name: re.compile(rule.value or rule.anchor, rule.flags) for rule in rules
+        }
+
+    @property
+    def fields(self) -> List[str]:
+        """The field names, in declaration order."""
+        return list(self.rules)
+
+    def _match_at(self, text: str, field: str, pos: int) -> Optional[Match[str]]:
+        return self._values[field].match(text, pos)
+
+    def scan(self, text: str, page_starts: Optional[Sequence[int]] = None) -> Dict[str, FieldMatch]:
+        """Extracts all fields from ``text`` in a single pass.
+
+        Args:
+            text: The text to scan.
+            page_starts: Optional sorted offsets at which each page
+                starts within ``text``; used to fill
+                :attr:`FieldMatch.page`.  When omitted every match is
+                reported on page 0.
+
+        Returns:
+            A dictionary of the fields that were found.  Missing fields
+            are absent.
+        """
+        found: Dict[str, FieldMatch] = {}
+        pending = set(self.rules)
+        for hit in self._anchors.finditer(text):
+            field = hit.lastgroup
+            if field not in pending:
+                continue
+            match = self._match_at(text, field, hit.start())
+            if match is None:
+                continue
+            page = bisect_right(page_starts, hit.start()) - 1 if page_starts else 0
+            found[field] = FieldMatch(self.rules[field].convert(match), hit.start(), max(page, 0))
+            pending.discard(field)
+            if not pending:
+                break
+        return found
+
+    def scan_pages(self, pages: Iterable[str]) -> Tuple[Dict[str, FieldMatch], int]:
+        """Extracts fields while consuming pages one at a time.
+
+        Gives the same result as joining the pages (each followed by a
+        newline, empty pages skipped) and calling :meth:`scan`, but
+        stops pulling pages as soon as every field has a settled match
+        and drops text no pending field can still need, so memory use
+        does not grow with the document.  A match that starts within
+        :data:`PAGE_OVERLAP` characters of the end of the text seen so
+        far is held as tentative until the next page arrives.
+
+        Args:
+            pages: Iterable of page texts.  If it has a ``close`` method
+                (e.g. a generator) it is closed on return.
+
+        Returns:
+            A tuple ``(matches, pages_read)``.
+        """
+        found: Dict[str, FieldMatch] = {}
+        # Absolute offset (in the joined document) to resume each field from
+        resume: Dict[str, int] = {field: 0 for field in self.rules}
+        buffer = ""
+        base = 0  # absolute offset of buffer[0]
+        page_starts: List[Tuple[int, int]] = []  # (absolute offset, page index)
+        pages_read = 0
+        iterator = iter(pages)
+
+        def page_of(offset: int) -> int:
+            idx = bisect_right(page_starts, (offset, float("inf"))) - 1
+            return page_starts[idx][1]
+
+        def sweep(final: bool) -> None:
+            tentative: Dict[str, int] = {}
+            start = min(resume.values()) - base
+            for hit in self._anchors.finditer(buffer, start):
+                field = hit.lastgroup
+                if field not in resume or field in tentative or base + hit.start() < resume[field]:
+                    continue
+                match = self._match_at(buffer, field, hit.start())
+                if match is None:
+                    continue
+                if final or len(buffer) - hit.start() >= PAGE_OVERLAP:
+                    offset = base + hit.start()
+                    found[field] = FieldMatch(self.rules[field].convert(match), offset, page_of(offset))
+                    del resume[field]
+                    if not resume:
+                        return
+                else:
+                    # Could still change once more text arrives
+                    tentative[field] = base + hit.start()
+            end = base + len(buffer)
+            for field in resume:
+                resume[field] = tentative.get(field, max(resume[field], end - PAGE_OVERLAP))
+
+        try:
+            for page_text in iterator:
+                pages_read += 1
+                if not page_text:
+                    continue
+                page_starts.append((base + len(buffer), pages_read - 1))
+                buffer += page_text + "\n"
+                sweep(final=False)
+                if not resume:
+                    break
+                # Drop text that no pending field will look at again, keeping
+                # one character of context so ``\b`` still sees word edges
+                keep_from = min(resume.values()) - 1
+                if keep_from > base:
+                    buffer = buffer[keep_from - base:]
+                    base = keep_from
+            else:
+                if resume and buffer:
+                    sweep(final=True)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        return found, pages_read
+
+
+VEHICLE_SCANNER = FieldScanner(VEHICLE_RULES)
+ESTIMATE_SCANNER = FieldScanner(VEHICLE_RULES + CLAIM_RULES)
+
+
+def match_values(matches: Dict[str, FieldMatch], fields: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Flattens scanner output to ``{field: value or None}``."""
+    return {field: matches[field].value if field in matches else None for field in fields}
@@ -0,0 +1,353 @@
+"""
+layout_extraction.py
+====================
+
+Field extraction from word positions instead of flattened page text.
+
+:mod:`field_extraction` works on the text ``extract_text()`` produces,
+so it can only guess: the year rule takes the first ``19xx``/``20xx``
+anywhere (often part of a date) and ``Model`` matches stray words.
+This module uses the word boxes ``pdfplumber`` already computes:
+
+* Only the header region of each page (the top ``header_fraction`` of
+  it, where CCC ONE prints the vehicle block) is cropped and split into
+  words, so far fewer characters are processed than for the whole page.
+* The words are grouped into lines, ordered top to bottom, which acts
+  as a simple spatial index: a word's neighbours to the right and the
+  line below can be found without scanning the page.
+* Label words such as ``VIN``, ``Year``, ``Make``, ``Model`` and
+  ``Mileage``/``Odometer`` are the anchors.  A word only counts as a
+  label if it looks like one – followed by a colon (``Make:``) or
+  written in capitals like a column header (``VIN``) – so prose such
+  as "Make sure to call" is not read as a make.  A field's value is read
+  from the words to the right of its label, up to the next label or a
+  wide gap, or else from the words directly below it.  A damages
+  description runs to the end of its line and on over the following
+  lines, up to 200 characters.  VIN, year and mileage values must also
+  look right (17 VIN characters, a year between 1900 and 2099, a
+  number), so dates and stray words are not taken.
+
+Pages are read one at a time and reading stops once every field is
+found.  The layout pass runs first, on the header region only; the
+whole page's text is extracted only when a field is still missing
+after it, and the text rules – with the same colon requirement for
+labels – fill the gap from that text.  The result always has the same
+keys as :func:`parse_estimate.extract_vehicle_info` and no page is
+opened twice.
+
+Select it with ``process_claim.py --extraction layout``.
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .field_extraction import VEHICLE_RULES, FieldScanner
+
+# Bump together with parse_estimate.PARSER_VERSION when the rules change
+LAYOUT_VERSION = "2"
+
+DEFAULT_HEADER_FRACTION = 0.5
+
+# Label word (upper case, without a trailing colon) -> field
+LABELS = {
+    "VIN": "vin",
+    "YEAR": "year",
+    "MAKE": "make",
+    "MODEL": "model",
+    "MILEAGE": "mileage",
+    "ODOMETER": "mileage",
+    "MILES": "mileage",
+    "DAMAGE": "damages",
+    "DAMAGES": "damages",
+}
+
+LAYOUT_FIELDS = ("vin", "year", "make", "model", "mileage", "damages")
+
+# The text rules for the fallback, with the colon after a label required
+# (``Make: Honda`` but not ``Make sure``)
+_FALLBACK_SCANNER = FieldScanner([
+    rule._replace(value=rule.value.replace(r"[:\-]?", r"[:\-]")) if rule.value else rule
+    for rule in VEHICLE_RULES
+])
+
+_VALID = {
+    "vin": re.compile(r"[A-HJ-NPR-Z0-9]{17}"),
+    "year": re.compile(r"(?:19|20)\d{2}"),
+    "make": re.compile(r"[A-Za-z][A-Za-z\-]*"),
+    "model": re.compile(r"[A-Za-z0-9][A-Za-z0-9\- ]*"),
+    "mileage": re.compile(r"\d{1,3}(?:,\d{3})+|\d{1,7}"),
+    "damages": re.compile(r".+", re.DOTALL),
+}
+
+# Longest damages description kept, as in the text rules
+_DAMAGES_LIMIT = 200
+
+# Fields whose value is a single word; the others may span several
+_SINGLE_WORD = {"vin", "year", "make", "mileage"}
+
+# Words on one line may differ this much in their top coordinate (points)
+_LINE_TOLERANCE = 3.0
+
+# A gap wider than this many character widths ends a value
+_GAP_CHARS = 2.5
+
+
+def _label_of(text: str, following: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """``(field, rest)`` if ``text`` is a label word, else ``None``.
+
+    A label word must have a colon (``"Make:"``), be followed by one
+    (``"Make :"``, ``"Damage Description:"``, given as ``following``)
+    or be written in capitals like a column header (``"VIN"``).
+
+    ``rest`` is whatever follows the label in the same word, as in
+    ``"VIN:1HGCM82633A004352"``.
+    """
+    head, colon, rest = text.partition(":")
+    field = LABELS.get(head.upper())
+    if field is None:
+        return None
+    if not colon and not head.isupper():
+        following = (following or "").upper()
+        if following != ":" and not (field == "damages" and following == "DESCRIPTION:"):
+            return None
+    return field, rest if colon else ""
+
+
+def group_lines(words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Groups ``pdfplumber`` words into lines, top to bottom, left to right."""
+    lines: List[List[Dict[str, Any]]] = []
+    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]["top"]) <= _LINE_TOLERANCE:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    for line in lines:
+        line.sort(key=lambda w: w["x0"])
+    return lines
+
+
+def _char_width(word: Dict[str, Any]) -> float:
+    return (word["x1"] - word["x0"]) / max(len(word["text"]), 1)
+
+
+def _value_right(line: List[Dict[str, Any]], start: int, field: str) -> List[str]:
+    """Words after position ``start`` of ``line`` up to a label or wide gap."""
+    parts: List[str] = []
+    previous = line[start]
+    following = line[start + 1:]
+    if field == "damages":
+        # "Damage Description:" – skip the second label word; the
+        # description runs to the end of the line
+        if following and following[0]["text"].rstrip(":").upper() == "DESCRIPTION":
+            following = following[1:]
+        return [word["text"] for word in following]
+    for word in following:
+        if _label_of(word["text"]) is not None:
+            break
+        if parts and word["x0"] - previous["x1"] > _GAP_CHARS * _char_width(previous):
+            break
+        parts.append(word["text"])
+        previous = word
+        if field in _SINGLE_WORD:
+            break
+    return parts
+
+
+def _value_below(
+    lines: List[List[Dict[str, Any]]],
+    tops: List[float],
+    label: Dict[str, Any],
+    field: str,
+) -> List[str]:
+    """Words on the next line that sit under ``label``."""
+    idx = bisect_right(tops, label["top"] + _LINE_TOLERANCE)
+    if idx >= len(lines):
+        return []
+    line = lines[idx]
+    slack = 2 * _char_width(label)
+    for pos, word in enumerate(line):
+        if word["x1"] >= label["x0"] - slack and word["x0"] <= label["x1"] + slack:
+            if _label_of(word["text"]) is not None:
+                return []
+            if field in _SINGLE_WORD:
+                return [word["text"]]
+            # The value goes on while the words are close together, so
+            # the value under the next label is not taken as well
+            parts = [word["text"]]
+            for previous, following in zip(line[pos:], line[pos + 1:]):
+                if following["x0"] - previous["x1"] > _GAP_CHARS * _char_width(previous):
+                    break
+                if field != "damages" and _label_of(following["text"]) is not None:
+                    break
+                parts.append(following["text"])
+            return parts
+    return []
+
+
+def _damages_below(lines: List[List[Dict[str, Any]]], tops: List[float], label: Dict[str, Any]) -> List[str]:
+    """Continuation lines of a damages description.
+
+    Lines are taken while they follow at the usual line spacing and do
+    not contain a label, up to :data:`_DAMAGES_LIMIT` characters.
+    """
+    parts: List[str] = []
+    idx = bisect_right(tops, label["top"] + _LINE_TOLERANCE)
+    previous_top = label["top"]
+    line_height = label["bottom"] - label["top"]
+    length = 0
+    while idx < len(lines) and length < _DAMAGES_LIMIT:
+        line = lines[idx]
+        if line[0]["top"] - previous_top > 2 * line_height:
+            break
+        if any(_label_of(word["text"]) is not None for word in line):
+            break
+        text = " ".join(word["text"] for word in line)
+        parts.append(text)
+        length += len(text) + 1
+        previous_top = line[0]["top"]
+        idx += 1
+    return parts
+
+
+def _clean(field: str, parts: List[str]) -> Optional[str]:
+    """Validates and normalises a value; ``None`` if it does not fit."""
+    value = " ".join(parts).strip(" :-,")
+    if field == "damages":
+        value = value[:_DAMAGES_LIMIT].strip()
+    match = _VALID[field].fullmatch(value)
+    if match is None:
+        return None
+    if field == "mileage":
+        return value.replace(",", "")
+    return value
+
+
+def extract_page_fields(page: Any, header_fraction: float = DEFAULT_HEADER_FRACTION) -> Dict[str, str]:
+    """Finds the labelled vehicle fields in the header region of a page.
+
+    Args:
+        page: A ``pdfplumber`` page.
+        header_fraction: Share of the page height, from the top, that is
+            searched.  ``1.0`` searches the whole page.
+
+    Returns:
+        The fields found; the first occurrence of a label wins.
+    """
+    region = page if header_fraction >= 1 else page.crop((0, 0, page.width, page.height * header_fraction))
+    lines = group_lines(region.extract_words())
+    tops = [line[0]["top"] for line in lines]
+    found: Dict[str, str] = {}
+    for line in lines:
+        for pos, word in enumerate(line):
+            label = _label_of(word["text"], line[pos + 1]["text"] if pos + 1 < len(line) else None)
+            if label is None or label[0] in found:
+                continue
+            field, rest = label
+            parts = [rest] if rest else _value_right(line, pos, field)
+            if field == "damages":
+                parts = [rest] + _value_right(line, pos, field) + _damages_below(lines, tops, word)
+            value = _clean(field, parts) if parts else None
+            if value is None and not rest:
+                value = _clean(field, _value_below(lines, tops, word, field))
+            if value is not None:
+                found[field] = value
+    return found
+
+
+def _open_pages(
+    pdf_path: Path,
+    max_pages: Optional[int] = None,
+    low_memory: bool = False,
+    monitor: Optional[Any] = None,
+) -> Iterator[Any]:
+    """Yields the ``pdfplumber`` pages of a PDF, one at a time.
+
+    Each page is released once the consumer asks for the next one.
+    ``low_memory`` and ``monitor`` work as in
+    :func:`parse_estimate.iter_pdf_pages`.
+    """
+    import pdfplumber  # type: ignore
+
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        for idx, page in enumerate(pdf.pages):
+            if max_pages is not None and idx >= max_pages:
+                break
+            yield page
+            # Free the page's parsed objects before moving on
+            close = getattr(page, "close", None)
+            if close is not None:
+                close()
+            if low_memory:
+                cached_objs = getattr(pdf.doc, "_cached_objs", None)
+                if cached_objs is not None:
+                    cached_objs.clear()
+            if monitor is not None:
+                monitor.check(f"page {idx + 1} of {pdf_path}")
+
+
+def iter_layout_pages(
+    pdf_path: Path,
+    max_pages: Optional[int] = None,
+    header_fraction: float = DEFAULT_HEADER_FRACTION,
+    low_memory: bool = False,
+    monitor: Optional[Any] = None,
+) -> Iterator[Dict[str, str]]:
+    """Yields the fields found on each page, one page at a time.
+
+    ``low_memory`` and ``monitor`` work as in
+    :func:`parse_estimate.iter_pdf_pages`.
+    """
+    for page in _open_pages(pdf_path, max_pages, low_memory, monitor):
+        yield extract_page_fields(page, header_fraction)
+
+
+def scan_estimate_layout(
+    pdf_path: Path,
+    max_pages: Optional[int] = None,
+    header_fraction: float = DEFAULT_HEADER_FRACTION,
+    low_memory: bool = False,
+    monitor: Optional[Any] = None,
+) -> Tuple[Dict[str, Optional[str]], int]:
+    """Parses an estimate from word positions, falling back to text.
+
+    Every page is read once.  The layout pass looks at its header
+    region; only if a field is still missing afterwards is the page's
+    full text extracted for the text rules.  Reading stops as soon as
+    every field is known.  A value found by layout wins over one found
+    in the text.
+
+    Args:
+        pdf_path: Path to the estimate PDF.
+        max_pages: Optional hard cap on pages to read.
+        header_fraction: See :func:`extract_page_fields`.
+        low_memory: See :func:`parse_estimate.iter_pdf_pages`.
+        monitor: See :func:`parse_estimate.iter_pdf_pages`.
+
+    Returns:
+        A tuple ``(info, pages_read)`` like
+        :func:`parse_estimate.scan_estimate`.
+    """
+    found: Dict[str, str] = {}
+    from_text: Dict[str, str] = {}
+    pages_read = 0
+    pages = _open_pages(pdf_path, max_pages, low_memory, monitor)
+    try:
+        for page in pages:
+            pages_read += 1
+            for field, value in extract_page_fields(page, header_fraction).items():
+                found.setdefault(field, value)
+            missing = [field for field in LAYOUT_FIELDS if field not in found and field not in from_text]
+            if missing:
+                for field, match in _FALLBACK_SCANNER.scan(page.extract_text() or "").items():
+                    if field in missing:
+                        from_text[field] = match.value
+            if all(field in found or field in from_text for field in LAYOUT_FIELDS):
+                break
+    finally:
+        pages.close()
+    info: Dict[str, Optional[str]] = {field: found.get(field) or from_text.get(field) for field in LAYOUT_FIELDS}
+    return info, pages_read
@@ -0,0 +1,178 @@
+"""
+memory_limits.py
+================
+
+Memory accounting for reading very large estimates.
+
+``pdfplumber`` keeps every page it has laid out – characters, layout
+objects, the text map – until the PDF is closed, and ``pdfminer`` keeps
+every PDF object it has parsed.  Supplement‑heavy estimates of several
+hundred pages therefore push a worker's resident set size into the
+gigabytes.  ``process_claim.py --low-memory`` reads the estimate
+differently:
+
+* The caches of each page are flushed as soon as its text has been
+  extracted, and so are ``pdfminer``'s parsed objects, so only one page
+  is held in memory at a time (see :func:`parse_estimate.iter_pdf_pages`).
+* The page text kept for the parse cache goes to a :class:`PageSpill`,
+  which moves to a temporary file once it grows past a few megabytes
+  instead of staying in memory.
+* A :class:`MemoryMonitor` samples the resident set size after every
+  page and stops the estimate with :class:`MemoryCeilingExceeded` once
+  it passes ``--memory-ceiling`` megabytes, rather than letting one
+  document take down a worker.
+
+The monitor also reports the peak resident set size reached while the
+estimate was processed (``peak_rss_kb`` in the result of
+:func:`process_claim.process_claim`); :mod:`batch_process` summarises
+it over the batch so worker pools can be sized.  On Linux the peak is
+the kernel's high‑water mark, reset when the estimate starts; elsewhere
+it is the largest sample taken.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+from typing import Iterator, Optional
+
+DEFAULT_SPILL_BYTES = 4 * 1024 * 1024
+
+try:
+    _PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+except (AttributeError, ValueError, OSError):  # pragma: no cover - Windows
+    _PAGE_KB = 4
+
+
+class MemoryCeilingExceeded(RuntimeError):
+    """Raised when a document pushes the process past its memory ceiling."""
+
+
+def current_rss_kb() -> Optional[int]:
+    """Current resident set size in kilobytes, or ``None`` if unknown."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    # No current figure outside Linux; the peak is the best approximation
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _high_water_kb() -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_high_water() -> bool:
+    """Resets the kernel's peak RSS of this process (Linux 4.0+)."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MemoryMonitor:
+    """Tracks the memory used while one document is processed.
+
+    Create one per estimate; creating it resets the peak.
+
+    Args:
+        ceiling_mb: Resident set size, in megabytes, that :meth:`check`
+            refuses to go past.  ``None`` only measures.
+    """
+
+    def __init__(self, ceiling_mb: Optional[float] = None):
+        self.ceiling_kb = int(ceiling_mb * 1024) if ceiling_mb else None
+        self._kernel_peak = _reset_high_water()
+        self.start_kb = current_rss_kb()
+        self._sampled_peak = self.start_kb or 0
+
+    def check(self, where: str = "") -> Optional[int]:
+        """Samples the resident set size and enforces the ceiling.
+
+        Args:
+            where: Description of the current position (e.g. ``"page
+                12"``) for the error message.
+
+        Returns:
+            The current resident set size in kilobytes, if known.
+
+        Raises:
+            MemoryCeilingExceeded: If the ceiling has been passed.
+        """
+        rss = current_rss_kb()
+        if rss is None:
+            return None
+        self._sampled_peak = max(self._sampled_peak, rss)
+        if self.ceiling_kb is not None and rss > self.ceiling_kb:
+            at = f" at {where}" if where else ""
+            raise MemoryCeilingExceeded(
+                f"Memory ceiling of {self.ceiling_kb // 1024} MB exceeded{at}: {rss // 1024} MB in use"
+            )
+        return rss
+
+    @property
+    def peak_kb(self) -> Optional[int]:
+        """Peak resident set size since the monitor was created."""
+        if self._kernel_peak:
+            peak = _high_water_kb()
+            if peak is not None:
+                return peak
+        return self._sampled_peak or None
+
+
+class PageSpill:
+    """Append‑only list of page texts that moves to disk when it grows.
+
+    Pages are kept in memory until they add up to ``max_bytes`` and are
+    then written to an anonymous temporary file.  Iterating yields the
+    pages in order; :meth:`close` deletes the file.
+
+    Args:
+        max_bytes: Size kept in memory before spilling.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_SPILL_BYTES):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_bytes, mode="w+", encoding="utf-8")
+        self._count = 0
+
+    def append(self, page_text: str) -> None:
+        # One JSON string per line; the page text itself may contain newlines
+        self._file.write(json.dumps(page_text) + "\n")
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        self._file.flush()
+        self._file.seek(0)
+        try:
+            for line in self._file:
+                yield json.loads(line)
+        finally:
+            self._file.seek(0, os.SEEK_END)
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the pages have been moved to disk."""
+        return bool(getattr(self._file, "_rolled", False))
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,338 @@
+"""
+ocr_utils.py
+============
+
+OCR fallback for estimate pages without a text layer.
+
+Faxed or scanned estimates are PDFs of page images.  ``pdfplumber``
+returns no text for them, so every field used to come back ``None``
+and adjusters re‑keyed the claim by hand.  With OCR enabled
+(``process_claim.py --ocr``) the parser still reads the text layer
+first and only pages whose text is empty are OCR'd:
+
+* Empty pages are rendered with ``pypdfium2`` (version 4 or later,
+  listed in ``requirements.txt``) and passed to the locally installed
+  ``tesseract`` command line tool.  Consecutive empty pages are OCR'd together on a
+  pool of worker processes, one page per core, while pages are still
+  handed to the extractor in document order.
+* OCR text is cached in SQLite keyed by a hash of the page's content
+  streams and images (:func:`page_hash`), so a scanned page that shows
+  up again – in a re‑upload or in a supplement – is not OCR'd twice.
+  The cache lives next to the parse cache (see :mod:`parse_cache`) and,
+  like it, drops the least recently used pages once it outgrows its
+  size budget; ``--purge-ocr-cache`` empties it.
+* The OCR text goes through the same :mod:`field_extraction` rules as
+  :func:`parse_estimate.extract_vehicle_info`, and the result reports
+  which fields were found on OCR'd pages so they can be checked.
+
+Tesseract must be on ``PATH`` (or named by the ``TESSERACT_CMD``
+environment variable); if it is missing :class:`OcrEngine` raises
+``RuntimeError``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import subprocess
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+from . import parse_cache
+from .field_extraction import VEHICLE_SCANNER, match_values
+
+DEFAULT_DPI = 300
+
+# Default OCR cache budget; a page of OCR text is a few kilobytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_pages (
+    page_hash TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    text TEXT NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (page_hash, engine)
+);
+"""
+
+_INDEX = "CREATE INDEX IF NOT EXISTS ocr_pages_last_access ON ocr_pages (last_access);"
+
+
+def tesseract_command() -> Optional[str]:
+    """Path of the ``tesseract`` executable, or ``None`` if not installed."""
+    return shutil.which(os.getenv("TESSERACT_CMD") or "tesseract")
+
+
+def page_hash(page: Any) -> str:
+    """Hashes a ``pdfplumber`` page by its content streams and images.
+
+    Two pages that draw the same scan produce the same hash, whichever
+    PDF they are in.
+    """
+    from pdfminer.pdftypes import resolve1  # type: ignore
+
+    digest = hashlib.sha256()
+    for stream in page.page_obj.contents:
+        digest.update(resolve1(stream).get_data())
+    for image in page.images:
+        digest.update(image["stream"].get_rawdata() or b"")
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """SQLite cache of OCR text keyed by page hash and engine settings,
+    with an LRU size budget.
+
+    Args:
+        path: Database file.  Defaults to ``ocr_cache.sqlite`` next to
+            the parse cache.
+        max_bytes: Budget for the stored text.  Once it is exceeded the
+            least recently used pages are removed.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else parse_cache.default_cache_path().with_name("ocr_cache.sqlite")
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(ocr_pages)")]
+            if "size" not in columns:
+                # Databases written before the size budget existed
+                with conn:
+                    conn.execute("ALTER TABLE ocr_pages ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                    conn.execute("UPDATE ocr_pages SET size = LENGTH(CAST(text AS BLOB))")
+            conn.executescript(_INDEX)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, page_hash: str, engine: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT text FROM ocr_pages WHERE page_hash = ? AND engine = ?", (page_hash, engine)
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE ocr_pages SET last_access = ? WHERE page_hash = ? AND engine = ?",
+                (time.time(), page_hash, engine),
+            )
+        return row[0]
+
+    def put(self, page_hash: str, engine: str, text: str) -> None:
+        """Stores the text of a page and evicts old pages if over budget."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages (page_hash, engine, text, last_access, size) VALUES (?, ?, ?, ?, ?)",
+                (page_hash, engine, text, time.time(), len(text.encode("utf-8"))),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM ocr_pages ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((rowid,))
+            total -= size
+        conn.executemany("DELETE FROM ocr_pages WHERE rowid = ?", doomed)
+
+    def purge(self) -> int:
+        """Deletes every page and returns how many were removed."""
+        conn = self._connect()
+        with conn:
+            removed = conn.execute("DELETE FROM ocr_pages").rowcount
+        conn.execute("VACUUM")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of pages and their total size in bytes."""
+        count, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_pages"
+        ).fetchone()
+        return {"entries": count, "bytes": size}
+
+
+def ocr_page(pdf_path: str, index: int, dpi: int, lang: str, command: str) -> str:
+    """Renders page ``index`` of a PDF and OCRs it with ``tesseract``.
+
+    Runs in the worker processes of :class:`OcrEngine`.
+    """
+    import pypdfium2 as pdfium  # type: ignore
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        image = pdf[index].render(scale=dpi / 72).to_pil()
+    finally:
+        pdf.close()
+    png = io.BytesIO()
+    image.save(png, format="PNG")
+    result = subprocess.run(
+        [command, "stdin", "stdout", "-l", lang, "--dpi", str(dpi)],
+        input=png.getvalue(), capture_output=True, check=True,
+    )
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+class OcrEngine:
+    """Tesseract OCR on a process pool, with a page cache.
+
+    Args:
+        workers: Pages OCR'd in parallel.  Defaults to the CPU count.
+        dpi: Rendering resolution.
+        lang: Tesseract language(s), e.g. ``"eng"``.
+        cache: Page text cache, or ``None`` to always OCR.
+
+    Raises:
+        RuntimeError: If ``tesseract`` is not installed.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        dpi: int = DEFAULT_DPI,
+        lang: str = "eng",
+        cache: Optional[OcrCache] = None,
+    ):
+        command = tesseract_command()
+        if command is None:
+            raise RuntimeError("OCR needs the tesseract command line tool (set TESSERACT_CMD if it is not on PATH)")
+        self.command = command
+        self.workers = workers or os.cpu_count() or 1
+        self.dpi = dpi
+        self.lang = lang
+        self.cache = cache
+        # Cache entries are only valid for the same language and resolution
+        self.engine_key = f"tesseract:{lang}:{dpi}"
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self.cache is not None:
+            self.cache.close()
+
+    def ocr_pages(self, pdf_path: Path, pages: List[Tuple[int, str]]) -> List[str]:
+        """OCRs ``(index, page_hash)`` pairs of one PDF, in parallel.
+
+        Returns:
+            The text of each page, in the order given.
+        """
+        texts: List[Optional[str]] = [
+            self.cache.get(digest, self.engine_key) if self.cache is not None else None for _, digest in pages
+        ]
+        missing = [i for i, text in enumerate(texts) if text is None]
+        if len(missing) == 1 or self.workers == 1:
+            results = [ocr_page(str(pdf_path), pages[i][0], self.dpi, self.lang, self.command) for i in missing]
+        elif missing:
+            if self._pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [
+                self._pool.submit(ocr_page, str(pdf_path), pages[i][0], self.dpi, self.lang, self.command)
+                for i in missing
+            ]
+            results = [future.result() for future in futures]
+        else:
+            results = []
+        for i, text in zip(missing, results):
+            texts[i] = text
+            if self.cache is not None:
+                self.cache.put(pages[i][1], self.engine_key, text)
+        return [text or "" for text in texts]
+
+
+def iter_pages_with_ocr(
+    pdf_path: Path,
+    engine: OcrEngine,
+    max_pages: Optional[int] = None,
+    ocr_indices: Optional[Set[int]] = None,
+) -> Iterator[str]:
+    """Like :func:`parse_estimate.iter_pdf_pages`, OCR'ing empty pages.
+
+    When a page has no text the following pages are looked at too, and
+    the whole run of empty pages (up to twice the worker count) is
+    OCR'd at once.  Pages are still yielded one at a time and in order,
+    so a consumer that stops early leaves the rest of the PDF alone.
+
+    Args:
+        pdf_path: The path to the PDF file.
+        engine: The OCR engine to use.
+        max_pages: Optional hard cap on the number of pages to read.
+        ocr_indices: If given, the indices of OCR'd pages are added to
+            it.
+    """
+    import pdfplumber  # type: ignore
+
+    batch = max(2 * engine.workers, 1)
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        pages = pdf.pages if max_pages is None else pdf.pages[:max_pages]
+        idx = 0
+        while idx < len(pages):
+            text = pages[idx].extract_text() or ""
+            if text.strip():
+                yield text
+                idx += 1
+                continue
+            empty = [(idx, page_hash(pages[idx]))]
+            after: Optional[str] = None
+            while len(empty) < batch and idx + len(empty) < len(pages):
+                following = pages[idx + len(empty)]
+                after = following.extract_text() or ""
+                if after.strip():
+                    break
+                empty.append((idx + len(empty), page_hash(following)))
+                after = None
+            for (page_idx, _digest), ocr_text in zip(empty, engine.ocr_pages(pdf_path, empty)):
+                if ocr_indices is not None:
+                    ocr_indices.add(page_idx)
+                yield ocr_text
+            idx += len(empty)
+            if after is not None:
+                yield after
+                idx += 1
+
+
+def scan_estimate_ocr(
+    pdf_path: Path,
+    engine: OcrEngine,
+    max_pages: Optional[int] = None,
+) -> Tuple[Dict[str, Optional[str]], int, List[str]]:
+    """Parses an estimate, OCR'ing the pages that have no text layer.
+
+    Returns:
+        A tuple ``(info, pages_read, ocr_fields)``.  ``info`` and
+        ``pages_read`` are as for :func:`parse_estimate.scan_estimate`;
+        ``ocr_fields`` names the fields that were found on OCR'd pages.
+    """
+    ocr_indices: Set[int] = set()
+    pages = iter_pages_with_ocr(pdf_path, engine, max_pages=max_pages, ocr_indices=ocr_indices)
+    matches, pages_read = VEHICLE_SCANNER.scan_pages(pages)
+    ocr_fields = [field for field, match in matches.items() if match.page in ocr_indices]
+    return match_values(matches, VEHICLE_SCANNER.fields), pages_read, ocr_fields
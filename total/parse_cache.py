@@ -0,0 +1,306 @@
+"""
+parse_cache.py
+==============
+
+An on‑disk cache for :mod:`parse_estimate` results, keyed by the
+content of the estimate PDF.  Adjusters frequently upload the same
+estimate again after editing only the claim details; laying the PDF
+out with ``pdfplumber`` is by far the slowest stage of the pipeline,
+so an unchanged file should not have to go through it twice.
+
+Entries live in a single SQLite database and are keyed by
+
+* the SHA‑256 of the PDF bytes (the file name does not matter),
+* :data:`parse_estimate.PARSER_VERSION`, so changing the extraction
+  rules automatically invalidates old results, and
+* the ``max_pages`` cap the estimate was parsed with.
+
+Each entry stores the extracted fields, the number of pages read and
+the text of those pages (zlib compressed).  When the total size of all
+entries exceeds the configured budget the least recently used entries
+are evicted.
+
+The database location defaults to ``~/.cache/claim_cipher`` and can be
+changed with the ``CLAIM_CIPHER_CACHE_DIR`` environment variable or the
+``--parse-cache`` option of ``process_claim.py``.  Use
+``--no-parse-cache`` to bypass it and ``--purge-parse-cache`` to empty
+it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import layout_extraction
+from . import memory_limits
+from . import parse_estimate
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parses (
+    pdf_hash TEXT NOT NULL,
+    parser_version TEXT NOT NULL,
+    max_pages INTEGER NOT NULL,
+    fields TEXT NOT NULL,
+    pages_read INTEGER NOT NULL,
+    page_text BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (pdf_hash, parser_version, max_pages)
+);
+CREATE INDEX IF NOT EXISTS parses_last_access ON parses (last_access);
+"""
+
+
+def default_cache_path() -> Path:
+    """Returns the default location of the cache database."""
+    root = os.getenv("CLAIM_CIPHER_CACHE_DIR")
+    base = Path(root) if root else Path.home() / ".cache" / "claim_cipher"
+    return base / "parse_cache.sqlite"
+
+
+def hash_pdf(pdf_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Returns the hex SHA‑256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with Path(pdf_path).open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parser_version(extraction: str = "text") -> str:
+    """Version cached parses of an ``extraction`` mode are stored under."""
+    if extraction == "layout":
+        return f"{parse_estimate.PARSER_VERSION}+layout{layout_extraction.LAYOUT_VERSION}"
+    return parse_estimate.PARSER_VERSION
+
+
+class ParseCache:
+    """SQLite‑backed cache of parsed estimates with an LRU size budget.
+
+    The connection is opened lazily so instances can be created before
+    forking worker processes.  Several processes may share one database;
+    SQLite's own locking serialises the writes.
+
+    Args:
+        path: Database file.  Defaults to :func:`default_cache_path`.
+        max_bytes: Budget for the stored page text and fields.  Once it
+            is exceeded the least recently used entries are removed.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else default_cache_path()
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(
+        self, pdf_hash: str, max_pages: Optional[int] = None, parser_version: Optional[str] = None
+    ) -> Optional[Tuple[Dict[str, Optional[str]], int, List[str]]]:
+        """Looks up a cached parse.
+
+        Args:
+            pdf_hash: :func:`hash_pdf` of the estimate.
+            max_pages: The page cap the estimate was parsed with.
+            parser_version: Defaults to
+                :data:`parse_estimate.PARSER_VERSION`.
+
+        Returns:
+            ``(fields, pages_read, page_texts)`` or ``None`` on a miss.
+        """
+        conn = self._connect()
+        key = (pdf_hash, parser_version or parse_estimate.PARSER_VERSION, max_pages or 0)
+        row = conn.execute(
+            "SELECT fields, pages_read, page_text FROM parses "
+            "WHERE pdf_hash = ? AND parser_version = ? AND max_pages = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE parses SET last_access = ? "
+                "WHERE pdf_hash = ? AND parser_version = ? AND max_pages = ?",
+                (time.time(),) + key,
+            )
+        fields, pages_read, blob = row
+        return json.loads(fields), pages_read, json.loads(zlib.decompress(blob))
+
+    def put(
+        self,
+        pdf_hash: str,
+        fields: Dict[str, Optional[str]],
+        pages_read: int,
+        page_texts: Iterable[str],
+        max_pages: Optional[int] = None,
+        parser_version: Optional[str] = None,
+    ) -> None:
+        """Stores a parse result and evicts old entries if over budget.
+
+        ``page_texts`` is compressed as it is iterated, so a
+        :class:`memory_limits.PageSpill` never has to be loaded whole.
+        """
+        conn = self._connect()
+        fields_json = json.dumps(fields)
+        blob = _compress_pages(page_texts)
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    pdf_hash,
+                    parser_version or parse_estimate.PARSER_VERSION,
+                    max_pages or 0,
+                    fields_json,
+                    pages_read,
+                    blob,
+                    len(blob) + len(fields_json),
+                    now,
+                    now,
+                ),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM parses ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((rowid,))
+            total -= size
+        conn.executemany("DELETE FROM parses WHERE rowid = ?", doomed)
+
+    def purge(self) -> int:
+        """Deletes every entry and returns how many were removed."""
+        conn = self._connect()
+        with conn:
+            removed = conn.execute("DELETE FROM parses").rowcount
+        conn.execute("VACUUM")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of entries and their total size in bytes."""
+        count, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM parses"
+        ).fetchone()
+        return {"entries": count, "bytes": size}
+
+
+def _compress_pages(page_texts: Iterable[str]) -> bytes:
+    """zlib‑compressed JSON list of the pages, built one page at a time."""
+    compressor = zlib.compressobj()
+    chunks = [compressor.compress(b"[")]
+    for idx, page_text in enumerate(page_texts):
+        chunks.append(compressor.compress(((", " if idx else "") + json.dumps(page_text)).encode("utf-8")))
+    chunks.append(compressor.compress(b"]"))
+    chunks.append(compressor.flush())
+    return b"".join(chunks)
+
+
+def _recording(pages: Iterator[str], sink: Any) -> Iterator[str]:
+    """Passes pages through while keeping a copy of each one."""
+    try:
+        for page_text in pages:
+            sink.append(page_text)
+            yield page_text
+    finally:
+        close = getattr(pages, "close", None)
+        if close is not None:
+            close()
+
+
+def cached_scan_estimate(
+    pdf_path: Path,
+    cache: Optional[ParseCache],
+    max_pages: Optional[int] = None,
+    pdf_hash: Optional[str] = None,
+    extraction: str = "text",
+    low_memory: bool = False,
+    monitor: Optional[memory_limits.MemoryMonitor] = None,
+) -> Tuple[Dict[str, Optional[str]], int, bool]:
+    """Like :func:`parse_estimate.scan_estimate` but consults ``cache``.
+
+    Args:
+        pdf_path: Path to the estimate PDF.
+        cache: The cache to use, or ``None`` to always parse.
+        max_pages: Optional hard cap on pages to read.
+        pdf_hash: :func:`hash_pdf` of the file, if the caller already
+            has it.
+        extraction: ``"text"`` for :func:`parse_estimate.scan_estimate`
+            or ``"layout"`` for
+            :func:`layout_extraction.scan_estimate_layout`.  Results of
+            the two are cached separately.
+        low_memory: Flush each page's parsed objects once it has been
+            read (see :func:`parse_estimate.iter_pdf_pages`) and, for
+            text extraction, keep the page text for the cache in a
+            :class:`memory_limits.PageSpill`.
+        monitor: Checked after every page read.
+
+    Returns:
+        A tuple ``(info, pages_read, cache_hit)``.
+    """
+    if extraction == "layout":
+        version = parser_version(extraction)
+        if cache is None:
+            info, pages_read = layout_extraction.scan_estimate_layout(
+                pdf_path, max_pages=max_pages, low_memory=low_memory, monitor=monitor
+            )
+            return info, pages_read, False
+        pdf_hash = pdf_hash or hash_pdf(pdf_path)
+        cached = cache.get(pdf_hash, max_pages=max_pages, parser_version=version)
+        if cached is not None:
+            fields, pages_read, _page_texts = cached
+            return fields, pages_read, True
+        # Page text is not kept in layout mode
+        info, pages_read = layout_extraction.scan_estimate_layout(
+            pdf_path, max_pages=max_pages, low_memory=low_memory, monitor=monitor
+        )
+        cache.put(pdf_hash, info, pages_read, [], max_pages=max_pages, parser_version=version)
+        return info, pages_read, False
+    if cache is None:
+        info, pages_read = parse_estimate.scan_estimate(
+            pdf_path, max_pages=max_pages, low_memory=low_memory, monitor=monitor
+        )
+        return info, pages_read, False
+    pdf_hash = pdf_hash or hash_pdf(pdf_path)
+    cached = cache.get(pdf_hash, max_pages=max_pages)
+    if cached is not None:
+        fields, pages_read, _page_texts = cached
+        return fields, pages_read, True
+    page_texts: Any = memory_limits.PageSpill() if low_memory else []
+    try:
+        pages = _recording(
+            parse_estimate.iter_pdf_pages(pdf_path, max_pages=max_pages, low_memory=low_memory, monitor=monitor),
+            page_texts,
+        )
+        info, pages_read = parse_estimate.extract_vehicle_info_incremental(pages)
+        cache.put(pdf_hash, info, pages_read, page_texts, max_pages=max_pages)
+    finally:
+        if low_memory:
+            page_texts.close()
+    return info, pages_read, False
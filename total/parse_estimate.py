@@ -12,7 +12,9 @@ more flexible, this module generalises the parsing logic:
 * It reads *all* pages of the provided PDF (or a user‑specified range)
   rather than stopping after page 2.  This makes it more likely that
   important fields will be captured even if they appear later in the
-  document.
+  document.  Pages are read lazily (:func:`iter_pdf_pages`) and
+  :func:`parse_estimate` stops opening pages once every field has been
+  found, so long estimates with the vehicle block on page 1 stay cheap.
 * It searches for generic patterns (``VIN``, a four‑digit year,
   ``Make``, ``Model``, mileage and damages descriptions) using
   case‑insensitive regular expressions.  Missing values are left as
@@ -33,11 +35,61 @@ fields or handle alternate layouts) this is the place to do it.
 from __future__ import annotations
 
 import json
-import re
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
-import pdfplumber  # type: ignore
+from .field_extraction import ESTIMATE_SCANNER, VEHICLE_SCANNER, FieldMatch, FieldScanner, match_values
+
+# Bump whenever the extraction rules change so cached results produced by
+# an older parser (see :mod:`parse_cache`) are no longer used.
+PARSER_VERSION = "1"
+
+
+def iter_pdf_pages(
+    pdf_path: Path,
+    max_pages: Optional[int] = None,
+    low_memory: bool = False,
+    monitor: Optional[Any] = None,
+) -> Iterator[str]:
+    """Yields the text of each page of a PDF, one page at a time.
+
+    Pages are only laid out by ``pdfplumber`` when the caller asks for
+    them, so a consumer that stops iterating early (see
+    :func:`extract_vehicle_info_incremental`) never pays for the rest
+    of the document.  Closing the generator closes the PDF.
+
+    Args:
+        pdf_path: The path to the PDF file.
+        max_pages: Optional hard cap on the number of pages to read.
+        low_memory: Flush each page's caches, and the PDF objects
+            ``pdfminer`` has parsed, once its text has been extracted,
+            so memory does not grow with the number of pages read.
+        monitor: Optional :class:`memory_limits.MemoryMonitor` checked
+            after every page.
+
+    Yields:
+        The text of each page, or an empty string when ``extract_text``
+        returns nothing for that page.
+    """
+    # Imported here: pdfplumber pulls in pdfminer and Pillow, which
+    # commands that never open an estimate should not pay for
+    import pdfplumber  # type: ignore
+
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        for idx, page in enumerate(pdf.pages):
+            if max_pages is not None and idx >= max_pages:
+                break
+            text = page.extract_text() or ""
+            if low_memory:
+                page.close()
+                # pdfminer caches every object it resolves for the life
+                # of the document; they are parsed again if needed
+                cached_objs = getattr(pdf.doc, "_cached_objs", None)
+                if cached_objs is not None:
+                    cached_objs.clear()
+            if monitor is not None:
+                monitor.check(f"page {idx + 1} of {pdf_path}")
+            yield text
 
 
 def read_pdf_text(pdf_path: Path, max_pages: Optional[int] = None) -> str:
@@ -56,16 +108,8 @@ def read_pdf_text(pdf_path: Path, max_pages: Optional[int] = None) -> str:
         ``extract_text`` fails to return anything for a page the
         extracted text is skipped.
     """
-    text = ""
-    with pdfplumber.open(str(pdf_path)) as pdf:
-        for idx, page in enumerate(pdf.pages):
-            if max_pages is not None and idx >= max_pages:
-                break
-            page_text = page.extract_text()
-            if page_text:
-                # Normalize newlines to aid pattern matching
-                text += page_text + "\n"
-    return text
+    # Normalize newlines to aid pattern matching
+    return "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf_path, max_pages) if page_text)
 
 
 def extract_vehicle_info(text: str) -> Dict[str, Optional[str]]:
@@ -93,49 +137,94 @@ def extract_vehicle_info(text: str) -> Dict[str, Optional[str]]:
     Returns:
         A dictionary with keys ``vin``, ``year``, ``make``, ``model``,
         ``mileage`` and ``damages``.  Missing values remain ``None``.
+
+    Note:
+        All fields are found in a single pass over ``text``; the
+        patterns themselves live in :mod:`field_extraction`.
     """
-    info: Dict[str, Optional[str]] = {
-        "vin": None,
-        "year": None,
-        "make": None,
-        "model": None,
-        "mileage": None,
-        "damages": None,
-    }
-    # 17‑character VIN (letters/digits except I,O,Q)
-    vin_match = re.search(r"\b([A-HJ-NPR-Z0-9]{17})\b", text)
-    if vin_match:
-        info["vin"] = vin_match.group(1)
-    # Year (1900–2099)
-    year_match = re.search(r"\b(19|20)\d{2}\b", text)
-    if year_match:
-        info["year"] = year_match.group(0)
-    # Make – look for 'Make' followed by a colon/dash and a word
-    make_match = re.search(r"Make\s*[:\-]?\s*([A-Za-z]+)", text, re.IGNORECASE)
-    if make_match:
-        info["make"] = make_match.group(1)
-    # Model – look for 'Model' followed by word(s) until newline or comma
-    model_match = re.search(r"Model\s*[:\-]?\s*([A-Za-z0-9\- ]+)", text, re.IGNORECASE)
-    if model_match:
-        info["model"] = model_match.group(1).strip()
-    # Mileage – look for 'Miles' or 'Mileage' followed by digits/commas
-    mileage_match = re.search(r"(?:Miles|Mileage)\s*[:\-]?\s*([\d,]+)", text, re.IGNORECASE)
-    if mileage_match:
-        info["mileage"] = mileage_match.group(1).replace(",", "")
-    # Damages – capture up to 200 characters after the heading
-    damage_match = re.search(
-        r"(?:Damages?|Damage Description)\s*[:\-]?\s*([\s\S]{0,200})",
-        text,
-        re.IGNORECASE,
-    )
-    if damage_match:
-        info["damages"] = damage_match.group(1).strip()
-    return info
+    return match_values(VEHICLE_SCANNER.scan(text), VEHICLE_SCANNER.fields)
+
+
+def extract_vehicle_info_incremental(pages: Iterable[str]) -> Tuple[Dict[str, Optional[str]], int]:
+    """Extracts vehicle information while consuming pages one at a time.
+
+    Produces the same result as running :func:`extract_vehicle_info`
+    over the full text, but stops pulling pages from ``pages`` as soon
+    as every field has a settled match.  Already scanned text is
+    discarded once no pending field can still need it, so memory use
+    does not grow with the length of the document.
+
+    A match that starts close to the end of the text seen so far (for
+    example the 200‑character damages window) is treated as pending
+    and re‑checked once the next page arrives.
+
+    Args:
+        pages: An iterable of page texts, typically
+            :func:`iter_pdf_pages`.  If it is a generator it is closed
+            on return so the underlying PDF is released.
+
+    Returns:
+        A tuple ``(info, pages_read)`` where ``info`` has the same keys
+        as :func:`extract_vehicle_info` and ``pages_read`` is the number
+        of pages taken from ``pages``.
+    """
+    matches, pages_read = VEHICLE_SCANNER.scan_pages(pages)
+    return match_values(matches, VEHICLE_SCANNER.fields), pages_read
+
+
+def extract_fields(
+    pages: Iterable[str],
+    scanner: FieldScanner = ESTIMATE_SCANNER,
+) -> Tuple[Dict[str, FieldMatch], int]:
+    """Extracts every field known to ``scanner`` with its location.
+
+    Unlike :func:`extract_vehicle_info_incremental` the result keeps the
+    character offset and page index of each match, and the default
+    scanner also looks for the claim‑level fields (claim number,
+    insurer, ACV and total estimate amount) in the same pass.
+
+    Args:
+        pages: An iterable of page texts, typically
+            :func:`iter_pdf_pages`.
+        scanner: The compiled rules to apply.  Build your own
+            :class:`field_extraction.FieldScanner` to add fields.
+
+    Returns:
+        A tuple ``(matches, pages_read)``.  ``matches`` only contains
+        the fields that were found.
+    """
+    return scanner.scan_pages(pages)
+
+
+def scan_estimate(
+    pdf_path: Path,
+    max_pages: Optional[int] = None,
+    low_memory: bool = False,
+    monitor: Optional[Any] = None,
+) -> Tuple[Dict[str, Optional[str]], int]:
+    """Parses an estimate lazily and reports how many pages were read.
+
+    Args:
+        pdf_path: Path to the estimate PDF.
+        max_pages: Optional hard cap on pages to read.  Reading usually
+            stops earlier, once all fields have been found.
+        low_memory: See :func:`iter_pdf_pages`.
+        monitor: See :func:`iter_pdf_pages`.
+
+    Returns:
+        A tuple ``(info, pages_read)``; see
+        :func:`extract_vehicle_info_incremental`.
+    """
+    pages = iter_pdf_pages(pdf_path, max_pages=max_pages, low_memory=low_memory, monitor=monitor)
+    return extract_vehicle_info_incremental(pages)
 
 
 def parse_estimate(pdf_path: Path, max_pages: Optional[int] = None) -> Dict[str, Optional[str]]:
     """Convenience wrapper to read and extract vehicle info from a PDF.
 
+    Pages are read lazily and reading stops as soon as all fields are
+    resolved; see :func:`scan_estimate`.
+
     Args:
         pdf_path: Path to the estimate PDF.
         max_pages: Optional limit for pages to read.  See :func:`read_pdf_text`.
@@ -143,8 +232,8 @@ def parse_estimate(pdf_path: Path, max_pages: Optional[int] = None) -> Dict[str,
     Returns:
         A dictionary of parsed fields.  Missing keys may be ``None``.
     """
-    text = read_pdf_text(pdf_path, max_pages=max_pages)
-    return extract_vehicle_info(text)
+    info, _pages_read = scan_estimate(pdf_path, max_pages=max_pages)
+    return info
 
 
 def save_parsed_data(data: Dict[str, Optional[str]], output_path: Path) -> None:
@@ -182,7 +271,8 @@ def main() -> None:
         sys.exit(1)
     max_pages_env = os.getenv("MAX_PAGES")
     max_pages = int(max_pages_env) if max_pages_env and max_pages_env.isdigit() else None
-    parsed = parse_estimate(pdf_path, max_pages=max_pages)
+    parsed, pages_read = scan_estimate(pdf_path, max_pages=max_pages)
+    print(f"Read {pages_read} page(s)")
     # Ensure output directory exists
     output_dir = Path("output")
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -16,19 +16,32 @@ When run as a script the typical usage is::
 
 If any of these fields are omitted they will remain blank in the BCIF
 and summary; you can edit them later.  The summary is saved to
-``output/claim_summary.txt`` by default and the filled BCIF is written to
+``output/claim_summary.pdf`` by default and the filled BCIF is written to
 ``output/filled_bcif.pdf``.  See the README for more details.
 
 Note:
 
-* This script uses only built‑in libraries plus the modules in
-  ``scripts/``.  Optional dependencies such as ``reportlab`` or
-  ``fpdf`` are **not** imported here; instead, we call the stub
-  implementation in :mod:`summary_utils`.  You should update that
-  function if you want to produce a real PDF.
-* The BCIF filling uses ``pdfrw`` exactly as in ``fill_bcif.py``.  You
+* The summary PDF is rendered by :mod:`summary_utils` with the optional
+  ``fpdf2`` package.  Without it the summary is written as
+  ``claim_summary.txt`` instead.
+* The BCIF filling uses ``pdfrw`` (see :mod:`bcif_utils`).  You
   will need to install the ``pdfrw`` package (``pip install pdfrw``)
   for this portion to work.
+* ``--ocr`` reads scanned pages with ``tesseract`` (see
+  :mod:`ocr_utils`); fields found that way are listed under
+  ``ocr_fields`` in ``assembled_data.json``.
+* ``--extraction layout`` reads the vehicle fields from word positions
+  in the page header (see :mod:`layout_extraction`) instead of the
+  flattened page text.
+* ``--low-memory`` reads very large estimates one page at a time and
+  ``--memory-ceiling`` stops an estimate that needs more memory than
+  that (see :mod:`memory_limits`).  The peak resident set size of every
+  run is reported either way.
+* If a :mod:`claim_daemon` is running, the claim is handed to one of
+  its warm worker processes and only the progress messages are printed
+  here; ``--no-daemon`` always runs it in this process.  The PDF
+  libraries are only imported by the stages that use them, so this
+  hand‑off (and ``--help``) starts quickly.
 * Error handling is minimal.  For production use you should add
   additional checks and logging.
 """
@@ -37,68 +50,73 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
+import sys
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
-
-from pdfrw import PdfReader, PdfWriter, PdfDict  # type: ignore
-
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import bcif_utils
+from . import claim_daemon
+from . import claim_export
+from . import layout_extraction
+from . import memory_limits
+from . import ocr_utils
+from . import parse_cache
 from . import parse_estimate
 from . import vin_utils
 from . import salvage_utils
+from . import stage_store
+from . import stage_timing
 from . import summary_utils
+from . import valuation
 
 
-def fill_bcif(template_path: Path, data: Dict[str, str], output_path: Path) -> None:
+def fill_bcif(template_path: Path, data: Dict[str, str], output_path: Path) -> List[str]:
     """Fills a CCC BCIF PDF form using ``pdfrw``.
 
-    This function is a slightly modified version of the existing
-    ``fill_bcif.py`` script.  It loads the parsed data, iterates over
-    the form fields in the template and writes matching values.  If
-    ``data`` contains a key that matches the field name in the PDF, the
-    corresponding annotation's value is set.  Field names in the PDF
-    template can be discovered by printing them (see the original
-    ``fill_bcif.py`` for details).
+    If ``data`` contains a key that matches the field name in the PDF,
+    the corresponding annotation's value is set.  The template is
+    parsed once per process and reused for later calls; see
+    :class:`bcif_utils.BcifTemplate`.  Field names in the PDF template
+    can be listed with ``BcifTemplate(path).fields``.
 
     Args:
         template_path: Path to the blank BCIF PDF.
         data: A dictionary mapping field names to values.
         output_path: Destination path for the filled PDF.
+
+    Returns:
+        The keys of ``data`` that have a value but no matching field in
+        the form.
     """
-    template_pdf = PdfReader(str(template_path))
-    for page in template_pdf.pages:
-        annots = page.Annots
-        if not annots:
-            continue
-        for annot in annots:
-            if annot.Subtype == '/Widget' and annot.T:
-                key = annot.T[1:-1]  # Remove parentheses around field name
-                if key in data and data[key] is not None:
-                    annot.V = data[key]
-                    # Set appearance dictionary to avoid showing stale values
-                    annot.AP = PdfDict()
-    PdfWriter().write(str(output_path), template_pdf)
-
-
-def compute_nada_value(year: Optional[str]) -> Optional[int]:
+    template = bcif_utils.get_template(template_path)
+    template.fill(data, output_path)
+    return template.unmapped(data)
+
+
+def compute_nada_value(
+    year: Optional[str],
+    mileage: Optional[str] = None,
+    make: Optional[str] = None,
+) -> Optional[int]:
     """Computes a placeholder NADA value based on vehicle year.
 
-    This mirrors the depreciation formula used in the front‑end
+    A thin wrapper over :func:`valuation.value_one`, so single claims
+    and portfolio valuations use the same curves.  With the bundled
+    table this mirrors the depreciation formula used in the front‑end
     JavaScript: starting at $30,000 for the current model year and
-    depreciating 7 percent per year.  If ``year`` is invalid or in
+    depreciating 7 percent per year.  If ``year`` is invalid or in
     the future the function returns ``None``.
     """
-    try:
-        year_int = int(year) if year else None
-    except (TypeError, ValueError):
-        return None
-    from datetime import datetime
-    current_year = datetime.now().year
-    if not year_int or year_int > current_year or year_int < 1900:
-        return None
-    age = current_year - year_int
-    base = 30000
-    value = base * (0.93 ** age)
-    return int(round(value))
+    return valuation.value_one(year, mileage, make)
+
+
+# Options read by assemble_data(); the merge stage reruns when one changes
+_MERGE_OPTIONS = (
+    "customer_name", "adjuster_name", "claim_number", "date_of_loss", "location",
+    "vin", "year", "make", "model", "mileage", "damages", "days_to_repair",
+)
 
 
 def assemble_data(args: argparse.Namespace, parsed: Dict[str, Optional[str]], decoded: Dict[str, str]) -> Dict[str, str]:
@@ -132,7 +150,47 @@ def assemble_data(args: argparse.Namespace, parsed: Dict[str, Optional[str]], de
     return result
 
 
-def main() -> None:
+def build_summary_inputs(
+    assembled: Dict[str, Optional[str]],
+    nada_value: Optional[int],
+    salvage_bids: List[Dict[str, int]],
+    is_total_loss: bool,
+) -> Dict[str, Any]:
+    """Keyword arguments for :func:`summary_utils.build_summary_text`.
+
+    Shared with :mod:`claim_service` so a summary requested over HTTP
+    reads exactly like the one written by this script.
+    """
+    return {
+        "claim_data": {
+            'claim_number': assembled.get('claim_number'),
+            'customer_name': assembled.get('customer_name'),
+            'adjuster_name': assembled.get('adjuster_name'),
+            'date_of_loss': assembled.get('date_of_loss'),
+            'inspection_location': assembled.get('inspection_location'),
+        },
+        "vehicle_info": {
+            'year': assembled.get('year'),
+            'make': assembled.get('make'),
+            'model': assembled.get('model'),
+            'vin': assembled.get('vin'),
+            'mileage': assembled.get('mileage'),
+            'damages': assembled.get('damages'),
+            'days_to_repair': assembled.get('days_to_repair'),
+        },
+        "nada_value": nada_value,
+        "salvage_bids": salvage_bids,
+        "is_total_loss": is_total_loss,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Returns the argument parser shared by the single-claim and batch CLIs.
+
+    :mod:`batch_process` reuses the parser's defaults so that a claim
+    processed in a batch sees exactly the same settings as one run
+    from the command line.
+    """
     parser = argparse.ArgumentParser(description="Process a CCC estimate and generate claim documents")
     parser.add_argument("--estimate", required=True, help="Path to the CCC ONE estimate PDF")
     parser.add_argument("--bcif", default="input/CCC BCIF.pdf", help="Path to the blank BCIF PDF template")
@@ -150,76 +208,312 @@ def main() -> None:
     parser.add_argument("--days-to-repair", help="Estimated days to repair")
     parser.add_argument("--total-loss", action="store_true", help="Mark the vehicle as a total loss; omit to mark as repairable")
     parser.add_argument("--output-dir", default="output", help="Directory where outputs should be saved")
-    args = parser.parse_args()
+    parser.add_argument("--remote-vin-decode", action="store_true", help="Ask NHTSA vPIC about VINs the bundled WMI table cannot decode")
+    parser.add_argument("--extraction", choices=("text", "layout"), default="text", help="Read fields from the flattened page text or from word positions in the page header (layout)")
+    parser.add_argument("--low-memory", action="store_true", help="Flush page caches after each page and spill page text to a temp file (very large estimates)")
+    parser.add_argument("--memory-ceiling", type=float, metavar="MB", help="Stop an estimate once the process's resident memory passes this many megabytes")
+    parser.add_argument("--parse-cache", help="Parse cache database (default: ~/.cache/claim_cipher/parse_cache.sqlite)")
+    parser.add_argument("--no-parse-cache", action="store_true", help="Always re-parse the estimate PDF, bypassing the parse cache")
+    parser.add_argument("--purge-parse-cache", action="store_true", help="Empty the parse cache before processing")
+    parser.add_argument("--ocr", action="store_true", help="OCR pages without a text layer with tesseract (scanned or faxed estimates)")
+    parser.add_argument("--ocr-workers", type=int, help="Pages to OCR in parallel (default: CPU count)")
+    parser.add_argument("--ocr-lang", default="eng", help="Tesseract language for --ocr")
+    parser.add_argument("--purge-ocr-cache", action="store_true", help="Empty the OCR page cache before processing")
+    parser.add_argument("--export-dir", help="Also append the claim to a date-partitioned Parquet/Arrow dataset in this folder")
+    parser.add_argument("--export-format", choices=sorted(claim_export.FORMATS), default="parquet", help="Format of the --export-dir dataset")
+    parser.add_argument("--no-reuse", action="store_true", help="Run every stage even if its inputs are unchanged since the last run in --output-dir")
+    parser.add_argument("--explain", action="store_true", help="Show which stages were reused from the last run and why the others ran")
+    parser.add_argument("--no-daemon", action="store_true", help="Process the claim in this process even if a claim daemon is running")
+    parser.add_argument("--timings-log", help="Append per-stage timings to this file as JSON lines")
+    parser.add_argument("--profile", action="store_true", help="Run each stage under cProfile and save <output-dir>/profile/<stage>.prof")
+    parser.add_argument("--trace-memory", action="store_true", help="Record each stage's peak Python allocation with tracemalloc (slow)")
+    return parser
+
+
+def process_claim(
+    args: argparse.Namespace,
+    log: Callable[..., None] = print,
+    recorder: Optional[stage_timing.StageRecorder] = None,
+    on_parsed: Optional[Callable[[str, Dict[str, Optional[str]]], Optional[Path]]] = None,
+) -> Dict[str, Any]:
+    """Runs the full pipeline for a single estimate.
+
+    This is the body of :func:`main` pulled out so it can be called
+    repeatedly from one interpreter (see :mod:`batch_process`).  All
+    outputs are written to ``args.output_dir``.  Each step is timed as
+    a stage; see :mod:`stage_timing`.  Stages whose inputs are the same
+    as in the last run in that folder reuse its results; see
+    :mod:`stage_store`.
 
+    Args:
+        args: Parsed command-line arguments (see :func:`build_parser`).
+        log: Function used for progress messages.  Defaults to
+            :func:`print`; pass a no-op to silence output.
+        recorder: Collects the stage timings.  By default one is built
+            from the ``--timings-log``, ``--profile`` and
+            ``--trace-memory`` options.
+        on_parsed: Called with the PDF hash and the parsed fields once
+            the estimate has been read.  It may return another claim's
+            output folder whose saved stage results the remaining
+            stages can reuse (see :meth:`stage_store.StageStore.adopt`),
+            as :mod:`batch_process` does for supplements.
+
+    Returns:
+        A dictionary with the assembled data, NADA value, salvage bids,
+        stage timings, the peak memory use, which stages were reused
+        (and how many were taken from another folder) and the paths of
+        the files that were written.
+
+    Raises:
+        memory_limits.MemoryCeilingExceeded: If ``--memory-ceiling`` is
+            passed while the estimate is read.
+    """
     estimate_path = Path(args.estimate)
     bcif_path = Path(args.bcif)
     output_dir = Path(args.output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # 1. Parse estimate PDF
-    parsed = parse_estimate.parse_estimate(estimate_path)
-    print("Parsed data:", parsed)
-
-    # 2. Decode VIN (if available)
-    decoded: Dict[str, str] = {}
-    vin_from_data = args.vin or parsed.get('vin')
-    if vin_from_data:
-        decoded_full = vin_utils.decode_vin(vin_from_data)
-        if decoded_full:
-            decoded = decoded_full
-            print("VIN decoded:", vin_utils.extract_basic_attributes(decoded))
+    sink = None
+    if recorder is None:
+        sink = open(args.timings_log, 'a', encoding='utf-8') if args.timings_log else None
+        recorder = stage_timing.StageRecorder(
+            claim=str(estimate_path),
+            sink=sink,
+            profile_dir=output_dir / "profile" if args.profile else None,
+            trace_memory=args.trace_memory,
+        )
+    stage = recorder.stage
+    store = stage_store.StageStore(output_dir, reuse=not args.no_reuse)
+    monitor = memory_limits.MemoryMonitor(args.memory_ceiling)
+    try:
+        # 1. Parse estimate PDF (or reuse the cached parse of identical bytes)
+        with stage("parse") as info:
+            cache = None if args.no_parse_cache else parse_cache.ParseCache(args.parse_cache)
+            if cache is not None and args.purge_parse_cache:
+                log("Purged", cache.purge(), "parse cache entries")
+            pdf_hash = parse_cache.hash_pdf(estimate_path)
+            try:
+                (parsed, pages_read, cache_hit), info["reused"] = store.run(
+                    "parse",
+                    {
+                        "pdf_hash": pdf_hash,
+                        "parser_version": parse_estimate.PARSER_VERSION,
+                        "extraction": [args.extraction, layout_extraction.LAYOUT_VERSION],
+                    },
+                    lambda: parse_cache.cached_scan_estimate(
+                        estimate_path, cache, pdf_hash=pdf_hash, extraction=args.extraction,
+                        low_memory=args.low_memory, monitor=monitor,
+                    ),
+                )
+            finally:
+                if cache is not None:
+                    cache.close()
+            info.update(pages_read=pages_read, cache_hit=cache_hit)
+            monitor.check("end of parse")
+        if info["reused"]:
+            source = "unchanged since the last run"
         else:
-            print("VIN decoding failed or returned no data")
-
-    # 3. Merge data from all sources
-    assembled = assemble_data(args, parsed, decoded)
-
-    # 4. Compute NADA value
-    nada_value = compute_nada_value(assembled.get('year'))
-    print("Estimated NADA value:", nada_value)
-
-    # 5. Generate salvage bids (example only)
-    salvage_bids = salvage_utils.generate_example_bids(nada_value) if nada_value else []
-    print("Salvage bids:", salvage_bids)
+            source = "parse cache" if cache_hit else f"{pages_read} page(s) read"
+        log(f"Parsed data ({source}):", parsed)
+
+        # 1b. OCR pages without a text layer if fields are still missing.
+        # Pages that do have text are read again, but OCR'd pages come
+        # from the OCR cache when the same scan is seen again.
+        ocr_fields: List[str] = []
+        if args.purge_ocr_cache:
+            ocr_cache = ocr_utils.OcrCache()
+            try:
+                log("Purged", ocr_cache.purge(), "OCR cache entries")
+            finally:
+                ocr_cache.close()
+        if args.ocr and not all(parsed.values()):
+            with stage("ocr") as info:
+                def run_ocr() -> Tuple[Dict[str, Optional[str]], int, List[str]]:
+                    engine = ocr_utils.OcrEngine(
+                        workers=args.ocr_workers, lang=args.ocr_lang, cache=ocr_utils.OcrCache()
+                    )
+                    try:
+                        return ocr_utils.scan_estimate_ocr(estimate_path, engine)
+                    finally:
+                        engine.close()
+
+                (ocr_parsed, pages_read, ocr_fields), info["reused"] = store.run(
+                    "ocr", {"pdf_hash": pdf_hash, "parsed": parsed, "ocr_lang": args.ocr_lang}, run_ocr
+                )
+                parsed = {key: parsed.get(key) or ocr_parsed.get(key) for key in ocr_parsed}
+                ocr_fields = [field for field in ocr_fields if parsed.get(field) == ocr_parsed[field]]
+                info.update(pages_read=pages_read, ocr_fields=ocr_fields)
+            if ocr_fields:
+                log("Fields read by OCR (please check):", ", ".join(ocr_fields))
+
+        stages_seeded = 0
+        if on_parsed is not None:
+            source_dir = on_parsed(pdf_hash, parsed)
+            if source_dir is not None:
+                stages_seeded = store.adopt(Path(source_dir))
+
+        # 2. Decode VIN (if available)
+        decoded: Dict[str, str] = {}
+        vin_from_data = args.vin or parsed.get('vin')
+        if vin_from_data:
+            with stage("decode_vin") as info:
+                decoded_full, info["reused"] = store.run(
+                    "decode_vin",
+                    {
+                        "vin": vin_from_data,
+                        "remote": args.remote_vin_decode,
+                        "wmi_table": stage_store.file_fingerprint(vin_utils.wmi_table_path()),
+                    },
+                    lambda: vin_utils.decode_vin(vin_from_data, remote=args.remote_vin_decode, log=log),
+                )
+            if decoded_full:
+                decoded = decoded_full
+                log("VIN decoded:", vin_utils.extract_basic_attributes(decoded))
+            else:
+                log("VIN decoding failed or returned no data")
+
+        # 3. Merge data from all sources
+        with stage("merge") as info:
+            claim_options = {key: getattr(args, key) for key in _MERGE_OPTIONS}
+            assembled, info["reused"] = store.run(
+                "merge",
+                {"options": claim_options, "parsed": parsed, "decoded": decoded},
+                lambda: assemble_data(args, parsed, decoded),
+            )
+            # Only flag OCR values that survived the merge
+            ocr_fields = [field for field in ocr_fields if assembled.get(field) == parsed.get(field)]
+
+        # 4. Compute NADA value
+        valuation_table = stage_store.file_fingerprint(
+            Path(os.getenv("CLAIM_CIPHER_VALUATION_TABLE") or valuation.DEFAULT_TABLE)
+        )
+        with stage("value") as info:
+            vehicle = {key: assembled.get(key) for key in ('year', 'mileage', 'make')}
+            nada_value, info["reused"] = store.run(
+                "value",
+                # The value depreciates with every new calendar year
+                {"vehicle": vehicle, "table": valuation_table, "current_year": datetime.now().year},
+                lambda: compute_nada_value(vehicle['year'], vehicle['mileage'], vehicle['make']),
+            )
+        log("Estimated NADA value:", nada_value)
+
+        # 5. Generate salvage bids (example only)
+        with stage("bids") as info:
+            salvage_bids, info["reused"] = store.run(
+                "bids",
+                {"nada_value": nada_value, "table": valuation_table},
+                lambda: salvage_utils.generate_example_bids(nada_value) if nada_value else [],
+            )
+        log("Salvage bids:", salvage_bids)
+
+        # 6. Fill BCIF PDF
+        bcif_output = output_dir / "filled_bcif.pdf"
+        # Use only keys expected by the BCIF; unknown keys will be ignored
+        with stage("fill") as info:
+            unmapped, info["reused"] = store.run(
+                "fill",
+                {
+                    "template": [str(bcif_path.resolve()), stage_store.file_fingerprint(bcif_path)],
+                    "data": assembled,
+                },
+                lambda: fill_bcif(bcif_path, assembled, bcif_output),
+                outputs=lambda _unmapped: [bcif_output],
+            )
+        log("Filled BCIF saved to", bcif_output)
+        if unmapped:
+            log("Fields not present in the BCIF template:", ", ".join(unmapped))
+
+        # 7. Build claim summary
+        with stage("summary_text") as info:
+            summary_inputs = build_summary_inputs(assembled, nada_value, salvage_bids, args.total_loss)
+            claim_summary, info["reused"] = store.run(
+                "summary_text", summary_inputs, lambda: summary_utils.build_summary_text(**summary_inputs)
+            )
+
+        # 8. Save summary PDF (plain text if fpdf2 is not installed)
+        with stage("summary_pdf") as info:
+            summary_file, info["reused"] = store.run(
+                "summary_pdf",
+                {
+                    "text": claim_summary,
+                    "salvage_bids": salvage_bids,
+                    "font": os.getenv("CLAIM_CIPHER_SUMMARY_FONT"),
+                },
+                lambda: str(summary_utils.generate_summary_pdf(
+                    claim_summary, output_dir / "claim_summary", salvage_bids=salvage_bids, log=log
+                )),
+                outputs=lambda path: [Path(path)],
+            )
+            summary_path = Path(summary_file)
+        log("Claim summary saved to", summary_path)
+
+        # Also write a JSON version of assembled data for inspection
+        assembled_path = output_dir / "assembled_data.json"
+
+        def write_json() -> str:
+            with assembled_path.open('w', encoding='utf-8') as f:
+                json.dump(dict(assembled, ocr_fields=ocr_fields) if ocr_fields else assembled, f, indent=2)
+            return str(assembled_path)
+
+        with stage("write_json") as info:
+            _, info["reused"] = store.run(
+                "write_json",
+                {"assembled": assembled, "ocr_fields": ocr_fields},
+                write_json,
+                outputs=lambda path: [Path(path)],
+            )
+
+        result = {
+            'assembled': assembled,
+            'nada_value': nada_value,
+            'salvage_bids': salvage_bids,
+            'is_total_loss': args.total_loss,
+            'estimate': str(estimate_path),
+            'pdf_hash': pdf_hash,
+            'pages_read': pages_read,
+            'parse_cache_hit': cache_hit,
+            'ocr_fields': ocr_fields,
+            'unmapped_fields': unmapped,
+            'summary_text': claim_summary,
+            'timings': recorder.records,
+            'peak_rss_kb': monitor.peak_kb,
+            'stages_seeded': stages_seeded,
+            'outputs': {
+                'bcif': str(bcif_output),
+                'summary': str(summary_path),
+                'assembled': str(assembled_path),
+            },
+        }
+
+        # 9. Append to the analytics dataset
+        if args.export_dir:
+            with stage("export"):
+                claim_export.export_claims([result], Path(args.export_dir), args.export_format)
+            log("Claim exported to", args.export_dir)
+    finally:
+        store.save()
+        if sink is not None:
+            sink.close()
+
+    if args.explain:
+        log("Stages:\n" + store.explain())
+    if result['peak_rss_kb']:
+        log(f"Peak memory: {result['peak_rss_kb'] // 1024} MB")
+    result['stages'] = store.decisions
+    return result
 
-    # 6. Fill BCIF PDF
-    bcif_output = output_dir / "filled_bcif.pdf"
-    # Use only keys expected by the BCIF; unknown keys will be ignored
-    fill_bcif(bcif_path, assembled, bcif_output)
-    print("Filled BCIF saved to", bcif_output)
 
-    # 7. Build claim summary
-    claim_summary = summary_utils.build_summary_text(
-        claim_data={
-            'claim_number': assembled.get('claim_number'),
-            'customer_name': assembled.get('customer_name'),
-            'adjuster_name': assembled.get('adjuster_name'),
-            'date_of_loss': assembled.get('date_of_loss'),
-            'inspection_location': assembled.get('inspection_location'),
-        },
-        vehicle_info={
-            'year': assembled.get('year'),
-            'make': assembled.get('make'),
-            'model': assembled.get('model'),
-            'vin': assembled.get('vin'),
-            'mileage': assembled.get('mileage'),
-            'damages': assembled.get('damages'),
-            'days_to_repair': assembled.get('days_to_repair'),
-        },
-        nada_value=nada_value,
-        salvage_bids=salvage_bids,
-        is_total_loss=args.total_loss,
-    )
-
-    # 8. Save summary (txt for now; see summary_utils for PDF stub)
-    summary_path = output_dir / "claim_summary"
-    summary_utils.generate_summary_pdf(claim_summary, summary_path)
-    print("Claim summary saved to", summary_path.with_suffix('.txt'))
-
-    # Also write a JSON version of assembled data for inspection
-    with (output_dir / "assembled_data.json").open('w', encoding='utf-8') as f:
-        json.dump(assembled, f, indent=2)
+def main() -> None:
+    args = build_parser().parse_args()
+    if not args.no_daemon:
+        reply = claim_daemon.submit(sys.argv[1:])
+        if reply is not None:
+            for line in reply["log"]:
+                print(line)
+            if reply["error"]:
+                sys.exit(f"Claim daemon: {reply['error']}")
+            return
+    process_claim(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+"""
+salvage_utils.py
+================
+
+Example salvage bids for a single claim.
+
+The vendors and their factors come from the valuation table (see
+:mod:`valuation`), so the bids shown in a claim summary match the
+``bid_<vendor>`` columns of a portfolio valuation.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from . import valuation
+
+
+def generate_example_bids(nada_value: Optional[int]) -> List[Dict[str, int]]:
+    """Generates example salvage bids from a NADA value.
+
+    Args:
+        nada_value: The estimated vehicle value.
+
+    Returns:
+        ``{"vendor": name, "bid": amount}`` per vendor, in table order.
+        Empty if there is no value.
+    """
+    if not nada_value:
+        return []
+    table = valuation.get_table()
+    bids = valuation.salvage_bids([nada_value], table)
+    return [{"vendor": vendor, "bid": int(bids[f"bid_{vendor}"][0])} for vendor in table.vendors]
@@ -0,0 +1,182 @@
+"""
+stage_store.py
+==============
+
+Incremental re‑runs of the claim pipeline.
+
+Adjusters often run ``process_claim.py`` again for the same estimate
+after changing a single option such as ``--days-to-repair`` or
+``--customer-name``.  Re‑parsing the PDF, decoding the VIN and
+refilling the BCIF for that is wasted work.  Each stage of
+:func:`process_claim.process_claim` therefore declares its inputs –
+option values, the results of earlier stages, the PDF hash, template
+and data files – and :class:`StageStore` fingerprints them:
+
+* The fingerprint of every input and the stage's result are saved in
+  ``<output-dir>/.claim_stages.json`` after the run.
+* On the next run in the same output folder a stage whose input
+  fingerprints are unchanged returns the saved result instead of
+  running.  Stages that write files also check that those files are
+  still there and unmodified.
+* Because later stages take the results of earlier ones as inputs, a
+  change ripples through exactly the stages that depend on it: a new
+  ``--days-to-repair`` reruns merge, fill and the summaries but not the
+  parse, the VIN decode or the valuation.
+
+:meth:`StageStore.adopt` lets a run reuse the results saved in another
+folder, e.g. a supplement those of its original claim (see
+:mod:`claim_index`).
+
+``--explain`` prints which stages were reused and which inputs made the
+others run; ``--no-reuse`` ignores the saved state.  Bump
+:data:`PIPELINE_VERSION` when a stage's logic changes in a way its
+inputs do not capture.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+PIPELINE_VERSION = "1"
+
+STATE_FILE = ".claim_stages.json"
+
+
+def fingerprint(value: Any) -> str:
+    """Short SHA‑256 of a JSON‑serialisable value."""
+    data = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def file_fingerprint(path: Path) -> Optional[str]:
+    """Cheap fingerprint of a file from its size and modification time.
+
+    Returns ``None`` if the file does not exist.
+    """
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class StageStore:
+    """Saved stage results for one output folder.
+
+    Args:
+        output_dir: The claim's output folder.
+        reuse: If ``False`` every stage runs, but the results are still
+            saved for the next run.
+    """
+
+    def __init__(self, output_dir: Path, reuse: bool = True):
+        self.path = Path(output_dir) / STATE_FILE
+        self.reuse = reuse
+        self._previous: Dict[str, Dict[str, Any]] = _load_stages(self.path) if reuse else {}
+        self._current: Dict[str, Dict[str, Any]] = {}
+        self.decisions: List[Dict[str, Any]] = []
+
+    def adopt(self, source_dir: Path) -> int:
+        """Makes the results saved in ``source_dir`` available to this run.
+
+        Only stages that did not write files are taken – the files
+        belong to the other folder – and only where this folder has no
+        saved result of its own.  A stage still runs if its inputs
+        differ from those of the other folder.
+
+        Returns:
+            The number of stages taken.
+        """
+        if not self.reuse:
+            return 0
+        adopted = 0
+        for name, saved in _load_stages(Path(source_dir) / STATE_FILE).items():
+            if not saved.get("outputs") and name not in self._previous and name not in self._current:
+                self._previous[name] = saved
+                adopted += 1
+        return adopted
+
+    def _why_rerun(self, name: str, inputs: Dict[str, str]) -> List[str]:
+        """Reasons the saved result of ``name`` cannot be used (empty if it can)."""
+        saved = self._previous.get(name)
+        if saved is None:
+            return ["no saved result"]
+        old = saved["inputs"]
+        reasons = [f"{key} changed" for key in inputs if old.get(key) != inputs[key]]
+        reasons += [f"{key} removed" for key in old if key not in inputs]
+        for path, stamp in saved.get("outputs", {}).items():
+            if file_fingerprint(Path(path)) != stamp:
+                reasons.append(f"{Path(path).name} missing or modified")
+        return reasons
+
+    def run(
+        self,
+        name: str,
+        inputs: Dict[str, Any],
+        compute: Callable[[], Any],
+        outputs: Callable[[Any], Iterable[Path]] = lambda value: (),
+    ) -> Tuple[Any, bool]:
+        """Returns the stage's result, computing it only if needed.
+
+        Args:
+            name: Stage name.
+            inputs: Everything the stage's result depends on, by name.
+                Values must be JSON‑serialisable.
+            compute: Produces the result.  The result must be
+                JSON‑serialisable.
+            outputs: Given the result, the files the stage wrote.
+
+        Returns:
+            A tuple ``(result, reused)``.
+        """
+        prints = {key: fingerprint(value) for key, value in inputs.items()}
+        reasons = self._why_rerun(name, prints)
+        if not reasons:
+            saved = self._previous[name]
+            self._current[name] = saved
+            self.decisions.append({"stage": name, "reused": True, "reasons": []})
+            return saved["result"], True
+        value = compute()
+        # Round‑trip through JSON so a fresh result looks exactly like a reused one
+        value = json.loads(json.dumps(value, default=str))
+        self._current[name] = {
+            "inputs": prints,
+            "result": value,
+            "outputs": {str(path): file_fingerprint(Path(path)) for path in outputs(value)},
+        }
+        self.decisions.append({"stage": name, "reused": False, "reasons": reasons})
+        return value, False
+
+    def save(self) -> None:
+        """Writes the results of this run for the next one."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"version": PIPELINE_VERSION, "stages": self._current}, f, indent=1)
+        tmp.replace(self.path)
+
+    def explain(self) -> str:
+        """One line per stage saying whether it was reused, and if not why."""
+        lines = []
+        for decision in self.decisions:
+            if decision["reused"]:
+                lines.append(f"{decision['stage']:<14}reused")
+            else:
+                lines.append(f"{decision['stage']:<14}ran ({', '.join(decision['reasons'])})")
+        return "\n".join(lines)
+
+
+def _load_stages(path: Path) -> Dict[str, Dict[str, Any]]:
+    """The stages saved in a state file; empty if it is missing or stale."""
+    try:
+        with Path(path).open(encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get("version") != PIPELINE_VERSION:
+        return {}
+    return state.get("stages", {})
+
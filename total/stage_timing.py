@@ -0,0 +1,179 @@
+"""
+stage_timing.py
+===============
+
+Lightweight instrumentation for the stages of the claim pipeline.
+
+:func:`process_claim.process_claim` wraps each of its steps in
+:meth:`StageRecorder.stage`, which measures
+
+* wall time (``time.perf_counter``),
+* CPU time of the process (``time.process_time``),
+* the peak resident set size of the process once the stage is done
+  (``resource.getrusage``; not available on Windows), and
+* optionally the peak Python heap allocated *during* the stage
+  (``tracemalloc``; off by default because it slows everything down).
+
+A stage can attach its own numbers, such as the pages read by the
+parser, by setting keys on the dictionary the context manager yields.
+Every finished stage is emitted as one JSON line when a ``sink`` is
+configured, and in profile mode each stage is run under ``cProfile``
+with its stats dumped to ``<profile_dir>/<stage>.prof`` for
+``python -m pstats`` or snakeviz.
+
+For batch runs :func:`aggregate` turns the per‑claim timings into
+p50/p95/p99 figures per stage.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import math
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+
+def _max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    # Linux reports kilobytes, macOS bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class StageRecorder:
+    """Collects timings for the stages of one claim.
+
+    Args:
+        claim: Identifier written with every record (e.g. the estimate
+            path).
+        sink: Optional text stream receiving one JSON line per stage.
+        profile_dir: If set, each stage runs under ``cProfile`` and its
+            stats are written to ``<profile_dir>/<stage>.prof``.
+        trace_memory: Record the peak Python allocation of each stage
+            with ``tracemalloc``.
+    """
+
+    def __init__(
+        self,
+        claim: str = "",
+        sink: Optional[TextIO] = None,
+        profile_dir: Optional[Path] = None,
+        trace_memory: bool = False,
+    ):
+        self.claim = claim
+        self.sink = sink
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.trace_memory = trace_memory
+        self.records: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Times the enclosed block as stage ``name``.
+
+        Yields:
+            A dictionary the block can add extra fields to.
+        """
+        extra: Dict[str, Any] = {}
+        profiler = cProfile.Profile() if self.profile_dir else None
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        ok = False
+        try:
+            yield extra
+            ok = True
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record: Dict[str, Any] = {
+                "claim": self.claim,
+                "stage": name,
+                "wall_s": round(time.perf_counter() - wall, 6),
+                "cpu_s": round(time.process_time() - cpu, 6),
+                "max_rss_kb": _max_rss_kb(),
+            }
+            if self.trace_memory:
+                record["py_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+                if started_tracing:
+                    tracemalloc.stop()
+            if not ok:
+                record["error"] = True
+            record.update(extra)
+            self.records.append(record)
+            if self.sink is not None:
+                self.sink.write(json.dumps(record, default=str) + "\n")
+                self.sink.flush()
+            if profiler is not None and self.profile_dir is not None:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(self.profile_dir / f"{name}.prof"))
+
+    def wall_times(self) -> Dict[str, float]:
+        """Stage name → wall time in seconds."""
+        return {record["stage"]: record["wall_s"] for record in self.records}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest‑rank percentile of an already sorted, non‑empty list."""
+    rank = max(1, math.ceil(pct / 100.0 * len(values)))
+    return values[rank - 1]
+
+
+def aggregate(timings: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Summarises stage records from many claims.
+
+    Args:
+        timings: Stage records as produced by :class:`StageRecorder`.
+
+    Returns:
+        Stage name → ``count``, ``mean``, ``p50``, ``p95``, ``p99`` and
+        ``max`` of the wall time, plus ``cpu_p50`` and ``cpu_p95``.
+    """
+    wall: Dict[str, List[float]] = {}
+    cpu: Dict[str, List[float]] = {}
+    for record in timings:
+        wall.setdefault(record["stage"], []).append(record["wall_s"])
+        cpu.setdefault(record["stage"], []).append(record["cpu_s"])
+    stats: Dict[str, Dict[str, float]] = {}
+    for stage, values in wall.items():
+        values.sort()
+        cpu_values = sorted(cpu[stage])
+        stats[stage] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 6),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1],
+            "cpu_p50": percentile(cpu_values, 50),
+            "cpu_p95": percentile(cpu_values, 95),
+        }
+    return stats
+
+
+def format_stats(stats: Dict[str, Dict[str, float]]) -> str:
+    """Renders :func:`aggregate` output as a small text table."""
+    lines = [f"{'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for stage, row in stats.items():
+        lines.append(
+            f"{stage:<14}{row['count']:>7}{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}"
+            f"{row['p99'] * 1000:>10.1f}{row['max'] * 1000:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -11,10 +11,12 @@ Key features provided:
 * :func:`build_summary_text` – Produces a multi‑line string summarising
   the claim.  This plain‑text format is useful when pasting into a
   claims management system that does not accept PDFs.
-* :func:`generate_summary_pdf` – Writes the summary to a PDF file.
-  This function deliberately leaves a placeholder for using a PDF
-  library such as `reportlab` or `fpdf`.  You can plug in your
-  preferred library by following the instructions in the comments.
+* :func:`generate_summary_pdf` – Writes the summary to a PDF file
+  using `fpdf2`, falling back to a ``.txt`` file when it is not
+  installed.
+* :class:`SummaryRenderer` – The renderer behind it.  It sets up fonts
+  and layout once and can also write a batch of claims, either into
+  one combined multi‑claim PDF or as one PDF per claim.
 
 By centralising these operations in a utility module you avoid
 duplicating logic across multiple scripts.
@@ -22,8 +24,9 @@ duplicating logic across multiple scripts.
 
 from __future__ import annotations
 
+import os
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 
 def build_summary_text(
@@ -76,50 +79,207 @@ def build_summary_text(
     return "\n".join(lines)
 
 
-def generate_summary_pdf(summary_text: str, output_path: Path) -> None:
-    """Exports the provided summary to a PDF file.
+# Characters used in summaries that the built‑in PDF fonts (Latin‑1)
+# cannot encode, mapped to close ASCII equivalents.
+_ASCII_FALLBACKS = str.maketrans({
+    "\u2022": "-",  # bullet
+    "\u2011": "-",  # non-breaking hyphen
+    "\u2013": "-",  # en dash
+    "\u2014": "-",  # em dash
+    "\u2018": "'",
+    "\u2019": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+})
+
+
+class SummaryRenderer:
+    """Renders claim summaries to PDF with ``fpdf2``.
+
+    Everything that does not depend on a particular claim – the font
+    choice, page geometry, line height and the column widths of the
+    salvage bid table – is worked out once in the constructor.  Create
+    one renderer per process (:func:`get_renderer` does this for you)
+    and reuse it for every claim.
+
+    By default the built‑in Helvetica font is used, which needs no font
+    file to be loaded; characters outside Latin‑1 are replaced with
+    close ASCII equivalents.  Pass ``font_path`` to embed a TrueType
+    font with full Unicode coverage instead.  A TrueType font is parsed
+    once per output document, so :meth:`render_combined` loads it only
+    once for a whole batch.
+
+    Args:
+        font_path: Optional ``.ttf`` file to use instead of Helvetica.
+        font_size: Body text size in points.
+    """
 
-    This function acts as a wrapper where you can integrate a PDF
-    generation library of your choosing.  Two popular choices are:
+    def __init__(self, font_path: Optional[Path] = None, font_size: float = 11):
+        from fpdf import FPDF  # type: ignore
 
-    * **reportlab** – A powerful, pure‑Python library for creating
-      complex PDFs.  Install via ``pip install reportlab`` and use
-      ``reportlab.pdfgen.canvas.Canvas`` to write text.  You'll need
-      to manually manage page breaks and text wrapping.
-    * **fpdf** (also known as **PyFPDF**) – A simpler library that
-      automatically handles basic formatting and multi‑cell text.  Install
-      via ``pip install fpdf2``.  Use the :class:`fpdf.FPDF` class to
-      create a document and ``multi_cell`` or ``text`` methods to write
-      your content.
+        self._fpdf_class = FPDF
+        self.font_path = Path(font_path) if font_path else None
+        self.font_family = "SummaryFont" if self.font_path else "Helvetica"
+        self.font_size = font_size
+        self.line_height = font_size * 0.5  # millimetres
+        self.margin = 15.0
+        probe = FPDF(format="A4")
+        self.content_width = probe.w - 2 * self.margin
+        self.vendor_width = self.content_width * 0.65
+        self.bid_width = self.content_width - self.vendor_width
 
-    Example using fpdf2 (uncomment to use)::
+    def _new_document(self) -> Any:
+        pdf = self._fpdf_class(format="A4")
+        pdf.set_margins(self.margin, self.margin, self.margin)
+        pdf.set_auto_page_break(True, margin=self.margin)
+        if self.font_path:
+            pdf.add_font(self.font_family, "", str(self.font_path))
+            pdf.add_font(self.font_family, "B", str(self.font_path))
+        return pdf
 
-        from fpdf import FPDF
-        pdf = FPDF()
+    def _clean(self, text: str) -> str:
+        if self.font_path:
+            return text
+        text = text.translate(_ASCII_FALLBACKS)
+        return text.encode("latin-1", "replace").decode("latin-1")
+
+    def _write_line(self, pdf: Any, text: str, bold: bool = False) -> None:
+        pdf.set_font(self.font_family, "B" if bold else "", self.font_size)
+        # multi_cell wraps long lines (e.g. damages) at word boundaries
+        pdf.multi_cell(0, self.line_height, self._clean(text), align="L", new_x="LMARGIN", new_y="NEXT")
+
+    def _write_bid_table(self, pdf: Any, salvage_bids: List[Dict[str, int]]) -> None:
+        h = self.line_height + 1.5
+        pdf.set_font(self.font_family, "B", self.font_size)
+        pdf.cell(self.vendor_width, h, "Vendor", border=1)
+        pdf.cell(self.bid_width, h, "Bid", border=1, align="R", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font(self.font_family, "", self.font_size)
+        for bid in salvage_bids:
+            pdf.cell(self.vendor_width, h, self._clean(str(bid["vendor"])), border=1)
+            pdf.cell(self.bid_width, h, f"${bid['bid']:,}", border=1, align="R", new_x="LMARGIN", new_y="NEXT")
+
+    def _add_claim(self, pdf: Any, summary_text: str, salvage_bids: Optional[List[Dict[str, int]]]) -> None:
         pdf.add_page()
-        pdf.set_font('Helvetica', size=11)
-        for line in summary_text.split('\n'):
-            pdf.multi_cell(0, 5, line)
+        pdf.set_font(self.font_family, "B", self.font_size + 5)
+        pdf.cell(0, self.line_height * 2, "Claim Summary", new_x="LMARGIN", new_y="NEXT")
+        in_bids = False
+        for line in summary_text.split("\n"):
+            if line.startswith("Salvage Bids:") and salvage_bids:
+                # Replace the bullet list from build_summary_text with a table
+                self._write_line(pdf, line, bold=True)
+                self._write_bid_table(pdf, salvage_bids)
+                in_bids = True
+                continue
+            if in_bids and line.startswith("  "):
+                continue
+            in_bids = False
+            self._write_line(pdf, line, bold=line.startswith("Conclusion:"))
+
+    def render(
+        self,
+        summary_text: str,
+        output_path: Path,
+        salvage_bids: Optional[List[Dict[str, int]]] = None,
+    ) -> Path:
+        """Writes one claim summary to ``output_path`` (``.pdf`` suffix)."""
+        output_path = Path(output_path).with_suffix(".pdf")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        pdf = self._new_document()
+        self._add_claim(pdf, summary_text, salvage_bids)
+        pdf.output(str(output_path))
+        return output_path
+
+    def render_combined(
+        self,
+        summaries: Iterable[Tuple[str, Optional[List[Dict[str, int]]]]],
+        output_path: Path,
+    ) -> Path:
+        """Writes many claim summaries into one PDF, one claim per page.
+
+        Args:
+            summaries: ``(summary_text, salvage_bids)`` pairs.
+            output_path: Destination of the combined report.
+        """
+        output_path = Path(output_path).with_suffix(".pdf")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        pdf = self._new_document()
+        for summary_text, salvage_bids in summaries:
+            self._add_claim(pdf, summary_text, salvage_bids)
         pdf.output(str(output_path))
+        return output_path
+
+    def render_each(
+        self,
+        summaries: Iterable[Tuple[str, Optional[List[Dict[str, int]]], Path]],
+    ) -> List[Path]:
+        """Writes one PDF per claim using this renderer instance.
+
+        Args:
+            summaries: ``(summary_text, salvage_bids, output_path)``
+                triples.
+        """
+        return [self.render(text, path, bids) for text, bids, path in summaries]
+
+
+_renderer: Optional[SummaryRenderer] = None
+
+
+def get_renderer() -> SummaryRenderer:
+    """Returns the process‑wide :class:`SummaryRenderer`.
+
+    Set ``CLAIM_CIPHER_SUMMARY_FONT`` to a ``.ttf`` path to render with
+    a Unicode font instead of Helvetica.
+
+    Raises:
+        ImportError: If ``fpdf2`` is not installed.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = SummaryRenderer(font_path=os.getenv("CLAIM_CIPHER_SUMMARY_FONT") or None)
+    return _renderer
+
+
+def generate_summary_pdf(
+    summary_text: str,
+    output_path: Path,
+    salvage_bids: Optional[List[Dict[str, int]]] = None,
+    log: Optional[Callable[..., None]] = None,
+) -> Path:
+    """Exports the provided summary to a PDF file.
+
+    The PDF is produced with **fpdf2** (``pip install fpdf2``) through
+    the shared :class:`SummaryRenderer`, so fonts and layout are set up
+    once per process.  Long lines are wrapped and, when
+    ``salvage_bids`` is given, the bids are rendered as a table.
+
+    If ``fpdf2`` is not installed the summary is written as a ``.txt``
+    file instead, as earlier versions of this function did.
 
     Args:
         summary_text: The full text returned by
             :func:`build_summary_text`.
-        output_path: Where to write the PDF.
+        output_path: Where to write the PDF.  The suffix is replaced
+            with ``.pdf`` (or ``.txt`` for the fallback).
+        salvage_bids: Optional bids to show as a table.
+        log: Called with a message when the ``.txt`` fallback is used,
+            e.g. :func:`print`.  The fallback is silent without it.
 
     Returns:
-        None.  Writes a file to ``output_path``.
+        The path of the file that was written.
     """
-    # Placeholder implementation: write a plain text file instead of a PDF.
-    # Replace the following lines with code that uses reportlab or fpdf.
-    print(
-        "generate_summary_pdf has been called.  This function is a stub. "
-        "To produce a PDF, install reportlab or fpdf2 and insert the "
-        "appropriate code here.  For now, the summary will be saved as "
-        "a .txt file."
-    )
-    # Ensure the parent directory exists
-    output_path = output_path.with_suffix('.txt')
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open('w', encoding='utf-8') as f:
-        f.write(summary_text)
+    try:
+        renderer = get_renderer()
+    except ImportError:
+        if log is not None:
+            log(
+                "generate_summary_pdf: fpdf2 is not installed, so the summary "
+                "will be saved as a .txt file.  Install it with "
+                "'pip install fpdf2' to produce a PDF."
+            )
+        # Ensure the parent directory exists
+        output_path = Path(output_path).with_suffix('.txt')
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with output_path.open('w', encoding='utf-8') as f:
+            f.write(summary_text)
+        return output_path
+    return renderer.render(summary_text, output_path, salvage_bids)
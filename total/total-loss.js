@@ -5,7 +5,17 @@
  * implements the complete workflow for parsing a CCC ONE estimate, populating
  * the BCIF form, decoding the VIN via the NHTSA vPIC API, calculating a
  * placeholder NADA value, generating sample salvage bids and assembling a
- * claim summary.  It uses PDF.js and jsPDF, loaded via CDN in the HTML.
+ * claim summary.
+ *
+ * When the local claim engine is running (`python -m total.claim_service
+ * --allow-origin <origin of this page>`), every step is done by the same
+ * Python code as the command line: the estimate is parsed, the VIN decoded,
+ * the vehicle valued and the summary built by the engine, so the page shows
+ * exactly what `process_claim.py` would produce.  Set
+ * `window.CLAIM_CIPHER_ENGINE_URL` before this script to use another address.
+ * If the engine cannot be reached the page falls back to parsing in the
+ * browser with PDF.js and exporting with jsPDF, both loaded via CDN in the
+ * HTML.
  *
  * Note: IDs on HTML elements are retained for ease of selection.  BEM
  * classes (claim-cipher__total-loss-*) are used for styling only and do
@@ -16,6 +26,9 @@
 const pdfjsLib = window['pdfjs-dist/build/pdf'];
 pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.6.172/pdf.worker.min.js';
 
+// Local claim engine (see claim_service.py)
+const ENGINE_URL = (window.CLAIM_CIPHER_ENGINE_URL || 'http://127.0.0.1:8765').replace(/\/$/, '');
+
 // Grab references to elements once on page load
 const estimateInput = document.getElementById('estimateInput');
 const parseButton = document.getElementById('parseButton');
@@ -39,6 +52,121 @@ const isTotalLossCheckbox = document.getElementById('isTotalLoss');
 const downloadPdfButton = document.getElementById('downloadPdfButton');
 const copyTextButton = document.getElementById('copyTextButton');
 
+// Calls the engine.  Resolves to null if it is not running.
+async function callEngine(path, options = {}) {
+  try {
+    return await fetch(`${ENGINE_URL}${path}`, options);
+  } catch (err) {
+    return null;
+  }
+}
+
+// Reads an engine response, turning an error reply into an exception
+async function readEngineJson(resp) {
+  const body = await resp.json();
+  if (!resp.ok) throw new Error(body.error || `HTTP ${resp.status}`);
+  return body;
+}
+
+// Hex SHA-256 of a file, as the engine's parse cache keys it
+async function sha256Hex(file) {
+  if (!(window.crypto && window.crypto.subtle)) return null;
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Parses the estimate with the engine.  A PDF it has parsed before is
+// looked up by its hash instead of being uploaded again; otherwise the file
+// is streamed to it.  Resolves to null if the engine is not running.
+async function parseWithEngine(file) {
+  const hash = await sha256Hex(file);
+  if (hash) {
+    const cached = await callEngine(`/parse/${hash}`);
+    if (!cached) return null;
+    if (cached.status !== 404) return readEngineJson(cached);
+  }
+  const resp = await callEngine('/parse', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/pdf' },
+    body: file,
+  });
+  return resp && readEngineJson(resp);
+}
+
+// Fallback: basic regex extraction of common fields with PDF.js
+async function parseInBrowser(file) {
+  const arrayBuffer = await file.arrayBuffer();
+  const pdf = await pdfjsLib.getDocument({ data: arrayBuffer }).promise;
+  let extracted = '';
+  for (let i = 1; i <= pdf.numPages; i++) {
+    const page = await pdf.getPage(i);
+    const content = await page.getTextContent();
+    extracted += content.items.map(item => item.str).join(' ');
+  }
+  const vinMatch = extracted.match(/\b([A-HJ-NPR-Z0-9]{17})\b/);
+  const yearMatch = extracted.match(/\b(19\d{2}|20\d{2})\b/);
+  const makeMatch = extracted.match(/\bMake\s*[:\-]?\s*([A-Za-z0-9]+)/i);
+  const modelMatch = extracted.match(/\bModel\s*[:\-]?\s*([A-Za-z0-9]+)/i);
+  const mileageMatch = extracted.match(/\b(\d{1,6})\s*(?:miles|mi)\b/i);
+  const damagesMatch = extracted.match(/\bDamage(?:s)?\s*[:\-]?\s*([A-Za-z0-9 ,]+)/i);
+  return {
+    vin: vinMatch && vinMatch[1],
+    year: yearMatch && yearMatch[1],
+    make: makeMatch && makeMatch[1],
+    model: modelMatch && modelMatch[1],
+    mileage: mileageMatch && mileageMatch[1],
+    damages: damagesMatch && damagesMatch[1],
+  };
+}
+
+// Fallback placeholder value: $30,000 depreciating 7 percent per year
+function browserNadaValue(year) {
+  const now = new Date().getFullYear();
+  const age = year ? Math.max(0, now - parseInt(year, 10)) : 0;
+  return 30000 * Math.pow(0.93, age);
+}
+
+// Values the vehicle on the form with the engine (null if not running)
+async function valueWithEngine() {
+  const params = new URLSearchParams({
+    year: bcifForm.year.value,
+    mileage: bcifForm.mileage.value,
+    make: bcifForm.make.value,
+  });
+  const resp = await callEngine(`/value?${params}`);
+  return resp && readEngineJson(resp);
+}
+
+// The form as claim fields of the engine (the process_claim.py options)
+function claimFields() {
+  return {
+    customer_name: bcifForm.customerName.value,
+    adjuster_name: bcifForm.adjusterName.value,
+    claim_number: bcifForm.claimNumber.value,
+    date_of_loss: bcifForm.dateOfLoss.value,
+    location: bcifForm.inspectionLocation.value,
+    vin: bcifForm.vin.value,
+    year: bcifForm.year.value,
+    make: bcifForm.make.value,
+    model: bcifForm.model.value,
+    mileage: bcifForm.mileage.value,
+    damages: bcifForm.damages.value,
+    days_to_repair: bcifForm.daysToRepair.value,
+    total_loss: isTotalLossCheckbox.checked,
+  };
+}
+
+// Requests the summary from the engine as JSON or, with format 'pdf', as a file
+function requestSummary(format) {
+  return callEngine(`/summary${format ? `?format=${format}` : ''}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ fields: claimFields() }),
+  });
+}
+
+const formatDollars = value => `$${Number(value).toLocaleString()}`;
+
 // Enable parse button when a file is selected
 estimateInput.addEventListener('change', () => {
   parseButton.disabled = !(estimateInput.files && estimateInput.files.length);
@@ -51,28 +179,14 @@ parseButton.addEventListener('click', async () => {
   if (!file) return;
   parseStatus.textContent = 'Parsing estimate…';
   try {
-    const arrayBuffer = await file.arrayBuffer();
-    const pdf = await pdfjsLib.getDocument({ data: arrayBuffer }).promise;
-    let extracted = '';
-    for (let i = 1; i <= pdf.numPages; i++) {
-      const page = await pdf.getPage(i);
-      const content = await page.getTextContent();
-      extracted += content.items.map(item => item.str).join(' ');
-    }
-    // Basic regex extraction of common fields
-    const vinMatch = extracted.match(/\b([A-HJ-NPR-Z0-9]{17})\b/);
-    const yearMatch = extracted.match(/\b(19\d{2}|20\d{2})\b/);
-    const makeMatch = extracted.match(/\bMake\s*[:\-]?\s*([A-Za-z0-9]+)/i);
-    const modelMatch = extracted.match(/\bModel\s*[:\-]?\s*([A-Za-z0-9]+)/i);
-    const mileageMatch = extracted.match(/\b(\d{1,6})\s*(?:miles|mi)\b/i);
-    const damagesMatch = extracted.match(/\bDamage(?:s)?\s*[:\-]?\s*([A-Za-z0-9 ,]+)/i);
-    if (vinMatch) bcifForm.vin.value = vinMatch[1];
-    if (yearMatch) bcifForm.year.value = yearMatch[1];
-    if (makeMatch) bcifForm.make.value = makeMatch[1];
-    if (modelMatch) bcifForm.model.value = modelMatch[1];
-    if (mileageMatch) bcifForm.mileage.value = mileageMatch[1];
-    if (damagesMatch) bcifForm.damages.value = damagesMatch[1];
-    parseStatus.textContent = 'Estimate parsed. Please review and edit the BCIF.';
+    const parsed = await parseWithEngine(file);
+    const fields = parsed ? parsed.fields : await parseInBrowser(file);
+    ['vin', 'year', 'make', 'model', 'mileage', 'damages'].forEach(name => {
+      if (fields[name]) bcifForm[name].value = fields[name];
+    });
+    parseStatus.textContent = parsed
+      ? `Estimate parsed by the claim engine${parsed.cache_hit ? ' (cached)' : ''}. Please review and edit the BCIF.`
+      : 'Estimate parsed in the browser. Please review and edit the BCIF.';
     step2.hidden = false;
   } catch (err) {
     console.error(err);
@@ -80,28 +194,38 @@ parseButton.addEventListener('click', async () => {
   }
 });
 
-// Decode the VIN via NHTSA vPIC API and compute a placeholder NADA value
+// Decode the VIN and compute a placeholder NADA value
 decodeButton.addEventListener('click', async () => {
   const vin = bcifForm.vin.value.trim();
   if (!vin) return;
   vinDetails.textContent = 'Decoding VIN…';
   try {
-    const resp = await fetch(`https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/${vin}?format=json`);
-    const data = await resp.json();
-    const results = data.Results;
-    const yearInfo = results.find(r => r.Variable === 'Model Year');
-    const makeInfo = results.find(r => r.Variable === 'Make');
-    const modelInfo = results.find(r => r.Variable === 'Model');
-    const year = yearInfo && yearInfo.Value || bcifForm.year.value;
-    const make = makeInfo && makeInfo.Value || bcifForm.make.value;
-    const model = modelInfo && modelInfo.Value || bcifForm.model.value;
+    const resp = await callEngine(`/decode?vin=${encodeURIComponent(vin)}&remote=1`);
+    let year, make, model;
+    if (resp) {
+      const { vehicle } = await readEngineJson(resp);
+      year = vehicle.ModelYear || bcifForm.year.value;
+      make = vehicle.Make || bcifForm.make.value;
+      model = vehicle.Model || bcifForm.model.value;
+    } else {
+      // Fallback: decode via the NHTSA vPIC API directly
+      const vpic = await fetch(`https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/${vin}?format=json`);
+      const data = await vpic.json();
+      const results = data.Results;
+      const yearInfo = results.find(r => r.Variable === 'Model Year');
+      const makeInfo = results.find(r => r.Variable === 'Make');
+      const modelInfo = results.find(r => r.Variable === 'Model');
+      year = yearInfo && yearInfo.Value || bcifForm.year.value;
+      make = makeInfo && makeInfo.Value || bcifForm.make.value;
+      model = modelInfo && modelInfo.Value || bcifForm.model.value;
+    }
     if (year) bcifForm.year.value = year;
     if (make) bcifForm.make.value = make;
     if (model) bcifForm.model.value = model;
-    const now = new Date().getFullYear();
-    const age = year ? Math.max(0, now - parseInt(year, 10)) : 0;
-    const nada = 30000 * Math.pow(0.93, age);
-    vinDetails.innerHTML = `Decoded VIN: ${vin}<br>Year: ${year}<br>Make: ${make}<br>Model: ${model}<br>Placeholder NADA Value: $${nada.toFixed(2)}`;
+    const valuation = resp && await valueWithEngine();
+    const nada = valuation ? valuation.nada_value : browserNadaValue(year);
+    const nadaText = nada == null ? 'N/A' : valuation ? formatDollars(nada) : `$${nada.toFixed(2)}`;
+    vinDetails.innerHTML = `Decoded VIN: ${vin}<br>Year: ${year}<br>Make: ${make}<br>Model: ${model}<br>Placeholder NADA Value: ${nadaText}`;
     step3.hidden = false;
   } catch (err) {
     console.error(err);
@@ -109,29 +233,51 @@ decodeButton.addEventListener('click', async () => {
   }
 });
 
-// Generate example salvage bids based on a depreciation model
-salvageButton.addEventListener('click', () => {
-  const year = bcifForm.year.value;
-  const now = new Date().getFullYear();
-  const age = year ? Math.max(0, now - parseInt(year, 10)) : 0;
-  const base = 30000 * Math.pow(0.93, age);
-  const vendors = [
-    { name: 'SellMax', factor: 0.45 },
-    { name: 'Cash Auto Salvage', factor: 0.40 },
-    { name: 'Peddle', factor: 0.42 },
-  ];
+// Generate example salvage bids from the vehicle's value
+salvageButton.addEventListener('click', async () => {
+  let bids;
+  try {
+    const valuation = await valueWithEngine();
+    if (valuation) {
+      bids = valuation.salvage_bids.map(({ vendor, bid }) => ({ name: vendor, amount: formatDollars(bid) }));
+    }
+  } catch (err) {
+    console.error(err);
+  }
+  if (!bids) {
+    // Fallback: the vendor factors of the bundled valuation table
+    const base = browserNadaValue(bcifForm.year.value);
+    bids = [
+      { name: 'SellMax', factor: 0.45 },
+      { name: 'Cash Auto Salvage', factor: 0.40 },
+      { name: 'Peddle', factor: 0.42 },
+    ].map(({ name, factor }) => ({ name, amount: `$${(base * factor).toFixed(2)}` }));
+  }
   salvageTableBody.innerHTML = '';
-  vendors.forEach(({ name, factor }) => {
-    const bid = base * factor;
+  bids.forEach(({ name, amount }) => {
     const row = document.createElement('tr');
-    row.innerHTML = `<td>${name}</td><td>$${bid.toFixed(2)}</td>`;
+    row.innerHTML = `<td>${name}</td><td>${amount}</td>`;
     salvageTableBody.appendChild(row);
   });
   step4.hidden = false;
 });
 
 // Assemble the claim summary and reveal Step 5
-summaryButton.addEventListener('click', () => {
+summaryButton.addEventListener('click', async () => {
+  try {
+    const resp = await requestSummary();
+    if (resp) {
+      const { summary } = await readEngineJson(resp);
+      summaryContainer.textContent = summary;
+      step5.hidden = false;
+      return;
+    }
+  } catch (err) {
+    console.error(err);
+    summaryContainer.textContent = 'Failed to build the summary.';
+    step5.hidden = false;
+    return;
+  }
   const lines = [];
   lines.push(`Customer Name: ${bcifForm.customerName.value}`);
   lines.push(`Adjuster Name: ${bcifForm.adjusterName.value}`);
@@ -154,8 +300,24 @@ summaryButton.addEventListener('click', () => {
   step5.hidden = false;
 });
 
-// Export the summary as a PDF using jsPDF
-downloadPdfButton.addEventListener('click', () => {
+// Export the summary as a PDF, rendered by the engine or else with jsPDF
+downloadPdfButton.addEventListener('click', async () => {
+  const resp = await requestSummary('pdf');
+  if (resp && resp.ok) {
+    const disposition = resp.headers.get('Content-Disposition') || '';
+    const match = disposition.match(/filename="([^"]+)"/);
+    const link = document.createElement('a');
+    link.href = URL.createObjectURL(await resp.blob());
+    link.download = match ? match[1] : 'claim_summary.pdf';
+    link.click();
+    setTimeout(() => URL.revokeObjectURL(link.href), 0);
+    return;
+  }
+  if (resp) {
+    console.error(await resp.text());
+    alert('Failed to export the summary');
+    return;
+  }
   const { jsPDF } = window.jspdf;
   const doc = new jsPDF();
   const lines = summaryContainer.textContent.split('\n');
@@ -0,0 +1,249 @@
+"""
+valuation.py
+============
+
+Vectorised vehicle valuation and salvage bids.
+
+The placeholder NADA value (``base * (1 - rate) ** age``) and the
+salvage vendor factors used to be hard‑coded for one vehicle at a
+time.  Reserve reports revalue tens of thousands of open claims at
+once, so this module works on whole columns with NumPy instead:
+:func:`value_portfolio` takes arrays of model years, mileages and makes
+and returns a columnar result (a dictionary of equally long arrays)
+with the value and one bid column per vendor.
+
+The depreciation curves and vendor table live in
+``data/valuation.json`` (or the file named by the
+``CLAIM_CIPHER_VALUATION_TABLE`` environment variable):
+
+``curves``
+    Named curves with a ``base`` value for a current‑year vehicle, the
+    ``annual_depreciation`` rate and an optional mileage adjustment:
+    every mile above ``miles_per_year * max(age, 1)`` takes
+    ``excess_mile_rate`` off the value (per mile, as a fraction), but
+    never more than down to ``min_mileage_factor``.  The shipped
+    ``default`` curve has no mileage adjustment and reproduces the
+    original ``30000 * 0.93 ** age``.
+``make_curves``
+    Upper‑case make → curve name.  Makes not listed use ``default``.
+``vendors``
+    ``{"vendor": ..., "factor": ...}`` entries; each bid is the rounded
+    value times the factor.
+
+:func:`process_claim.compute_nada_value` and
+:func:`salvage_utils.generate_example_bids` are thin wrappers over the
+same code, so a single claim and a portfolio always agree.
+
+Usage::
+
+    python -m total.valuation open_claims.csv --output reserve_values.csv
+
+The CSV needs a ``year`` column; ``mileage`` and ``make`` are optional.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_TABLE = Path(__file__).with_name("data") / "valuation.json"
+
+# numpy is imported by the functions that need it so that importing
+# this module (e.g. for process_claim.py --help) stays cheap
+Columns = Dict[str, "np.ndarray"]
+
+
+class ValuationTable:
+    """Depreciation curves and vendor factors loaded from a JSON file.
+
+    Args:
+        config: The parsed JSON document (see the module docstring).
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        import numpy as np
+
+        curves = config["curves"]
+        if "default" not in curves:
+            raise ValueError("Valuation table needs a 'default' curve")
+        self.curve_names: List[str] = list(curves)
+        # Curve parameters as arrays indexed by curve number, so a
+        # per‑row curve index can gather them in one step
+        self.base = np.array([c["base"] for c in curves.values()], dtype=float)
+        self.keep = np.array([1.0 - c["annual_depreciation"] for c in curves.values()])
+        self.miles_per_year = np.array([c.get("miles_per_year", 0) for c in curves.values()], dtype=float)
+        self.excess_mile_rate = np.array([c.get("excess_mile_rate", 0.0) for c in curves.values()])
+        self.min_mileage_factor = np.array([c.get("min_mileage_factor", 0.0) for c in curves.values()])
+        self.make_curves = {
+            make.upper(): self.curve_names.index(name) for make, name in config.get("make_curves", {}).items()
+        }
+        self.vendors: List[str] = [v["vendor"] for v in config["vendors"]]
+        self.factors = np.array([v["factor"] for v in config["vendors"]], dtype=float)
+
+    @classmethod
+    def load(cls, path: Path) -> "ValuationTable":
+        with Path(path).open(encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def curve_index(self, makes: Optional[Sequence[Optional[str]]], size: int) -> np.ndarray:
+        """Curve number per row; ``default`` where the make is unknown."""
+        import numpy as np
+
+        default = self.curve_names.index("default")
+        if makes is None or not self.make_curves:
+            return np.full(size, default, dtype=np.intp)
+        return np.array(
+            [self.make_curves.get((make or "").strip().upper(), default) for make in makes], dtype=np.intp
+        )
+
+
+@lru_cache(maxsize=None)
+def _load_table(path: str) -> ValuationTable:
+    return ValuationTable.load(Path(path))
+
+
+def get_table() -> ValuationTable:
+    """Returns the (cached) table from ``CLAIM_CIPHER_VALUATION_TABLE`` or the bundled default."""
+    return _load_table(os.getenv("CLAIM_CIPHER_VALUATION_TABLE") or str(DEFAULT_TABLE))
+
+
+def _to_number(value: Any) -> float:
+    """Parses one year or mileage cell; ``nan`` if it is not a number."""
+    if value is None:
+        return float("nan")
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return float("nan")
+
+
+def _as_float_array(values: Any) -> np.ndarray:
+    import numpy as np
+
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+        return values.astype(float, copy=False)
+    return np.fromiter((_to_number(v) for v in values), dtype=float)
+
+
+def value_portfolio(
+    years: Any,
+    mileages: Any = None,
+    makes: Optional[Sequence[Optional[str]]] = None,
+    table: Optional[ValuationTable] = None,
+    current_year: Optional[int] = None,
+) -> Columns:
+    """Values many vehicles at once.
+
+    Args:
+        years: Model years, as numbers or strings (invalid entries are
+            allowed).
+        mileages: Odometer readings aligned with ``years``, or ``None``.
+            Strings such as ``"45,120"`` are accepted.
+        makes: Makes aligned with ``years``, used to pick a curve.
+        table: Curves and vendors.  Defaults to :func:`get_table`.
+        current_year: Valuation year.  Defaults to this year.
+
+    Returns:
+        Columns of equal length: ``year`` and ``age`` (integers, ``-1``
+        where invalid), ``valid`` (bool), ``nada_value`` (integer, ``0``
+        where invalid) and ``bid_<vendor>`` per vendor (integer).  A
+        year is valid if it lies between 1900 and ``current_year``.
+    """
+    import numpy as np
+
+    table = table or get_table()
+    current_year = current_year or datetime.now().year
+    year = _as_float_array(years)
+    size = year.shape[0]
+    valid = np.isfinite(year) & (year == np.floor(year)) & (year >= 1900) & (year <= current_year)
+    year = np.where(valid, year, current_year)
+    age = current_year - year
+
+    curve = table.curve_index(makes, size)
+    value = table.base[curve] * table.keep[curve] ** age
+    if mileages is not None:
+        miles = _as_float_array(mileages)
+        allowance = table.miles_per_year[curve] * np.maximum(age, 1)
+        excess = np.where(np.isfinite(miles), np.maximum(miles - allowance, 0.0), 0.0)
+        factor = np.maximum(1.0 - table.excess_mile_rate[curve] * excess, table.min_mileage_factor[curve])
+        value = value * factor
+
+    nada_value = np.where(valid, np.rint(value), 0).astype(np.int64)
+    columns: Columns = {
+        "year": np.where(valid, year, -1).astype(np.int64),
+        "age": np.where(valid, age, -1).astype(np.int64),
+        "valid": valid,
+        "nada_value": nada_value,
+    }
+    columns.update(salvage_bids(nada_value, table))
+    return columns
+
+
+def salvage_bids(nada_values: Any, table: Optional[ValuationTable] = None) -> Columns:
+    """Per‑vendor bids for an array of values.
+
+    Returns:
+        ``bid_<vendor>`` → integer array, in vendor table order.
+    """
+    import numpy as np
+
+    table = table or get_table()
+    values = np.asarray(nada_values, dtype=float)
+    bids = np.rint(values[:, None] * table.factors[None, :]).astype(np.int64)
+    return {f"bid_{vendor}": bids[:, i] for i, vendor in enumerate(table.vendors)}
+
+
+def value_one(
+    year: Any,
+    mileage: Any = None,
+    make: Optional[str] = None,
+    current_year: Optional[int] = None,
+) -> Optional[int]:
+    """Values a single vehicle; ``None`` if the year is not valid."""
+    columns = value_portfolio(
+        [year], None if mileage is None else [mileage], [make], current_year=current_year
+    )
+    return int(columns["nada_value"][0]) if columns["valid"][0] else None
+
+
+def to_records(columns: Columns) -> List[Dict[str, Any]]:
+    """Turns a columnar result into a list of row dictionaries."""
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(columns[n].tolist() for n in names))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Value a portfolio of vehicles from a CSV file")
+    parser.add_argument("source", help="CSV with a year column and optional mileage and make columns")
+    parser.add_argument("--output", default="valuation.csv", help="Where to write the valued rows")
+    parser.add_argument("--year", type=int, help="Valuation year (defaults to this year)")
+    args = parser.parse_args()
+
+    with open(args.source, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    columns = value_portfolio(
+        [row.get("year") for row in rows],
+        [row.get("mileage") for row in rows],
+        [row.get("make") for row in rows],
+        current_year=args.year,
+    )
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        fieldnames = list(dict.fromkeys((list(rows[0]) if rows else []) + list(columns)))
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for row, values in zip(rows, to_records(columns)):
+            writer.writerow({**row, **values})
+    print(f"Valued {len(rows)} vehicle(s), {int(columns['valid'].sum())} with a valid year -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+vin_enrichment.py
+=================
+
+Asynchronous vPIC lookups for many VINs at once.
+
+:func:`vin_utils.decode_vins` posts its chunks to vPIC one after the
+other and :mod:`process_claim` decodes one VIN per claim, so in a
+batch the network round trips add up.  :class:`VpicClient` takes a
+stream of VINs and
+
+* decodes locally first and only sends VINs the bundled WMI table
+  cannot resolve (the same rule as :func:`vin_utils.decode_vins`),
+* de‑duplicates: a VIN that is already cached or already on its way to
+  vPIC is never requested twice, concurrent callers share one result,
+* gathers VINs into ``DecodeVINValuesBatch`` requests of up to 50,
+  waiting ``batch_delay`` seconds for a batch to fill,
+* sends them over a pool of keep‑alive connections (``aiohttp``),
+  limited to ``rate`` requests per second by a token bucket, and
+* retries timeouts, connection errors, ``429`` and ``5xx`` responses
+  with exponential backoff and jitter, honouring ``Retry-After``.
+  When the retries are used up the local decode is returned.
+
+Results are stored in the same process‑wide cache as
+:func:`vin_utils.decode_vins`, so a later ``decode_vin(vin,
+remote=True)`` – e.g. in the VIN decode stage of
+:func:`process_claim.process_claim`, whose result feeds
+:func:`process_claim.assemble_data` – is answered without a request.
+:mod:`batch_process` uses this to look up the VINs of a whole batch
+before the claims are processed.
+
+Point ``base_url`` (or ``VPIC_BASE_URL``) at a local server to test
+against a mock::
+
+    results = enrich_vins(vins, base_url="http://127.0.0.1:8080/api", rate=50)
+
+Requires ``aiohttp``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from . import vin_utils
+
+DEFAULT_RATE = 5.0
+
+
+class _RetryableStatus(Exception):
+    """A 429/5xx response that should be retried."""
+
+    def __init__(self, status: int, retry_after: Optional[float]):
+        super().__init__(f"HTTP {status}")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per second.
+
+    Args:
+        rate: Sustained acquisitions per second.
+        burst: Acquisitions allowed back to back after an idle period.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class VpicClient:
+    """Batched, rate‑limited async client for vPIC's batch decode.
+
+    Use as an async context manager; leaving it waits for every VIN
+    that was handed to :meth:`decode`.
+
+    Args:
+        base_url: vPIC API root.  Defaults to
+            :data:`vin_utils.VPIC_BASE_URL`.
+        rate: Requests per second.
+        burst: Requests allowed back to back.
+        max_connections: Size of the keep‑alive connection pool, i.e.
+            requests in flight at once.
+        batch_size: VINs per request (vPIC accepts up to 50).
+        batch_delay: Seconds to wait for more VINs before sending a
+            batch that is not full.
+        retries: Retries per request after the first attempt.
+        backoff: Base delay of the exponential backoff, in seconds.
+        timeout: Total timeout per request, in seconds.
+        log: Called with a message when a request fails for good, e.g.
+            :func:`print`.  :attr:`requests_failed` counts them either way.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        rate: float = DEFAULT_RATE,
+        burst: int = 2,
+        max_connections: int = 4,
+        batch_size: int = vin_utils.VPIC_BATCH_SIZE,
+        batch_delay: float = 0.05,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30.0,
+        log: Optional[Callable[..., None]] = None,
+    ):
+        self.url = f"{(base_url or vin_utils.VPIC_BASE_URL).rstrip('/')}/vehicles/DecodeVINValuesBatch/"
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.limiter = RateLimiter(rate, burst)
+        self.log = log
+        self.requests_sent = 0
+        self.requests_failed = 0
+        self._session: Any = None
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, str]]"] = {}
+        self._pending: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batcher: Optional["asyncio.Task[None]"] = None
+        self._sends: Set["asyncio.Task[None]"] = set()
+
+    async def __aenter__(self) -> "VpicClient":
+        import aiohttp  # type: ignore
+
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._wakeup = asyncio.Event()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Waits for outstanding lookups, then closes the connections."""
+        if self._inflight:
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def decode(self, vin: str) -> Dict[str, str]:
+        """Decodes one VIN, going to vPIC only if the local table can't.
+
+        Returns:
+            vPIC‑style attributes; empty for an invalid VIN.
+        """
+        vin = vin_utils.normalise_vin(vin)
+        local = vin_utils.decode_vin_local(vin)
+        if not local or vin_utils.is_resolved(local):
+            return local
+        cached = vin_utils.remote_cache_get(vin)
+        if cached is not None:
+            return cached
+        future = self._inflight.get(vin)
+        if future is None:
+            future = self._inflight[vin] = asyncio.get_running_loop().create_future()
+            self._pending.append(vin)
+            self._wakeup.set()
+        return await asyncio.shield(future)
+
+    async def decode_all(self, vins: Union[Iterable[str], AsyncIterable[str]]) -> Dict[str, Dict[str, str]]:
+        """Decodes a stream of VINs concurrently.
+
+        VINs are queued as they arrive, so an async iterable (e.g. VINs
+        produced while estimates are still being parsed) is batched
+        without waiting for its end.
+
+        Returns:
+            Normalised VIN → decoded attributes.
+        """
+        tasks: Dict[str, "asyncio.Task[Dict[str, str]]"] = {}
+
+        def add(vin: str) -> None:
+            key = vin_utils.normalise_vin(vin)
+            if key and key not in tasks:
+                tasks[key] = asyncio.create_task(self.decode(key))
+
+        if hasattr(vins, "__aiter__"):
+            async for vin in vins:  # type: ignore[union-attr]
+                add(vin)
+        else:
+            for vin in vins:  # type: ignore[union-attr]
+                add(vin)
+        results = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks, results))
+
+    async def _batch_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending) < self.batch_size:
+                # Give other VINs a moment to join a batch that is not full
+                await asyncio.sleep(self.batch_delay)
+            chunk = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            if not self._pending:
+                self._wakeup.clear()
+            if chunk:
+                task = asyncio.create_task(self._send(chunk))
+                self._sends.add(task)
+                task.add_done_callback(self._sends.discard)
+
+    async def _post(self, chunk: List[str]) -> Dict[str, Dict[str, str]]:
+        async with self._session.post(self.url, data={"format": "json", "data": ";".join(chunk)}) as response:
+            if response.status == 429 or response.status >= 500:
+                retry_after = response.headers.get("Retry-After")
+                raise _RetryableStatus(
+                    response.status, float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+            response.raise_for_status()
+            return vin_utils.parse_batch_response(await response.json(content_type=None))
+
+    async def _send(self, chunk: List[str]) -> None:
+        import aiohttp  # type: ignore
+
+        fetched: Dict[str, Dict[str, str]] = {}
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            self.requests_sent += 1
+            try:
+                fetched = await self._post(chunk)
+                break
+            except aiohttp.ClientResponseError as exc:
+                # Other 4xx responses will not get better by retrying
+                self._failed(chunk, exc)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableStatus) as exc:
+                if attempt == self.retries:
+                    self._failed(chunk, exc)
+                    break
+                delay = getattr(exc, "retry_after", None) or self.backoff * 2 ** attempt * (0.5 + random.random())
+                await asyncio.sleep(delay)
+            except Exception as exc:  # noqa: BLE001 - e.g. a malformed body; fall back to the local decode
+                self._failed(chunk, exc)
+                break
+        vin_utils.remote_cache_update({vin: fetched[vin] for vin in chunk if vin in fetched})
+        for vin in chunk:
+            decoded = fetched.get(vin)
+            if decoded is None:
+                decoded = vin_utils.decode_vin_local(vin)
+            future = self._inflight.pop(vin)
+            if not future.done():
+                future.set_result(decoded)
+
+    def _failed(self, chunk: List[str], exc: BaseException) -> None:
+        self.requests_failed += 1
+        if self.log is not None:
+            self.log(f"vPIC batch decode failed for {len(chunk)} VIN(s): {exc}")
+
+
+def enrich_vins(vins: Iterable[str], **options: Any) -> Dict[str, Dict[str, str]]:
+    """Synchronous wrapper: decodes ``vins`` with a :class:`VpicClient`.
+
+    Args:
+        vins: VINs to decode.  Invalid ones map to an empty dictionary.
+        **options: Passed on to :class:`VpicClient`.
+
+    Returns:
+        Normalised VIN → decoded attributes.
+    """
+
+    async def run() -> Dict[str, Dict[str, str]]:
+        async with VpicClient(**options) as client:
+            return await client.decode_all(vins)
+
+    return asyncio.run(run())
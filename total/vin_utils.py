@@ -0,0 +1,283 @@
+"""
+vin_utils.py
+============
+
+Decodes Vehicle Identification Numbers for the claim pipeline.
+
+The front‑end (``total-loss.js``) calls the NHTSA vPIC ``DecodeVin``
+endpoint once per VIN.  In batch runs that is one network round trip
+per claim, so this module decodes what it can **offline**:
+
+* The model year comes from position 10 of the VIN, disambiguated by
+  position 7 as described in 49 CFR 565.15.
+* The make, plant country and vehicle type come from the World
+  Manufacturer Identifier (the first three characters), looked up in
+  the compact table bundled as ``data/wmi.csv``.  The table is read
+  lazily on first use and indexed by WMI.
+* The check digit (position 9) is validated.  It is mandatory for
+  North American VINs only, so a mismatch is reported rather than
+  treated as fatal.
+
+Results are memoised with an LRU cache, so repeated VINs in a batch
+cost nothing.  VINs the local table cannot resolve can optionally be
+sent to vPIC's ``DecodeVINValuesBatch`` endpoint, in chunks of up to
+50, with :func:`decode_vins`.  Set ``VPIC_BASE_URL`` (or pass
+``base_url``) to point this at a local stub server for testing.  vPIC
+answers are kept for the life of the process; :func:`remote_cache_update`
+adds answers fetched elsewhere (see :mod:`vin_enrichment`).  A failed
+vPIC request is reported through the caller's ``log`` function and the
+local decode is kept.
+
+Decoded results use the same flat keys as vPIC's ``DecodeVinValues``
+response (``ModelYear``, ``Make``, ``Model``, ``VehicleType``,
+``PlantCountry`` …) so callers do not need to care where a value came
+from; ``Source`` is ``"local"`` or ``"vpic"``.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+VPIC_BASE_URL = os.getenv("VPIC_BASE_URL", "https://vpic.nhtsa.dot.gov/api")
+VPIC_BATCH_SIZE = 50
+
+_WMI_TABLE = Path(__file__).with_name("data") / "wmi.csv"
+_VIN_RE = re.compile(r"^[A-HJ-NPR-Z0-9]{17}$")
+
+# Check digit transliteration and position weights (49 CFR 565.15)
+_TRANSLITERATION = {
+    **{str(d): d for d in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Position 10 year codes; the cycle repeats every 30 years
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+
+# Fallback plant country from the first character when the WMI is unknown
+_REGION_COUNTRY = {
+    "1": "UNITED STATES (USA)", "4": "UNITED STATES (USA)", "5": "UNITED STATES (USA)",
+    "7": "UNITED STATES (USA)", "2": "CANADA", "3": "MEXICO", "J": "JAPAN",
+    "K": "SOUTH KOREA", "L": "CHINA", "S": "UNITED KINGDOM (UK)", "V": "FRANCE",
+    "W": "GERMANY", "Y": "SWEDEN", "Z": "ITALY",
+}
+
+
+@lru_cache(maxsize=None)
+def _wmi_index() -> Dict[str, Dict[str, str]]:
+    """Loads ``data/wmi.csv`` once and indexes it by WMI."""
+    with _WMI_TABLE.open(newline="", encoding="utf-8") as f:
+        return {row["wmi"]: row for row in csv.DictReader(f)}
+
+
+def wmi_table_path() -> Path:
+    """Path of the bundled WMI table, e.g. to fingerprint it."""
+    return _WMI_TABLE
+
+
+def warm() -> None:
+    """Loads the WMI table now so the first decode does not pay for it."""
+    _wmi_index()
+
+
+def normalise_vin(vin: str) -> str:
+    """Upper‑cases a VIN and strips whitespace and dashes."""
+    return re.sub(r"[\s\-]", "", vin or "").upper()
+
+
+def is_valid_vin(vin: str) -> bool:
+    """Checks length and alphabet (no I, O or Q)."""
+    return bool(_VIN_RE.match(vin))
+
+
+def compute_check_digit(vin: str) -> str:
+    """Returns the expected position‑9 check digit for a 17‑character VIN."""
+    total = sum(_TRANSLITERATION[c] * w for c, w in zip(vin, _WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def check_digit_ok(vin: str) -> bool:
+    """True if position 9 matches :func:`compute_check_digit`."""
+    return is_valid_vin(vin) and vin[8] == compute_check_digit(vin)
+
+
+def decode_model_year(vin: str, current_year: Optional[int] = None) -> Optional[int]:
+    """Decodes the model year from positions 10 and 7.
+
+    For light vehicles built for North America an alphabetic position 7
+    means the 2010–2039 cycle and a numeric one the 1980–2009 cycle.
+    Years more than one year in the future are moved back a cycle.
+    """
+    code = vin[9]
+    if code not in _YEAR_CODES:
+        return None
+    year = 1980 + _YEAR_CODES.index(code)
+    if vin[6].isalpha():
+        year += 30
+    current_year = current_year or datetime.now().year
+    if year > current_year + 1:
+        year -= 30
+    return year
+
+
+@lru_cache(maxsize=4096)
+def decode_vin_local(vin: str) -> Dict[str, str]:
+    """Decodes a VIN using only the bundled tables.
+
+    Args:
+        vin: The VIN to decode.  It is normalised first.
+
+    Returns:
+        A dictionary with vPIC‑style keys.  It is empty when the VIN is
+        not a syntactically valid 17‑character VIN.  Values that cannot
+        be determined locally (e.g. ``Model``) are empty strings.
+    """
+    vin = normalise_vin(vin)
+    if not is_valid_vin(vin):
+        return {}
+    wmi = _wmi_index().get(vin[:3], {})
+    year = decode_model_year(vin)
+    return {
+        "VIN": vin,
+        "ModelYear": str(year) if year else "",
+        "Make": wmi.get("make", ""),
+        "Model": "",
+        "VehicleType": wmi.get("vehicle_type", ""),
+        "PlantCountry": wmi.get("country") or _REGION_COUNTRY.get(vin[0], ""),
+        "CheckDigitValid": "true" if check_digit_ok(vin) else "false",
+        "Source": "local",
+    }
+
+
+def is_resolved(decoded: Dict[str, str]) -> bool:
+    """True if a decode produced at least a year and a make."""
+    return bool(decoded.get("ModelYear") and decoded.get("Make"))
+
+
+def _vpic_batch(vins: List[str], base_url: str, timeout: float) -> Dict[str, Dict[str, str]]:
+    """Posts one chunk of VINs to vPIC's batch decode endpoint."""
+    import requests  # type: ignore
+
+    response = requests.post(
+        f"{base_url.rstrip('/')}/vehicles/DecodeVINValuesBatch/",
+        data={"format": "json", "data": ";".join(vins)},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return parse_batch_response(response.json())
+
+
+def parse_batch_response(payload: Dict) -> Dict[str, Dict[str, str]]:
+    """Flattens a ``DecodeVINValuesBatch`` JSON response, keyed by VIN."""
+    decoded = {}
+    for row in payload.get("Results", []):
+        vin = normalise_vin(row.get("VIN", ""))
+        if vin:
+            flat = {k: str(v) if v is not None else "" for k, v in row.items()}
+            flat["Source"] = "vpic"
+            decoded[vin] = flat
+    return decoded
+
+
+# Remote results are kept for the life of the process, like the local LRU
+_remote_cache: Dict[str, Dict[str, str]] = {}
+
+
+def remote_cache_get(vin: str) -> Optional[Dict[str, str]]:
+    """The vPIC answer already fetched for a normalised VIN, if any."""
+    return _remote_cache.get(vin)
+
+
+def remote_cache_update(decoded: Dict[str, Dict[str, str]]) -> None:
+    """Stores vPIC answers, keyed by normalised VIN, fetched elsewhere.
+
+    Later remote decodes of those VINs are answered without a request.
+    """
+    _remote_cache.update(decoded)
+
+
+def decode_vins(
+    vins: Iterable[str],
+    remote: bool = False,
+    base_url: Optional[str] = None,
+    timeout: float = 30.0,
+    log: Optional[Callable[..., None]] = None,
+) -> Dict[str, Dict[str, str]]:
+    """Decodes many VINs, going to vPIC only for those the table can't.
+
+    Args:
+        vins: VINs to decode.  Duplicates are decoded once.
+        remote: If ``True`` VINs whose year or make cannot be resolved
+            locally are looked up with vPIC's batch endpoint.
+        base_url: vPIC API root.  Defaults to :data:`VPIC_BASE_URL`.
+        timeout: Per‑request timeout in seconds.
+        log: Called with a message when a vPIC request fails, e.g.
+            :func:`print`.  Failures are silent without it.
+
+    Returns:
+        A mapping of normalised VIN to decoded attributes.  Invalid VINs
+        map to an empty dictionary.  If the remote lookup fails the
+        local result is kept.
+    """
+    results: Dict[str, Dict[str, str]] = {}
+    unresolved: List[str] = []
+    for raw in vins:
+        vin = normalise_vin(raw)
+        if vin in results:
+            continue
+        results[vin] = decode_vin_local(vin)
+        if remote and results[vin] and not is_resolved(results[vin]):
+            if vin in _remote_cache:
+                results[vin] = _remote_cache[vin]
+            else:
+                unresolved.append(vin)
+    url = base_url or VPIC_BASE_URL
+    for start in range(0, len(unresolved), VPIC_BATCH_SIZE):
+        chunk = unresolved[start:start + VPIC_BATCH_SIZE]
+        try:
+            fetched = _vpic_batch(chunk, url, timeout)
+        except Exception as exc:  # noqa: BLE001 - fall back to the local decode
+            if log is not None:
+                log(f"vPIC batch decode failed for {len(chunk)} VIN(s): {exc}")
+            continue
+        for vin, decoded in fetched.items():
+            if vin in results:
+                _remote_cache[vin] = decoded
+                results[vin] = decoded
+    return results
+
+
+def decode_vin(
+    vin: str,
+    remote: bool = False,
+    base_url: Optional[str] = None,
+    log: Optional[Callable[..., None]] = None,
+) -> Dict[str, str]:
+    """Decodes a single VIN.
+
+    Args:
+        vin: The VIN to decode.
+        remote: Fall back to vPIC if the local table cannot resolve it.
+        base_url: vPIC API root for the remote fallback.
+        log: See :func:`decode_vins`.
+
+    Returns:
+        vPIC‑style attributes, or an empty dictionary if the VIN is
+        invalid.
+    """
+    return decode_vins([vin], remote=remote, base_url=base_url, log=log).get(normalise_vin(vin), {})
+
+
+def extract_basic_attributes(decoded: Dict[str, str]) -> Dict[str, str]:
+    """Returns the year, make, model and a few descriptive attributes."""
+    keys = ("ModelYear", "Make", "Model", "VehicleType", "PlantCountry")
+    return {key: decoded[key] for key in keys if decoded.get(key)}